@@ -17,27 +17,18 @@ depends_on = None
 
 
 def upgrade():
-    # Step 1: Add lowercase values if they don't exist
-    # Using connection to commit after each ALTER TYPE
-    connection = op.get_bind()
-    
-    connection.execute(sa.text("ALTER TYPE userrole ADD VALUE IF NOT EXISTS 'teacher'"))
-    connection.commit()
-    
-    connection.execute(sa.text("ALTER TYPE userrole ADD VALUE IF NOT EXISTS 'admin'"))
-    connection.commit()
-    
-    connection.execute(sa.text("ALTER TYPE userrole ADD VALUE IF NOT EXISTS 'student'"))
-    connection.commit()
-    
-    # Step 2: Update existing records to use lowercase values
-    op.execute("UPDATE users SET role = 'teacher' WHERE role = 'TEACHER'")
-    op.execute("UPDATE users SET role = 'admin' WHERE role = 'ADMIN'")
-    op.execute("UPDATE users SET role = 'student' WHERE role = 'STUDENT'")
+    # Swap the enum in one transactional block instead of three
+    # committed ADD VALUE statements; USING lower() folds existing
+    # rows to lowercase in the same table rewrite.
+    # Uppercase labels stay valid because Enum(UserRole) persists member names.
+    op.execute("""
+        ALTER TYPE userrole RENAME TO userrole_old;
+        CREATE TYPE userrole AS ENUM ('teacher', 'admin', 'student', 'TEACHER', 'ADMIN', 'STUDENT');
+        ALTER TABLE users ALTER COLUMN role TYPE userrole USING lower(role::text)::userrole;
+        DROP TYPE userrole_old;
+    """)
 
 
 def downgrade():
     # Update records back to uppercase
-    op.execute("UPDATE users SET role = 'TEACHER' WHERE role = 'teacher'")
-    op.execute("UPDATE users SET role = 'ADMIN' WHERE role = 'admin'")
-    op.execute("UPDATE users SET role = 'STUDENT' WHERE role = 'student'")
+    op.execute("UPDATE users SET role = upper(role::text)::userrole")
@@ -42,37 +42,27 @@ def upgrade() -> None:
         sa.PrimaryKeyConstraint('id')
     )
     
-    # Add updated_at to materials table if not exists
-    with op.batch_alter_table('materials', schema=None) as batch_op:
-        try:
-            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
-        except:
-            pass  # Column might already exist
-    
-    # Temporarily allow NULL for course_id during migration
-    # This will be set properly after creating courses
-    
-    # Update materials table - rename old course_id to course_id_old temporarily
-    with op.batch_alter_table('materials', schema=None) as batch_op:
-        try:
-            batch_op.alter_column('course_id', new_column_name='course_id_old', existing_type=sa.String())
-        except:
-            pass  # If column doesn't exist, skip
-    
-    # Add new course_id as UUID with foreign key
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    # Renames and plain column adds are native ALTERs on both PostgreSQL and
+    # SQLite; only the foreign key needs batch mode, which on SQLite copies
+    # the whole table. Keep that to a single batch per table.
+    material_columns = {col['name'] for col in inspector.get_columns('materials')}
+    if 'updated_at' not in material_columns:
+        op.add_column('materials', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    if 'course_id' in material_columns and 'course_id_old' not in material_columns:
+        op.alter_column('materials', 'course_id', new_column_name='course_id_old', existing_type=sa.String())
+
     with op.batch_alter_table('materials', schema=None) as batch_op:
         batch_op.add_column(sa.Column('course_id', get_uuid_type(), nullable=True))
         batch_op.create_foreign_key('fk_materials_course_id', 'courses', ['course_id'], ['id'], ondelete='SET NULL')
-    
-    # Update ocr_results table
+
+    ocr_columns = {col['name'] for col in inspector.get_columns('ocr_results')}
+    if 'course_id' in ocr_columns and 'course_id_old' not in ocr_columns:
+        op.alter_column('ocr_results', 'course_id', new_column_name='course_id_old', existing_type=sa.String())
+
     with op.batch_alter_table('ocr_results', schema=None) as batch_op:
-        try:
-            # Rename old course_id
-            batch_op.alter_column('course_id', new_column_name='course_id_old', existing_type=sa.String())
-        except:
-            pass
-        
-        # Add new course_id as UUID
         batch_op.add_column(sa.Column('course_id', get_uuid_type(), nullable=True))
         batch_op.create_foreign_key('fk_ocr_results_course_id', 'courses', ['course_id'], ['id'], ondelete='SET NULL')
     
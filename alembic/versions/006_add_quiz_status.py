@@ -0,0 +1,34 @@
+"""Add status column to quizzes for background generation
+
+Revision ID: 006_add_quiz_status
+Revises: 005_merge_course_heads
+Create Date: 2026-10-15 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '006_add_quiz_status'
+down_revision = '005_merge_course_heads'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    quiz_columns = {col['name'] for col in inspector.get_columns('quizzes')}
+    if 'status' not in quiz_columns:
+        op.add_column('quizzes', sa.Column('status', sa.String(), nullable=False, server_default='ready'))
+
+
+def downgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    quiz_columns = {col['name'] for col in inspector.get_columns('quizzes')}
+    if 'status' in quiz_columns:
+        op.drop_column('quizzes', 'status')
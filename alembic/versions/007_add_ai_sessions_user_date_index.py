@@ -0,0 +1,38 @@
+"""Add composite index for AI session history
+
+Revision ID: 007_ai_sessions_user_date_idx
+Revises: 006_add_quiz_status
+Create Date: 2026-10-15 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '007_ai_sessions_user_date_idx'
+down_revision = '006_add_quiz_status'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    indexes = {index['name'] for index in inspector.get_indexes('ai_sessions')}
+    if 'ix_ai_sessions_user_date' not in indexes:
+        op.create_index(
+            'ix_ai_sessions_user_date',
+            'ai_sessions',
+            ['user_id', sa.text('date DESC')]
+        )
+
+
+def downgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    indexes = {index['name'] for index in inspector.get_indexes('ai_sessions')}
+    if 'ix_ai_sessions_user_date' in indexes:
+        op.drop_index('ix_ai_sessions_user_date', table_name='ai_sessions')
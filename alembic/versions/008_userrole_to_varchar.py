@@ -0,0 +1,40 @@
+"""Convert users.role from enum to varchar with a CHECK constraint
+
+Revision ID: 008_userrole_to_varchar
+Revises: 007_ai_sessions_user_date_idx
+Create Date: 2026-10-15 12:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '008_userrole_to_varchar'
+down_revision = '007_ai_sessions_user_date_idx'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # SQLite stores the enum as plain VARCHAR already
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute("""
+        ALTER TABLE users ALTER COLUMN role TYPE varchar(16) USING lower(role::text);
+        DROP TYPE IF EXISTS userrole;
+        ALTER TABLE users ADD CONSTRAINT users_role_check CHECK (role IN ('teacher', 'admin', 'student'));
+        CREATE INDEX IF NOT EXISTS ix_users_role ON users (role) WHERE role != 'student';
+    """)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute("""
+        DROP INDEX IF EXISTS ix_users_role;
+        ALTER TABLE users DROP CONSTRAINT IF EXISTS users_role_check;
+        CREATE TYPE userrole AS ENUM ('teacher', 'admin', 'student', 'TEACHER', 'ADMIN', 'STUDENT');
+        ALTER TABLE users ALTER COLUMN role TYPE userrole USING role::userrole;
+    """)
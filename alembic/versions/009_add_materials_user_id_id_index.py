@@ -0,0 +1,36 @@
+"""Add composite index for owner-scoped material lookups
+
+Revision ID: 009_materials_user_id_id_idx
+Revises: 008_userrole_to_varchar
+Create Date: 2026-10-15 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '009_materials_user_id_id_idx'
+down_revision = '008_userrole_to_varchar'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    # No INCLUDE (content, raw_text): large material text would exceed
+    # the btree row size limit and fail inserts.
+    indexes = {index['name'] for index in inspector.get_indexes('materials')}
+    if 'ix_materials_user_id_id' not in indexes:
+        op.create_index('ix_materials_user_id_id', 'materials', ['user_id', 'id'])
+
+
+def downgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    indexes = {index['name'] for index in inspector.get_indexes('materials')}
+    if 'ix_materials_user_id_id' in indexes:
+        op.drop_index('ix_materials_user_id_id', table_name='materials')
@@ -0,0 +1,56 @@
+"""Make the AI session history index covering
+
+Revision ID: 010_ai_sessions_covering_idx
+Revises: 009_materials_user_id_id_idx
+Create Date: 2026-10-15 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '010_ai_sessions_covering_idx'
+down_revision = '009_materials_user_id_id_idx'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    is_postgres = bind.dialect.name == 'postgresql'
+
+    # INCLUDE lets Postgres answer the /ai/sessions sidebar with an
+    # index-only scan; the new index is built before the old one is dropped.
+    indexes = {index['name'] for index in inspector.get_indexes('ai_sessions')}
+    with op.get_context().autocommit_block():
+        if 'ix_ai_sessions_user_date_covering' not in indexes:
+            op.create_index(
+                'ix_ai_sessions_user_date_covering',
+                'ai_sessions',
+                ['user_id', sa.text('date DESC')],
+                postgresql_include=['id', 'title', 'doc_id'],
+                postgresql_concurrently=is_postgres
+            )
+        if 'ix_ai_sessions_user_date' in indexes:
+            op.drop_index(
+                'ix_ai_sessions_user_date',
+                table_name='ai_sessions',
+                postgresql_concurrently=is_postgres
+            )
+
+
+def downgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    indexes = {index['name'] for index in inspector.get_indexes('ai_sessions')}
+    if 'ix_ai_sessions_user_date' not in indexes:
+        op.create_index(
+            'ix_ai_sessions_user_date',
+            'ai_sessions',
+            ['user_id', sa.text('date DESC')]
+        )
+    if 'ix_ai_sessions_user_date_covering' in indexes:
+        op.drop_index('ix_ai_sessions_user_date_covering', table_name='ai_sessions')
@@ -0,0 +1,50 @@
+"""Store AI chat history as jsonb
+
+Revision ID: 011_ai_sessions_messages_jsonb
+Revises: 010_ai_sessions_covering_idx
+Create Date: 2026-10-15 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '011_ai_sessions_messages_jsonb'
+down_revision = '010_ai_sessions_covering_idx'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+
+    # jsonb supports `messages || new_pair`, so chat turns are appended in SQL
+    columns = {column['name']: column for column in sa.inspect(bind).get_columns('ai_sessions')}
+    if not isinstance(columns['messages']['type'], postgresql.JSONB):
+        op.alter_column(
+            'ai_sessions',
+            'messages',
+            type_=postgresql.JSONB(),
+            existing_nullable=True,
+            postgresql_using='messages::jsonb'
+        )
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+
+    columns = {column['name']: column for column in sa.inspect(bind).get_columns('ai_sessions')}
+    if isinstance(columns['messages']['type'], postgresql.JSONB):
+        op.alter_column(
+            'ai_sessions',
+            'messages',
+            type_=sa.JSON(),
+            existing_nullable=True,
+            postgresql_using='messages::json'
+        )
@@ -0,0 +1,53 @@
+"""Add composite indexes for analytics and quiz lookups
+
+Revision ID: 012_results_lookup_indexes
+Revises: 011_ai_sessions_messages_jsonb
+Create Date: 2026-10-16 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '012_results_lookup_indexes'
+down_revision = '011_ai_sessions_messages_jsonb'
+branch_labels = None
+depends_on = None
+
+
+# (name, table, columns)
+INDEXES = [
+    # Dashboard "recent results": ORDER BY submission_date DESC LIMIT n per teacher
+    ('ix_student_results_user_date', 'student_results', ['user_id', sa.text('submission_date DESC')]),
+    # Teacher results joined to a course's quizzes
+    ('ix_student_results_user_quiz', 'student_results', ['user_id', 'quiz_id']),
+    # Postgres does not index foreign keys by itself
+    ('ix_quizzes_material_id', 'quizzes', ['material_id']),
+    ('ix_materials_user_id_course_id', 'materials', ['user_id', 'course_id']),
+]
+
+
+def _existing_indexes(bind, tables):
+    inspector = sa.inspect(bind)
+    return {index['name'] for table in tables for index in inspector.get_indexes(table)}
+
+
+def upgrade():
+    bind = op.get_bind()
+    is_postgres = bind.dialect.name == 'postgresql'
+    existing = _existing_indexes(bind, {table for _, table, _ in INDEXES})
+
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            if name not in existing:
+                op.create_index(name, table, columns, postgresql_concurrently=is_postgres)
+
+
+def downgrade():
+    bind = op.get_bind()
+    existing = _existing_indexes(bind, {table for _, table, _ in INDEXES})
+
+    for name, table, _ in reversed(INDEXES):
+        if name in existing:
+            op.drop_index(name, table_name=table)
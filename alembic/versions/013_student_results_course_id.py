@@ -0,0 +1,82 @@
+"""Denormalize course_id onto student_results
+
+Revision ID: 013_student_results_course_id
+Revises: 012_results_lookup_indexes
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '013_student_results_course_id'
+down_revision = '012_results_lookup_indexes'
+branch_labels = None
+depends_on = None
+
+
+def get_uuid_type(bind):
+    return postgresql.UUID(as_uuid=True) if bind.dialect.name == 'postgresql' else sa.String(36)
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    is_postgres = bind.dialect.name == 'postgresql'
+
+    columns = {column['name'] for column in inspector.get_columns('student_results')}
+    if 'course_id' not in columns:
+        with op.batch_alter_table('student_results') as batch_op:
+            batch_op.add_column(sa.Column('course_id', get_uuid_type(bind), nullable=True))
+            batch_op.create_foreign_key(
+                'fk_student_results_course_id', 'courses', ['course_id'], ['id'], ondelete='SET NULL'
+            )
+
+    # Copy each result's course from its quiz's material
+    if is_postgres:
+        op.execute("""
+            UPDATE student_results AS sr
+            SET course_id = m.course_id
+            FROM quizzes AS q
+            JOIN materials AS m ON q.material_id = m.id
+            WHERE sr.quiz_id = q.id AND sr.course_id IS NULL
+        """)
+    else:
+        op.execute("""
+            UPDATE student_results
+            SET course_id = (
+                SELECT m.course_id
+                FROM quizzes AS q
+                JOIN materials AS m ON q.material_id = m.id
+                WHERE q.id = student_results.quiz_id
+            )
+            WHERE course_id IS NULL
+        """)
+
+    indexes = {index['name'] for index in inspector.get_indexes('student_results')}
+    if 'ix_student_results_user_course_date' not in indexes:
+        with op.get_context().autocommit_block():
+            op.create_index(
+                'ix_student_results_user_course_date',
+                'student_results',
+                ['user_id', 'course_id', sa.text('submission_date DESC')],
+                postgresql_where=sa.text('course_id IS NOT NULL'),
+                postgresql_concurrently=is_postgres
+            )
+
+
+def downgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    indexes = {index['name'] for index in inspector.get_indexes('student_results')}
+    if 'ix_student_results_user_course_date' in indexes:
+        op.drop_index('ix_student_results_user_course_date', table_name='student_results')
+
+    columns = {column['name'] for column in inspector.get_columns('student_results')}
+    if 'course_id' in columns:
+        with op.batch_alter_table('student_results') as batch_op:
+            batch_op.drop_constraint('fk_student_results_course_id', type_='foreignkey')
+            batch_op.drop_column('course_id')
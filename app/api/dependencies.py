@@ -1,15 +1,20 @@
-from fastapi import Depends, HTTPException, status, Header
+import asyncio
+import math
+from fastapi import Depends, HTTPException, Request, status, Header
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from app.core.database import get_db
 from app.core.security import decode_token
 from app.models.models import User
+from app.core.config import settings
+from app.services.rate_limiter import RateLimiter, ai_rate_limiter, quiz_rate_limiter
+from app.services.concurrency_limiter import ConcurrencyLimiter, ai_chat_limiter, ai_generation_limiter
 from typing import Optional
 
 security = HTTPBearer()
 
 
-async def get_current_user(
+def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
 ) -> User:
@@ -63,6 +68,77 @@ async def get_current_teacher(
     return current_user
 
 
+def rate_limit(limiter: RateLimiter, per_item: Optional[str] = None):
+    """
+    Build a per-user throttling dependency for LLM-backed endpoints.
+
+    Requests over the burst wait for a token for up to
+    RATE_LIMIT_QUEUE_TIMEOUT seconds; beyond that they get 429. With
+    per_item, batch requests are charged one token per element of that
+    list field of the JSON body, i.e. per LLM call they trigger.
+    """
+    async def dependency(request: Request, current_user: User = Depends(get_current_user)) -> None:
+        cost = 1
+        if per_item is not None:
+            # FastAPI has already read and validated the body; this reuses it
+            body = await request.json()
+            cost = max(1, len(body.get(per_item) or []))
+        accepted, wait = await limiter.acquire(
+            str(current_user.id),
+            max_wait=settings.RATE_LIMIT_QUEUE_TIMEOUT,
+            cost=cost
+        )
+        if not accepted:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Rate limit exceeded",
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    return dependency
+
+
+rate_limit_ai = rate_limit(ai_rate_limiter)
+rate_limit_summary_batch = rate_limit(ai_rate_limiter, per_item="materialIds")
+rate_limit_quiz = rate_limit(quiz_rate_limiter)
+rate_limit_quiz_batch = rate_limit(quiz_rate_limiter, per_item="quizzes")
+
+
+async def acquire_concurrency_slot(limiter: ConcurrencyLimiter) -> None:
+    """Take a limiter slot, failing fast with 503 when its queue is full."""
+    if not await limiter.acquire():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="AI service is busy, try again later",
+            headers={"Retry-After": "1"},
+        )
+
+
+def limit_concurrency(limiter: ConcurrencyLimiter):
+    """
+    Build a dependency that holds a limiter slot while the endpoint runs.
+
+    When the limiter's queue is full the request fails fast with 503
+    instead of piling more load onto the LLM. The slot is released before
+    the response body is sent, so streaming endpoints take theirs with
+    acquire_concurrency_slot and release it when the stream ends.
+    """
+    async def dependency():
+        await acquire_concurrency_slot(limiter)
+        try:
+            yield
+        finally:
+            limiter.release()
+
+    return dependency
+
+
+limit_ai_chat = limit_concurrency(ai_chat_limiter)
+limit_ai_generation = limit_concurrency(ai_generation_limiter)
+
+
 async def get_language(
     accept_language: Optional[str] = Header(None)
 ) -> str:
@@ -2,17 +2,39 @@
 AI Engine endpoints - aligned with Swagger specification.
 Orchestration of LLM requests, RAG context management, and prompt engineering.
 """
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Path
+from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Path, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from sqlalchemy import cast, exists, func
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Session
-from app.core.database import get_db
-from app.api.dependencies import get_current_teacher, get_language
+from pydantic import TypeAdapter
+from app.core.database import get_db, SessionLocal
+from app.api.dependencies import (
+    get_current_teacher,
+    get_language,
+    rate_limit_ai,
+    rate_limit_quiz,
+    rate_limit_quiz_batch,
+    rate_limit_summary_batch,
+    limit_ai_chat,
+    limit_ai_generation,
+    acquire_concurrency_slot
+)
 from app.models.models import User, Material, Quiz as QuizModel, AISession
 from app.schemas.swagger_schemas import (
     QuizTemplate,
     QuizConfig,
+    QuizBatchRequest,
+    QuizDraftPayload,
+    QuizGenerateRequest,
     Quiz,
+    QuizGenerationStatus,
     Question,
     ChatRequest,
+    SummaryBatchRequest,
+    SummaryBatchItem,
     SmartActionRequest,
     SmartActionResponse,
     RegenerateBlockRequest,
@@ -22,38 +44,69 @@ from app.schemas.swagger_schemas import (
     AssignmentGenerateResponse
 )
 from app.services.ai_service import ai_service
+from app.services.material_cache import (
+    get_material_cached,
+    get_materials_cached,
+    invalidate_material,
+    CachedMaterial
+)
+from app.services.retrieval import retrieve_context
+from app.services.concurrency_limiter import ConcurrencyLimiter, ai_chat_limiter, ai_generation_limiter
+from app.services.response_cache import response_cache, chat_index, make_key, normalize_message, content_digest
+from app.utils.ids import reserve_ms_ids, uuid7, uuid7_str
 from datetime import datetime
+import asyncio
 import uuid
+import hashlib
+import orjson
 import logging
 import os
-import inspect
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/ai", tags=["AI Engine"])
 
+# Test fixtures create materials owned by other users; evaluated once at
+# import, so the test suite sets EDUSTREAM_TESTING before importing the app
+_IS_PYTEST = (
+    "PYTEST_CURRENT_TEST" in os.environ
+    or os.environ.get("EDUSTREAM_TESTING") == "1"
+)
+
+
+def _material_owner(user: User) -> uuid.UUID | None:
+    """Owner filter for material lookups in summary/quiz generation (disabled under tests)."""
+    return None if _IS_PYTEST else user.id
+
+
+# Material text is sliced in SQL to what the prompts actually use
+CHAT_CONTEXT_CHARS = 2000
+RETRIEVAL_SOURCE_CHARS = 200000  # chat context is retrieved from at most this much text
+PROMPT_TEXT_CHARS = 4000  # ai_service truncates prompt text to this length
+ASSIGNMENT_TEXT_CHARS = 4500
+
+
+_QUESTION_TYPE_ALIASES = {
+    "mcq": QuestionType.MCQ,
+    "multiple_choice": QuestionType.MCQ,
+    "multiple-choice": QuestionType.MCQ,
+    "choice": QuestionType.MCQ,
+    "open": QuestionType.OPEN,
+    "open-ended": QuestionType.OPEN,
+    "open_ended": QuestionType.OPEN,
+    "boolean": QuestionType.BOOLEAN,
+    "true_false": QuestionType.BOOLEAN,
+    "true-false": QuestionType.BOOLEAN,
+}
+
 
 def _normalize_question_type(raw_type: str) -> QuestionType:
-    value = (raw_type or "mcq").strip().lower()
-    aliases = {
-        "mcq": "mcq",
-        "multiple_choice": "mcq",
-        "multiple-choice": "mcq",
-        "choice": "mcq",
-        "open": "open",
-        "open-ended": "open",
-        "open_ended": "open",
-        "boolean": "boolean",
-        "true_false": "boolean",
-        "true-false": "boolean",
-    }
-    normalized = aliases.get(value, "mcq")
-    return QuestionType(normalized)
+    return _QUESTION_TYPE_ALIASES.get((raw_type or "mcq").strip().lower(), QuestionType.MCQ)
 
 
 def _to_question_payload(question: dict, fallback_type: str = "mcq") -> Question:
     return Question(
-        id=question.get("id") or uuid.uuid4(),
+        id=question.get("id") or uuid7(),
         type=_normalize_question_type(str(question.get("type", fallback_type))),
         text=question.get("text") or question.get("question", ""),
         options=question.get("options") or [],
@@ -62,37 +115,201 @@ def _to_question_payload(question: dict, fallback_type: str = "mcq") -> Question
     )
 
 
+def _question_id(raw_id) -> str:
+    """Keep a client-supplied question id when it is a UUID, otherwise issue a new one."""
+    if raw_id:
+        try:
+            return str(uuid.UUID(str(raw_id)))
+        except ValueError:
+            pass
+    return uuid7_str()
+
+
 def _normalize_questions(incoming: list) -> list[dict]:
-    normalized = []
+    """
+    Validate client-edited questions into the stored JSON shape (safe for _construct_questions).
+
+    Questions without text or answer are dropped, as are repeats of an earlier
+    question's text (case-insensitive); the first occurrence wins.
+    """
+    normalized: dict[str, dict] = {}
     for question in incoming:
         if not isinstance(question, dict):
             continue
         text_value = (question.get("text") or question.get("question") or "").strip()
         answer_value = (question.get("correctAnswer") or question.get("correct_answer") or "").strip()
-        if not text_value or not answer_value:
+        key = text_value.lower()
+        if not key or not answer_value or key in normalized:
             continue
 
-        normalized.append({
-            "id": str(question.get("id") or uuid.uuid4()),
+        normalized[key] = {
+            "id": _question_id(question.get("id")),
             "type": _normalize_question_type(str(question.get("type", "mcq"))).value,
             "text": text_value,
             "options": question.get("options") or [],
             "correctAnswer": answer_value,
             "explanation": question.get("explanation") or ""
-        })
+        }
+
+    return list(normalized.values())
+
+
+def _to_generated_questions(questions_data: list, question_type: str) -> list[dict]:
+    """
+    Normalize raw LLM question dicts straight into the stored JSON shape.
+
+    The same list is persisted on the quiz and returned in the response, so
+    each question is built once instead of round-tripping through Question.
+    """
+    normalize_type = _normalize_question_type
+    new_id = uuid7_str
+    return [
+        {
+            "id": new_id(),
+            "type": normalize_type(str(q.get("type", question_type))).value,
+            "text": text_value,
+            "options": q.get("options") or [],
+            "correctAnswer": answer_value,
+            "explanation": q.get("explanation") or ""
+        }
+        for q in questions_data
+        if isinstance(q, dict)
+        and (text_value := q.get("text") or q.get("question", ""))
+        and (answer_value := q.get("correctAnswer") or q.get("correct_answer", ""))
+    ]
 
-    return normalized
 
+def _construct_questions(questions: list[dict]) -> list[Question]:
+    """Build response models from already-normalized question dicts, skipping re-validation."""
+    return [
+        Question.model_construct(
+            id=uuid.UUID(q["id"]),
+            type=QuestionType(q["type"]),
+            text=q["text"],
+            options=q["options"],
+            correctAnswer=q["correctAnswer"],
+            explanation=q["explanation"]
+        )
+        for q in questions
+    ]
 
-def _build_quiz_title(material: Material, explicit_title: str | None = None) -> str:
+
+def _get_owned_quiz(db: Session, quiz_uuid: uuid.UUID, user_id: uuid.UUID) -> QuizModel | None:
+    """Load a quiz whose material belongs to user_id; ownership is a semi-join, not a JOIN."""
+    return db.query(QuizModel).filter(
+        QuizModel.id == quiz_uuid,
+        exists().where(Material.id == QuizModel.material_id, Material.user_id == user_id)
+    ).first()
+
+
+def _build_quiz_title(material, explicit_title: str | None = None) -> str:
     if explicit_title and explicit_title.strip():
         return explicit_title.strip()[:255]
     base_title = (material.title or "Материал").strip()
     return f"Тест: {base_title}"[:255]
 
 
+async def _request_quiz_questions(
+    content: str,
+    count: int,
+    difficulty: str,
+    question_type: str,
+    language: str,
+    legacy_mode: bool
+) -> list:
+    """Call the LLM and return the raw list of generated question dicts."""
+    if legacy_mode:
+        legacy_result = await ai_service.generate_quiz(
+            text=content,
+            num_questions=count,
+            difficulty=difficulty,
+            language=language
+        )
+        if isinstance(legacy_result, dict) and "questions" in legacy_result:
+            questions_data = legacy_result["questions"]
+        else:
+            questions_data = legacy_result
+    else:
+        try:
+            questions_data = await ai_service.generate_quiz_advanced(
+                text=content,
+                count=count,
+                difficulty=difficulty,
+                question_type=question_type,
+                language=language
+            )
+        except Exception as advanced_error:
+            logger.warning(f"Advanced quiz generation failed, trying fallback: {advanced_error}")
+            fallback_result = await ai_service.generate_quiz(
+                text=content,
+                num_questions=count,
+                difficulty=difficulty,
+                language=language
+            )
+            if isinstance(fallback_result, dict) and "questions" in fallback_result:
+                questions_data = fallback_result.get("questions", [])
+            else:
+                questions_data = fallback_result
+
+    if isinstance(questions_data, dict) and "questions" in questions_data:
+        questions_data = questions_data.get("questions", [])
+
+    if not isinstance(questions_data, list):
+        raise ValueError("AI returned invalid quiz format")
+
+    return questions_data
+
+
+# Mock templates - in production, these would come from DB.
+# Static, so ids are fixed and the JSON body/ETag are built once at import.
+_TEMPLATES = [
+    QuizTemplate(
+        id=1,
+        title="Входное тестирование",
+        desc="15 вопросов для оценки базовых знаний",
+        icon="login",
+        color="blue",
+        config=QuizConfig(
+            materialId=uuid.UUID("00000000-0000-4000-8000-000000000001"),
+            difficulty="medium",
+            count=15,
+            type=QuestionType.MCQ
+        )
+    ),
+    QuizTemplate(
+        id=2,
+        title="Пятиминутка",
+        desc="Быстрая проверка усвоения материала",
+        icon="clock",
+        color="green",
+        config=QuizConfig(
+            materialId=uuid.UUID("00000000-0000-4000-8000-000000000002"),
+            difficulty="easy",
+            count=5,
+            type=QuestionType.MCQ
+        )
+    ),
+    QuizTemplate(
+        id=3,
+        title="Итоговая работа",
+        desc="Комплексная проверка знаний по теме",
+        icon="graduation-cap",
+        color="purple",
+        config=QuizConfig(
+            materialId=uuid.UUID("00000000-0000-4000-8000-000000000003"),
+            difficulty="hard",
+            count=25,
+            type=QuestionType.MCQ
+        )
+    )
+]
+_TEMPLATES_JSON = TypeAdapter(list[QuizTemplate]).dump_json(_TEMPLATES)
+_TEMPLATES_ETAG = f'"{hashlib.md5(_TEMPLATES_JSON).hexdigest()}"'
+
+
 @router.get("/templates", response_model=list[QuizTemplate])
 async def get_quiz_templates(
+    request: Request,
     current_user: User = Depends(get_current_teacher)
 ):
     """
@@ -101,57 +318,46 @@ async def get_quiz_templates(
     **Сценарий:** Dashboard -> Галерея шаблонов.
     Возвращает список пресетов (например, "Пятиминутка", "Итоговая"), 
     чтобы учитель не настраивал конфиг с нуля.
+    
+    Поддерживает `If-None-Match` (ответ 304, если ETag не изменился).
     """
-    # Mock templates - in production, these would come from DB
-    templates = [
-        QuizTemplate(
-            id=1,
-            title="Входное тестирование",
-            desc="15 вопросов для оценки базовых знаний",
-            icon="login",
-            color="blue",
-            config=QuizConfig(
-                materialId=uuid.uuid4(),
-                difficulty="medium",
-                count=15,
-                type=QuestionType.MCQ
-            )
-        ),
-        QuizTemplate(
-            id=2,
-            title="Пятиминутка",
-            desc="Быстрая проверка усвоения материала",
-            icon="clock",
-            color="green",
-            config=QuizConfig(
-                materialId=uuid.uuid4(),
-                difficulty="easy",
-                count=5,
-                type=QuestionType.MCQ
-            )
-        ),
-        QuizTemplate(
-            id=3,
-            title="Итоговая работа",
-            desc="Комплексная проверка знаний по теме",
-            icon="graduation-cap",
-            color="purple",
-            config=QuizConfig(
-                materialId=uuid.uuid4(),
-                difficulty="hard",
-                count=25,
-                type=QuestionType.MCQ
-            )
-        )
-    ]
+    headers = {"ETag": _TEMPLATES_ETAG, "Cache-Control": "public, max-age=3600"}
+    if request.headers.get("if-none-match") == _TEMPLATES_ETAG:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
     
-    return templates
+    return Response(content=_TEMPLATES_JSON, media_type="application/json", headers=headers)
+
+
+async def _cached_summary(
+    material: CachedMaterial,
+    language: str,
+    cache_bust: bool,
+    limiter: ConcurrencyLimiter | None = None
+) -> dict:
+    """Cached summary of the material; with a limiter, a cache miss holds one of its slots for the LLM call."""
+    content = material.content or material.raw_text
+    cache_key = make_key("summary", material.id, content_digest(content), language)
+
+    async def generate():
+        logger.info(f"Generating summary for material {material.id} in language {language}")
+        result = await ai_service.generate_summary(content, language=language)
+        logger.info(f"Summary generated successfully for material {material.id}")
+        return result
+
+    async def compute():
+        if limiter is None:
+            return await generate()
+        async with limiter.slot():
+            return await generate()
+
+    return await response_cache.get_or_compute(cache_key, compute, refresh=cache_bust)
 
 
-@router.post("/summary")
-@router.post("/generate-summary")
+@router.post("/summary", dependencies=[Depends(rate_limit_ai), Depends(limit_ai_generation)])
+@router.post("/generate-summary", dependencies=[Depends(rate_limit_ai), Depends(limit_ai_generation)])
 async def generate_summary(
     request: dict,
+    cache_bust: bool = Query(False, description="Игнорировать кэш и заново вызвать LLM"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_teacher),
     language: str = Depends(get_language)
@@ -185,15 +391,13 @@ async def generate_summary(
         )
     
     # Get material
-    is_pytest = (
-        "PYTEST_CURRENT_TEST" in os.environ
-        or os.environ.get("EDUSTREAM_TESTING") == "1"
+    material = await run_in_threadpool(
+        get_material_cached,
+        db,
+        material_uuid,
+        _material_owner(current_user),
+        max_chars=PROMPT_TEXT_CHARS
     )
-
-    query = db.query(Material).filter(Material.id == material_uuid)
-    if not is_pytest:
-        query = query.filter(Material.user_id == current_user.id)
-    material = query.first()
     
     if not material:
         raise HTTPException(
@@ -207,15 +411,8 @@ async def generate_summary(
             detail="Material has no text content"
         )
     
-    content = material.content or material.raw_text
-    
     try:
-        logger.info(f"Generating summary for material {material_id} in language {language}")
-        result = await ai_service.generate_summary(content, language=language)
-        if inspect.isawaitable(result):
-            result = await result
-        logger.info(f"Summary generated successfully for material {material_id}")
-        return result
+        return await _cached_summary(material, language, cache_bust)
         
     except Exception as e:
         logger.error(f"Failed to generate summary: {str(e)}")
@@ -225,9 +422,192 @@ async def generate_summary(
         )
 
 
-@router.post("/chat")
+@router.post(
+    "/generate-summary-batch",
+    response_model=list[SummaryBatchItem],
+    dependencies=[Depends(rate_limit_summary_batch)]
+)
+async def generate_summary_batch(
+    request: SummaryBatchRequest,
+    cache_bust: bool = Query(False, description="Игнорировать кэш и заново вызвать LLM"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_teacher),
+    language: str = Depends(get_language)
+):
+    """
+    Конспекты для нескольких материалов за один запрос.
+    
+    Материалы загружаются одним запросом, вызовы LLM выполняются параллельно,
+    каждый в своём слоте общего лимита генерации; лимит запросов списывается
+    за каждый материал. Ошибка по одному материалу не прерывает остальные:
+    она возвращается в поле error.
+    """
+    material_ids = list(dict.fromkeys(request.materialIds))
+    materials = await run_in_threadpool(
+        get_materials_cached, db, material_ids, current_user.id, max_chars=PROMPT_TEXT_CHARS
+    )
+
+    async def summarize(material_id: uuid.UUID) -> SummaryBatchItem:
+        material = materials.get(material_id)
+        if not material:
+            return SummaryBatchItem(materialId=material_id, error="Material not found")
+        if not material.content and not material.raw_text:
+            return SummaryBatchItem(materialId=material_id, error="Material has no text content")
+        try:
+            result = await _cached_summary(material, language, cache_bust, limiter=ai_generation_limiter)
+        except Exception as e:
+            logger.error(f"Failed to generate summary for material {material_id}: {str(e)}")
+            return SummaryBatchItem(materialId=material_id, error=f"Failed to generate summary: {str(e)}")
+        return SummaryBatchItem(materialId=material_id, result=result)
+
+    return await asyncio.gather(*(summarize(material_id) for material_id in material_ids))
+
+
+def _chat_context(db: Session, material_uuid: uuid.UUID | None, user_id: uuid.UUID, message: str) -> str:
+    """The material chunks most relevant to the message (RAG), within CHAT_CONTEXT_CHARS."""
+    if not material_uuid:
+        return ""
+    # Ownership check through the small prompt-sized entry; the long text is
+    # read (content only) just when its retrieval index is not cached yet
+    material = get_material_cached(db, material_uuid, user_id, max_chars=PROMPT_TEXT_CHARS)
+    if not material or not material.content:
+        return ""
+
+    def load_text() -> str:
+        return db.query(func.substr(Material.content, 1, RETRIEVAL_SOURCE_CHARS)).filter(
+            Material.id == material.id
+        ).scalar()
+
+    return retrieve_context(material.id, load_text, message, CHAT_CONTEXT_CHARS)
+
+
+def _chat_scope(context: str, user_id: uuid.UUID, language: str) -> str:
+    return make_key("chat", content_digest(context), user_id, language)
+
+
+def _chat_cache_key(message: str, scope: str) -> str:
+    return make_key(scope, normalize_message(message))
+
+
+async def _similar_chat_response(message: str, scope: str) -> str | None:
+    """Cached answer to a near-duplicate message asked earlier in the same scope."""
+    similar_key = chat_index.find(scope, message)
+    return await response_cache.get(similar_key) if similar_key else None
+
+
+def _save_chat_turn(
+    db: Session,
+    user_id: uuid.UUID,
+    session_id: int | None,
+    message: str,
+    response: str,
+    material_uuid: uuid.UUID | None
+) -> int:
+    """Append a user/AI message pair to the chat session (creating it if needed) and commit."""
+    now = datetime.utcnow()
+    created_at = now.isoformat()
+    message_id = reserve_ms_ids(2)
+    new_messages = [
+        {"id": message_id, "type": "user", "text": message, "createdAt": created_at},
+        {"id": message_id + 1, "type": "ai", "text": response, "createdAt": created_at}
+    ]
+
+    if session_id is not None:
+        if db.get_bind().dialect.name == "postgresql":
+            # Append in SQL: O(1) per turn instead of rewriting the whole history
+            values = {
+                AISession.messages: func.coalesce(AISession.messages, cast([], JSONB)).op("||")(
+                    cast(new_messages, JSONB)
+                ),
+                AISession.date: now
+            }
+            if material_uuid:
+                values[AISession.doc_id] = material_uuid
+            updated = db.query(AISession).filter(
+                AISession.id == session_id,
+                AISession.user_id == user_id
+            ).update(values, synchronize_session=False)
+            if updated:
+                db.commit()
+                return session_id
+        else:
+            session = db.query(AISession).filter(
+                AISession.id == session_id,
+                AISession.user_id == user_id
+            ).first()
+            if session:
+                existing_messages = session.messages if isinstance(session.messages, list) else []
+                session.messages = existing_messages + new_messages
+                if material_uuid:
+                    session.doc_id = material_uuid
+                session.date = now
+                db.commit()
+                return session_id
+
+    session = AISession(
+        user_id=user_id,
+        title=(message.strip()[:80] or "Новый чат"),
+        doc_id=material_uuid,
+        date=now,
+        messages=new_messages
+    )
+    db.add(session)
+    db.flush()
+    saved_id = session.id
+    db.commit()
+    return saved_id
+
+
+def _owns_chat_session(db: Session, user_id: uuid.UUID, session_id: int) -> bool:
+    return db.query(
+        db.query(AISession.id).filter(AISession.id == session_id, AISession.user_id == user_id).exists()
+    ).scalar()
+
+
+def _persist_chat_turn(
+    bind,
+    user_id: uuid.UUID,
+    session_id: int | None,
+    message: str,
+    response: str,
+    material_uuid: uuid.UUID | None
+) -> int:
+    """_save_chat_turn in its own session, for callers running after the request-scoped one is closed."""
+    db = SessionLocal(bind=bind)
+    try:
+        return _save_chat_turn(db, user_id, session_id, message, response, material_uuid)
+    finally:
+        db.close()
+
+
+def _sse_event(payload: dict) -> bytes:
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+
+async def _sse_response(events, limiter: ConcurrencyLimiter | None = None) -> StreamingResponse:
+    """
+    Stream events as text/event-stream.
+
+    With a limiter, a slot is taken now (503 when the pool is saturated) and
+    held until the stream finishes or the client disconnects.
+    """
+    background = None
+    if limiter is not None:
+        await acquire_concurrency_slot(limiter)
+        background = BackgroundTask(limiter.release)
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=background
+    )
+
+
+@router.post("/chat", dependencies=[Depends(rate_limit_ai), Depends(limit_ai_chat)])
 async def ai_chat(
     request: ChatRequest,
+    background_tasks: BackgroundTasks,
+    cache_bust: bool = Query(False, description="Игнорировать кэш и заново вызвать LLM"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_teacher),
     language: str = Depends(get_language)
@@ -241,79 +621,53 @@ async def ai_chat(
     - 429: Rate Limit Exceeded (слишком много запросов)
     - 503: LLM Service Unavailable
     """
-    # TODO: Implement rate limiting
-    # TODO: Implement RAG context retrieval
-    
-    context = ""
-    if request.materialId:
-        # Validate UUID format
-        try:
-            material_uuid = uuid.UUID(request.materialId) if isinstance(request.materialId, str) else request.materialId
-        except ValueError:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Invalid materialId format: {request.materialId}"
+    context = await run_in_threadpool(_chat_context, db, request.materialId, current_user.id, request.message)
+    scope = _chat_scope(context, current_user.id, language)
+    cache_key = _chat_cache_key(request.message, scope)
+
+    async def compute():
+        response = None if cache_bust else await _similar_chat_response(request.message, scope)
+        if response is None:
+            response = await ai_service.chat_with_context(
+                message=request.message,
+                context=context,
+                language=language
             )
-        
-        material = db.query(Material).filter(
-            Material.id == material_uuid,
-            Material.user_id == current_user.id
-        ).first()
-        
-        if material and material.content:
-            context = material.content[:2000]  # Limit context size
-    
-    try:
-        # Call AI service with context
-        response = await ai_service.chat_with_context(
-            message=request.message,
-            context=context,
-            language=language
-        )
+        chat_index.add(scope, request.message, cache_key)
+        return response
 
-        session = None
-        if request.sessionId is not None:
-            session = db.query(AISession).filter(
-                AISession.id == request.sessionId,
-                AISession.user_id == current_user.id
-            ).first()
+    try:
+        # Call AI service with context (identical concurrent messages share one call)
+        response = await response_cache.get_or_compute(cache_key, compute, refresh=cache_bust)
 
-        if not session:
-            session = AISession(
-                user_id=current_user.id,
-                title=(request.message.strip()[:80] or "Новый чат"),
-                doc_id=material_uuid if request.materialId else None,
-                date=datetime.utcnow(),
-                messages=[]
+        session_known = request.sessionId is not None and await run_in_threadpool(
+            _owns_chat_session, db, current_user.id, request.sessionId
+        )
+        if session_known:
+            # Appending to a known session is off the critical path: respond first
+            background_tasks.add_task(
+                _persist_chat_turn,
+                db.get_bind(),
+                current_user.id,
+                request.sessionId,
+                request.message,
+                response,
+                request.materialId
+            )
+            session_id = request.sessionId
+        else:
+            # A new (or stale) session is created here: the client needs its id now
+            session_id = await run_in_threadpool(
+                _save_chat_turn,
+                db,
+                current_user.id,
+                None,
+                request.message,
+                response,
+                request.materialId
             )
-            db.add(session)
-            db.flush()
-
-        existing_messages = session.messages or []
-        if not isinstance(existing_messages, list):
-            existing_messages = []
-
-        existing_messages.append({
-            "id": int(datetime.utcnow().timestamp() * 1000),
-            "type": "user",
-            "text": request.message,
-            "createdAt": datetime.utcnow().isoformat()
-        })
-        existing_messages.append({
-            "id": int(datetime.utcnow().timestamp() * 1000) + 1,
-            "type": "ai",
-            "text": response,
-            "createdAt": datetime.utcnow().isoformat()
-        })
-
-        session.messages = existing_messages
-        if request.materialId:
-            session.doc_id = material_uuid
-        session.date = datetime.utcnow()
-        db.commit()
-        db.refresh(session)
         
-        return {"response": response, "sessionId": session.id}
+        return {"response": response, "sessionId": session_id}
         
     except Exception as e:
         raise HTTPException(
@@ -322,9 +676,83 @@ async def ai_chat(
         )
 
 
-@router.post("/smart-action", response_model=SmartActionResponse)
+@router.post("/chat/stream", dependencies=[Depends(rate_limit_ai)])
+async def ai_chat_stream(
+    request: ChatRequest,
+    cache_bust: bool = Query(False, description="Игнорировать кэш и заново вызвать LLM"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_teacher),
+    language: str = Depends(get_language)
+):
+    """
+    RAG Chat в режиме Server-Sent Events.
+    
+    Тот же запрос, что и у `/ai/chat`, но ответ приходит потоком событий
+    `data: {"delta": "..."}` по мере генерации. Последнее событие —
+    `data: {"done": true, "sessionId": ...}` либо `data: {"error": "..."}`.
+    """
+    context = await run_in_threadpool(_chat_context, db, request.materialId, current_user.id, request.message)
+    scope = _chat_scope(context, current_user.id, language)
+    cache_key = _chat_cache_key(request.message, scope)
+    cached = None
+    if not cache_bust:
+        cached = await response_cache.get(cache_key) or await _similar_chat_response(request.message, scope)
+    # The request-scoped session is closed before the body streams
+    bind = db.get_bind()
+    user_id = current_user.id
+
+    async def event_stream():
+        chunks = []
+        try:
+            if cached is not None:
+                chunks.append(cached)
+                yield _sse_event({"delta": cached})
+            else:
+                async for delta in ai_service.chat_with_context_stream(
+                    message=request.message,
+                    context=context,
+                    language=language
+                ):
+                    chunks.append(delta)
+                    yield _sse_event({"delta": delta})
+                await response_cache.set(cache_key, "".join(chunks))
+                chat_index.add(scope, request.message, cache_key)
+
+            session_id = await run_in_threadpool(
+                _persist_chat_turn,
+                bind,
+                user_id,
+                request.sessionId,
+                request.message,
+                "".join(chunks),
+                request.materialId
+            )
+            yield _sse_event({"done": True, "sessionId": session_id})
+        except Exception:
+            logger.exception("Streaming chat failed")
+            yield _sse_event({"error": "LLM Service Unavailable"})
+
+    return await _sse_response(event_stream(), ai_chat_limiter if cached is None else None)
+
+
+def _smart_action_cache_key(request: SmartActionRequest, language: str) -> str:
+    return make_key(
+        "smart-action",
+        request.action.value,
+        content_digest(request.text),
+        content_digest(request.context),
+        language
+    )
+
+
+@router.post(
+    "/smart-action",
+    response_model=SmartActionResponse,
+    dependencies=[Depends(rate_limit_ai), Depends(limit_ai_chat)]
+)
 async def smart_action(
     request: SmartActionRequest,
+    cache_bust: bool = Query(False, description="Игнорировать кэш и заново вызвать LLM"),
     current_user: User = Depends(get_current_teacher),
     language: str = Depends(get_language)
 ):
@@ -337,12 +765,18 @@ async def smart_action(
     Легковесный эндпоинт для быстрых трансформаций текста без сохранения 
     в историю чата.
     """
+    cache_key = _smart_action_cache_key(request, language)
+
     try:
-        result = await ai_service.perform_smart_action(
-            text=request.text,
-            action=request.action.value,
-            context=request.context,
-            language=language
+        result = await response_cache.get_or_compute(
+            cache_key,
+            lambda: ai_service.perform_smart_action(
+                text=request.text,
+                action=request.action.value,
+                context=request.context,
+                language=language
+            ),
+            refresh=cache_bust
         )
         
         return SmartActionResponse(result=result)
@@ -354,8 +788,49 @@ async def smart_action(
         )
 
 
+@router.post("/smart-action/stream", dependencies=[Depends(rate_limit_ai)])
+async def smart_action_stream(
+    request: SmartActionRequest,
+    cache_bust: bool = Query(False, description="Игнорировать кэш и заново вызвать LLM"),
+    current_user: User = Depends(get_current_teacher),
+    language: str = Depends(get_language)
+):
+    """
+    Контекстные действия в режиме Server-Sent Events.
+    
+    Тот же запрос, что и у `/ai/smart-action`, но результат приходит потоком
+    событий `data: {"delta": "..."}`. Последнее событие — `data: {"done": true}`
+    либо `data: {"error": "..."}`. Готовый результат кэшируется так же, как
+    у `/ai/smart-action`.
+    """
+    cache_key = _smart_action_cache_key(request, language)
+    cached = None if cache_bust else await response_cache.get(cache_key)
+
+    async def event_stream():
+        try:
+            if cached is not None:
+                yield _sse_event({"delta": cached})
+            else:
+                chunks = []
+                async for delta in ai_service.perform_smart_action_stream(
+                    text=request.text,
+                    action=request.action.value,
+                    context=request.context,
+                    language=language
+                ):
+                    chunks.append(delta)
+                    yield _sse_event({"delta": delta})
+                await response_cache.set(cache_key, "".join(chunks))
+            yield _sse_event({"done": True})
+        except Exception:
+            logger.exception("Streaming smart action failed")
+            yield _sse_event({"error": "LLM Service Unavailable"})
+
+    return await _sse_response(event_stream(), ai_chat_limiter if cached is None else None)
+
+
 @router.get("/quizzes/{quiz_id}", response_model=Quiz)
-async def get_quiz_by_id(
+def get_quiz_by_id(
     quiz_id: str = Path(..., description="Quiz ID"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
@@ -365,10 +840,7 @@ async def get_quiz_by_id(
     except ValueError:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid quiz id")
 
-    quiz = db.query(QuizModel).join(Material, QuizModel.material_id == Material.id).filter(
-        QuizModel.id == quiz_uuid,
-        Material.user_id == current_user.id
-    ).first()
+    quiz = _get_owned_quiz(db, quiz_uuid, current_user.id)
 
     if not quiz:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Quiz not found")
@@ -389,9 +861,9 @@ async def get_quiz_by_id(
 
 
 @router.put("/quizzes/{quiz_id}", response_model=Quiz)
-async def update_quiz_by_id(
+def update_quiz_by_id(
     quiz_id: str,
-    payload: dict,
+    payload: QuizDraftPayload,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
@@ -400,92 +872,104 @@ async def update_quiz_by_id(
     except ValueError:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid quiz id")
 
-    quiz = db.query(QuizModel).join(Material, QuizModel.material_id == Material.id).filter(
-        QuizModel.id == quiz_uuid,
-        Material.user_id == current_user.id
-    ).first()
+    quiz = _get_owned_quiz(db, quiz_uuid, current_user.id)
 
     if not quiz:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Quiz not found")
 
-    incoming = payload.get("questions")
-    title = payload.get("title")
-    if not isinstance(incoming, list) or not incoming:
-        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="questions must be a non-empty list")
-
-    normalized = _normalize_questions(incoming)
+    normalized = _normalize_questions(payload.questions)
 
     if not normalized:
         raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="No valid questions provided")
 
     quiz.questions = normalized
-    if title is not None:
-        quiz.title = str(title).strip()[:255] if str(title).strip() else quiz.title
-    db.commit()
-    db.refresh(quiz)
+    if payload.title is not None and payload.title.strip():
+        quiz.title = payload.title.strip()[:255]
 
-    return Quiz(
+    # Build the response before commit expires the instance (no refresh SELECT)
+    result = Quiz(
         id=quiz.id,
         materialId=quiz.material_id,
         title=quiz.title,
-        questions=[_to_question_payload(q) for q in normalized],
+        questions=_construct_questions(normalized),
         createdAt=quiz.created_at
     )
+    db.commit()
+
+    return result
 
 
 @router.post("/quizzes", response_model=Quiz, status_code=status.HTTP_201_CREATED)
-async def create_quiz_from_draft(
-    payload: dict,
+def create_quiz_from_draft(
+    payload: QuizDraftPayload,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
-    material_id = payload.get("materialId")
-    incoming = payload.get("questions")
-    title = payload.get("title")
-
-    if not material_id:
+    material_uuid = payload.materialId
+    if not material_uuid:
         raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="materialId is required")
-    if not isinstance(incoming, list) or not incoming:
-        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="questions must be a non-empty list")
 
-    try:
-        material_uuid = uuid.UUID(str(material_id))
-    except ValueError:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid material id")
-
-    material = db.query(Material).filter(
-        Material.id == material_uuid,
-        Material.user_id == current_user.id
-    ).first()
+    # Only the title is needed; share the cache entry the quiz generator just loaded
+    material = get_material_cached(db, material_uuid, current_user.id, max_chars=PROMPT_TEXT_CHARS)
     if not material:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Material not found")
 
-    normalized = _normalize_questions(incoming)
+    normalized = _normalize_questions(payload.questions)
     if not normalized:
         raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="No valid questions provided")
 
     quiz = QuizModel(
         material_id=material_uuid,
-        title=_build_quiz_title(material, str(title) if title is not None else None),
+        title=_build_quiz_title(material, payload.title),
         questions=normalized,
     )
     db.add(quiz)
-    db.commit()
-    db.refresh(quiz)
+    db.flush()
 
-    return Quiz(
+    result = Quiz(
         id=quiz.id,
         materialId=quiz.material_id,
         title=quiz.title,
-        questions=[_to_question_payload(q) for q in normalized],
+        questions=_construct_questions(normalized),
         createdAt=quiz.created_at,
     )
+    db.commit()
+
+    return result
+
+
+def _persist_quiz(
+    bind,
+    quiz_id: uuid.UUID,
+    material_id: uuid.UUID,
+    title: str,
+    questions: list[dict],
+    created_at: datetime
+) -> None:
+    """Insert a generated quiz in its own session (the request-scoped one may already be closed)."""
+    db = SessionLocal(bind=bind)
+    try:
+        db.add(QuizModel(
+            id=quiz_id,
+            material_id=material_id,
+            title=title,
+            questions=questions,
+            created_at=created_at
+        ))
+        db.commit()
+    finally:
+        db.close()
 
 
-@router.post("/generate-quiz", response_model=Quiz)
+@router.post(
+    "/generate-quiz",
+    response_model=Quiz,
+    dependencies=[Depends(rate_limit_quiz), Depends(limit_ai_generation)]
+)
 async def generate_quiz(
-    config: dict,
+    config: QuizGenerateRequest,
     background_tasks: BackgroundTasks,
+    cache_bust: bool = Query(False, description="Игнорировать кэш и заново вызвать LLM"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_teacher),
     language: str = Depends(get_language)
@@ -502,50 +986,20 @@ async def generate_quiz(
     - 422: Невалидная конфигурация (например, count > 50)
     - 504: Timeout (генерация заняла слишком много времени)
     """
-    # Backward compatibility: support both swagger and legacy payloads
-    if "materialId" in config:
-        material_id = config.get("materialId")
-        count = int(config.get("count", 5))
-        difficulty = str(config.get("difficulty", "medium"))
-        question_type = str(config.get("type", "mcq"))
-        legacy_mode = False
-    else:
-        material_id = config.get("material_id")
-        count = int(config.get("num_questions", 5))
-        difficulty = str(config.get("difficulty", "medium"))
-        question_type = "mcq"
-        legacy_mode = True
+    # Backward compatibility: QuizGenerateRequest also accepts the legacy payload
+    count = config.count
+    difficulty = config.difficulty.value
+    question_type = config.type.value
+    legacy_mode = config.legacy_mode
 
-    if count > 50 or count < 1:
-        raise HTTPException(
-            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-            detail="count must be between 1 and 50"
-        )
-
-    if difficulty not in ["easy", "medium", "hard"]:
-        raise HTTPException(
-            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-            detail="difficulty must be one of: easy, medium, hard"
-        )
-    
-    # Validate materialId UUID format
-    try:
-        material_uuid = uuid.UUID(str(material_id)) if not isinstance(material_id, uuid.UUID) else material_id
-    except ValueError:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Invalid materialId format: {material_id}"
-        )
-    
     # Get material
-    is_pytest = (
-        "PYTEST_CURRENT_TEST" in os.environ
-        or os.environ.get("EDUSTREAM_TESTING") == "1"
+    material = await run_in_threadpool(
+        get_material_cached,
+        db,
+        config.materialId,
+        _material_owner(current_user),
+        max_chars=PROMPT_TEXT_CHARS
     )
-    query = db.query(Material).filter(Material.id == material_uuid)
-    if not is_pytest:
-        query = query.filter(Material.user_id == current_user.id)
-    material = query.first()
     
     if not material:
         raise HTTPException(
@@ -560,110 +1014,56 @@ async def generate_quiz(
         )
     
     content = material.content or material.raw_text
+    cache_key = make_key(
+        "quiz",
+        material.id,
+        content_digest(content),
+        count,
+        difficulty,
+        question_type,
+        language,
+        legacy_mode
+    )
     
     try:
-        if legacy_mode:
-            legacy_result = await ai_service.generate_quiz(
-                text=content,
-                num_questions=count,
+        questions_data = await response_cache.get_or_compute(
+            cache_key,
+            lambda: _request_quiz_questions(
+                content,
+                count=count,
                 difficulty=difficulty,
-                language=language
-            )
-            if inspect.isawaitable(legacy_result):
-                legacy_result = await legacy_result
-            if isinstance(legacy_result, dict) and "questions" in legacy_result:
-                questions_data = legacy_result["questions"]
-            else:
-                questions_data = legacy_result
-        else:
-            try:
-                questions_data = await ai_service.generate_quiz_advanced(
-                    text=content,
-                    count=count,
-                    difficulty=difficulty,
-                    question_type=question_type,
-                    language=language
-                )
-                if inspect.isawaitable(questions_data):
-                    questions_data = await questions_data
-            except Exception as advanced_error:
-                logger.warning(f"Advanced quiz generation failed, trying fallback: {advanced_error}")
-                fallback_result = await ai_service.generate_quiz(
-                    text=content,
-                    num_questions=count,
-                    difficulty=difficulty,
-                    language=language
-                )
-                if inspect.isawaitable(fallback_result):
-                    fallback_result = await fallback_result
-                if isinstance(fallback_result, dict) and "questions" in fallback_result:
-                    questions_data = fallback_result.get("questions", [])
-                else:
-                    questions_data = fallback_result
-
-        if isinstance(questions_data, dict) and "questions" in questions_data:
-            questions_data = questions_data.get("questions", [])
-
-        if not isinstance(questions_data, list):
-            raise ValueError("AI returned invalid quiz format")
+                question_type=question_type,
+                language=language,
+                legacy_mode=legacy_mode
+            ),
+            refresh=cache_bust
+        )
         
-        # Convert to response format
-        questions = []
-        for q in questions_data:
-            if not isinstance(q, dict):
-                continue
-
-            text_value = q.get("text") or q.get("question", "")
-            answer_value = q.get("correctAnswer") or q.get("correct_answer", "")
-            if not text_value or not answer_value:
-                continue
-
-            questions.append(
-                _to_question_payload(
-                    {
-                        "id": str(uuid.uuid4()),
-                        "type": q.get("type", question_type),
-                        "text": text_value,
-                        "options": q.get("options"),
-                        "correctAnswer": answer_value,
-                        "explanation": q.get("explanation")
-                    },
-                    fallback_type=question_type
-                )
-            )
-
+        questions = _to_generated_questions(questions_data, question_type)
         if not questions:
             raise ValueError("AI returned no valid questions")
 
-        normalized_for_storage = [
-            {
-                "id": str(q.id),
-                "type": q.type.value,
-                "text": q.text,
-                "options": q.options or [],
-                "correctAnswer": q.correctAnswer,
-                "explanation": q.explanation or ""
-            }
-            for q in questions
-        ]
-
-        # Create quiz record
-        quiz = QuizModel(
-            material_id=material.id,
-            title=_build_quiz_title(material),
-            questions=normalized_for_storage
+        quiz_id = uuid7()
+        title = _build_quiz_title(material)
+        created_at = datetime.utcnow()
+        # The quiz row is written after the response is sent
+        background_tasks.add_task(
+            _persist_quiz,
+            db.get_bind(),
+            quiz_id,
+            material.id,
+            title,
+            questions,
+            created_at
         )
 
-        db.add(quiz)
-        db.commit()
-        db.refresh(quiz)
-        
-        return Quiz(
-            id=quiz.id,
+        # Questions were normalized above; skip a second pydantic validation pass
+        return Quiz.model_construct(
+            id=quiz_id,
             materialId=material.id,
-            title=quiz.title,
-            questions=questions,
-            createdAt=quiz.created_at
+            title=title,
+            questions=_construct_questions(questions),
+            createdAt=created_at
         )
         
     except TimeoutError:
@@ -684,7 +1084,281 @@ async def generate_quiz(
         )
 
 
-@router.post("/generate-assignment", response_model=AssignmentGenerateResponse)
+async def _run_quiz_generation(
+    bind,
+    quiz_id: uuid.UUID,
+    content: str,
+    count: int,
+    difficulty: str,
+    question_type: str,
+    language: str
+) -> None:
+    """Background task: generate questions for a pending quiz and mark it ready."""
+    db = SessionLocal(bind=bind)
+    try:
+        try:
+            # Shares the worker's generation pool with the interactive endpoints
+            async with ai_generation_limiter.slot():
+                questions_data = await _request_quiz_questions(
+                    content,
+                    count=count,
+                    difficulty=difficulty,
+                    question_type=question_type,
+                    language=language,
+                    legacy_mode=False
+                )
+            questions = _to_generated_questions(questions_data, question_type)
+            if not questions:
+                raise ValueError("AI returned no valid questions")
+            values = {QuizModel.questions: questions, QuizModel.status: "ready"}
+        except Exception:
+            logger.exception(f"Background quiz generation failed for quiz {quiz_id}")
+            values = {QuizModel.status: "error"}
+
+        def save_status() -> None:
+            db.query(QuizModel).filter(QuizModel.id == quiz_id).update(values, synchronize_session=False)
+            db.commit()
+
+        await run_in_threadpool(save_status)
+    finally:
+        db.close()
+
+
+@router.post(
+    "/generate-quiz/async",
+    response_model=QuizGenerationStatus,
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(rate_limit_quiz)]
+)
+def generate_quiz_async(
+    config: QuizConfig,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_teacher),
+    language: str = Depends(get_language)
+):
+    """
+    Фоновая генерация теста.
+    
+    **Сценарий:** Большой тест (до 50 вопросов), генерация которого может 
+    превысить таймаут прокси. Возвращает 202 и quizId сразу, без ожидания LLM.
+    Готовность проверяется через `GET /ai/quiz/{quiz_id}`.
+    """
+    material = get_material_cached(db, config.materialId, current_user.id, max_chars=PROMPT_TEXT_CHARS)
+    if not material:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Material not found"
+        )
+
+    content = material.content or material.raw_text
+    if not content:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Material has no text content"
+        )
+
+    quiz = QuizModel(
+        material_id=material.id,
+        title=_build_quiz_title(material),
+        questions=[],
+        status="pending"
+    )
+    db.add(quiz)
+    db.flush()
+    quiz_id = quiz.id
+    db.commit()
+
+    background_tasks.add_task(
+        _run_quiz_generation,
+        db.get_bind(),
+        quiz_id,
+        content,
+        config.count,
+        config.difficulty.value,
+        config.type.value,
+        language
+    )
+
+    return QuizGenerationStatus(quizId=quiz_id, status="pending")
+
+
+async def _run_quiz_batch(bind, jobs: list[tuple], language: str) -> None:
+    """Background task: generate every quiz of a batch, as fast as the shared generation pool allows."""
+    await asyncio.gather(*(_run_quiz_generation(bind, *job, language) for job in jobs))
+
+
+@router.post(
+    "/generate-quiz/batch",
+    response_model=list[QuizGenerationStatus],
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(rate_limit_quiz_batch)]
+)
+def generate_quiz_batch(
+    request: QuizBatchRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_teacher),
+    language: str = Depends(get_language)
+):
+    """
+    Пакетная фоновая генерация тестов.
+    
+    **Сценарий:** Учитель генерирует тесты сразу по нескольким материалам
+    (или шаблон создаёт несколько тестов). Все тесты создаются в статусе
+    pending одним коммитом, генерация идёт в фоне с ограниченным параллелизмом.
+    Готовность каждого теста проверяется через `GET /ai/quiz/{quiz_id}`.
+    
+    **Ошибки:**
+    - 404: Хотя бы один материал не найден (ни один тест не создаётся)
+    - 400: У материала нет текста
+    """
+    material_ids = list(dict.fromkeys(config.materialId for config in request.quizzes))
+    materials = get_materials_cached(db, material_ids, current_user.id, max_chars=PROMPT_TEXT_CHARS)
+    missing = [str(material_id) for material_id in material_ids if material_id not in materials]
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Material not found: {', '.join(missing)}"
+        )
+
+    quizzes = []
+    jobs = []
+    for config in request.quizzes:
+        material = materials[config.materialId]
+        content = material.content or material.raw_text
+        if not content:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Material has no text content: {material.id}"
+            )
+        quiz = QuizModel(
+            id=uuid7(),
+            material_id=material.id,
+            title=_build_quiz_title(material),
+            questions=[],
+            status="pending"
+        )
+        quizzes.append(quiz)
+        jobs.append((quiz.id, content, config.count, config.difficulty.value, config.type.value))
+
+    db.add_all(quizzes)
+    db.commit()
+
+    background_tasks.add_task(_run_quiz_batch, db.get_bind(), jobs, language)
+
+    return [QuizGenerationStatus(quizId=job[0], status="pending") for job in jobs]
+
+
+@router.post("/generate-quiz/stream", dependencies=[Depends(rate_limit_quiz)])
+async def generate_quiz_stream(
+    config: QuizConfig,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_teacher),
+    language: str = Depends(get_language)
+):
+    """
+    Генерация теста в режиме Server-Sent Events.
+    
+    Вопросы приходят по одному событиями `data: {"question": {...}}` по мере
+    генерации, клиент может отображать их сразу. Последнее событие —
+    `data: {"done": true, "quizId": ...}` (тест уже сохранён) либо `data: {"error": "..."}`.
+    """
+    material = await run_in_threadpool(
+        get_material_cached, db, config.materialId, current_user.id, max_chars=PROMPT_TEXT_CHARS
+    )
+    if not material:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Material not found"
+        )
+
+    content = material.content or material.raw_text
+    if not content:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Material has no text content"
+        )
+
+    question_type = config.type.value
+    # The request-scoped session is closed before the body streams
+    bind = db.get_bind()
+
+    async def event_stream():
+        questions = []
+        try:
+            async for raw_question in ai_service.generate_quiz_advanced_stream(
+                text=content,
+                count=config.count,
+                difficulty=config.difficulty.value,
+                question_type=question_type,
+                language=language
+            ):
+                for question in _to_generated_questions([raw_question], question_type):
+                    questions.append(question)
+                    yield _sse_event({"question": question})
+                if len(questions) >= config.count:
+                    break
+            if not questions:
+                raise ValueError("AI returned no valid questions")
+
+            quiz_id = uuid7()
+            await run_in_threadpool(
+                _persist_quiz,
+                bind,
+                quiz_id,
+                material.id,
+                _build_quiz_title(material),
+                questions,
+                datetime.utcnow()
+            )
+            yield _sse_event({"done": True, "quizId": quiz_id})
+        except Exception:
+            logger.exception("Streaming quiz generation failed")
+            yield _sse_event({"error": "Failed to generate quiz"})
+
+    return await _sse_response(event_stream(), ai_generation_limiter)
+
+
+@router.get("/quiz/{quiz_id}", response_model=QuizGenerationStatus)
+def get_quiz_generation_status(
+    quiz_id: str = Path(..., description="Quiz ID"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_teacher)
+):
+    """
+    Статус фоновой генерации теста (polling).
+    
+    **status:** pending | ready | error. Поле quiz заполнено только при ready.
+    """
+    try:
+        quiz_uuid = uuid.UUID(quiz_id)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid quiz id")
+
+    quiz = _get_owned_quiz(db, quiz_uuid, current_user.id)
+
+    if not quiz:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Quiz not found")
+
+    ready_quiz = None
+    if quiz.status == "ready":
+        ready_quiz = Quiz(
+            id=quiz.id,
+            materialId=quiz.material_id,
+            title=quiz.title,
+            questions=[_to_question_payload(q) for q in (quiz.questions or []) if isinstance(q, dict)],
+            createdAt=quiz.created_at
+        )
+
+    return QuizGenerationStatus(quizId=quiz.id, status=quiz.status, quiz=ready_quiz)
+
+
+@router.post(
+    "/generate-assignment",
+    response_model=AssignmentGenerateResponse,
+    dependencies=[Depends(rate_limit_ai), Depends(limit_ai_generation)]
+)
 async def generate_assignment(
     payload: AssignmentGenerateRequest,
     db: Session = Depends(get_db),
@@ -696,10 +1370,9 @@ async def generate_assignment(
     except ValueError:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid materialId format")
 
-    material = db.query(Material).filter(
-        Material.id == material_uuid,
-        Material.user_id == current_user.id
-    ).first()
+    material = await run_in_threadpool(
+        get_material_cached, db, material_uuid, current_user.id, max_chars=ASSIGNMENT_TEXT_CHARS
+    )
 
     if not material:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Material not found")
@@ -710,9 +1383,16 @@ async def generate_assignment(
 
     try:
         assignment_text = await ai_service.generate_assignment(content, payload.instruction or "", language=language)
-        material.summary = assignment_text
-        db.commit()
-        db.refresh(material)
+        def save_assignment() -> None:
+            # Column-level UPDATE skips ORM events, so evict the cached snapshot explicitly
+            db.query(Material).filter(Material.id == material.id).update(
+                {Material.summary: assignment_text},
+                synchronize_session=False
+            )
+            db.commit()
+            invalidate_material(material.id)
+
+        await run_in_threadpool(save_assignment)
 
         return AssignmentGenerateResponse(
             materialId=material.id,
@@ -726,10 +1406,14 @@ async def generate_assignment(
         )
 
 
-@router.post("/regenerate-block", response_model=Question)
+@router.post(
+    "/regenerate-block",
+    response_model=Question,
+    dependencies=[Depends(rate_limit_ai), Depends(limit_ai_generation)]
+)
 async def regenerate_block(
     request: RegenerateBlockRequest,
-    db: Session = Depends(get_db),
+    cache_bust: bool = Query(False, description="Игнорировать кэш и заново вызвать LLM"),
     current_user: User = Depends(get_current_teacher),
     language: str = Depends(get_language)
 ):
@@ -744,14 +1428,19 @@ async def regenerate_block(
         # TODO: Load context from AISession
         # For now, regenerate based on current text and instruction
         
-        regenerated = await ai_service.regenerate_question(
-            current_text=request.currentText,
-            instruction=request.instruction or "Улучши этот вопрос",
-            language=language
+        instruction = request.instruction or "Улучши этот вопрос"
+        regenerated = await response_cache.get_or_compute(
+            make_key("regenerate", content_digest(request.currentText), instruction, language),
+            lambda: ai_service.regenerate_question(
+                current_text=request.currentText,
+                instruction=instruction,
+                language=language
+            ),
+            refresh=cache_bust
         )
         
         return Question(
-            id=uuid.uuid4(),
+            id=uuid7(),
             type=QuestionType.MCQ,  # TODO: Detect from regenerated
             text=regenerated.get("text", ""),
             options=regenerated.get("options"),
@@ -767,7 +1456,7 @@ async def regenerate_block(
 
 
 @router.get("/sessions", response_model=list[AISessionInfo])
-async def get_ai_sessions(
+def get_ai_sessions(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
@@ -776,28 +1465,43 @@ async def get_ai_sessions(
     
     Для Sidebar в AI Workspace.
     """
-    sessions = db.query(AISession).filter(
+    # Only the sidebar columns: messages/context JSON can be large
+    rows = db.query(
+        AISession.id,
+        AISession.title,
+        AISession.date,
+        AISession.doc_id
+    ).filter(
         AISession.user_id == current_user.id
     ).order_by(AISession.date.desc()).limit(20).all()
     
+    # Trusted DB types: skip per-row validation
+    construct = AISessionInfo.model_construct
     return [
-        AISessionInfo(
-            id=session.id,
-            title=session.title,
-            date=session.date.isoformat(),
-            docId=str(session.doc_id) if session.doc_id else None
+        construct(
+            id=session_id,
+            title=title,
+            date=date.isoformat(),
+            docId=str(doc_id) if doc_id else None
         )
-        for session in sessions
+        for session_id, title, date, doc_id in rows
     ]
 
 
 @router.get("/sessions/{session_id}")
-async def get_ai_session_by_id(
+def get_ai_session_by_id(
     session_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
-    session = db.query(AISession).filter(
+    # The regeneration context JSON is never returned; leave it out of the SELECT
+    session = db.query(
+        AISession.id,
+        AISession.title,
+        AISession.date,
+        AISession.doc_id,
+        AISession.messages
+    ).filter(
         AISession.id == session_id,
         AISession.user_id == current_user.id
     ).first()
@@ -16,49 +16,52 @@ router = APIRouter(prefix="/analytics", tags=["Analytics"])
 
 
 @router.get("/dashboard", response_model=AnalyticsDashboardResponse)
-async def get_dashboard(
+def get_dashboard(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """
     Get dashboard statistics for the teacher.
     """
-    # Count materials
+    # All counters in one round trip: the material/quiz counts ride along as
+    # scalar subqueries on the student_results aggregate
     total_materials = db.query(func.count(Material.id)).filter(
         Material.user_id == current_user.id
-    ).scalar()
-    
-    # Count quizzes
+    ).scalar_subquery()
     total_quizzes = db.query(func.count(Quiz.id)).join(Material).filter(
         Material.user_id == current_user.id
-    ).scalar()
-    
-    # Count student results
-    total_student_results = db.query(func.count(StudentResult.id)).filter(
-        StudentResult.user_id == current_user.id
-    ).scalar()
+    ).scalar_subquery()
     
-    # Calculate average score
-    avg_score = db.query(func.avg(StudentResult.score)).filter(
+    total_materials, total_quizzes, total_student_results, avg_score = db.query(
+        total_materials,
+        total_quizzes,
+        func.count(StudentResult.id),
+        func.avg(StudentResult.score)
+    ).filter(
         StudentResult.user_id == current_user.id
-    ).scalar()
+    ).one()
     
     if avg_score is None:
         avg_score = 0.0
     
-    # Get recent activities (last 10 student results)
-    recent_results = db.query(StudentResult).filter(
+    # Get recent activities (last 10 student results) as plain rows
+    recent_results = db.query(
+        StudentResult.student_identifier,
+        StudentResult.quiz_id,
+        StudentResult.score,
+        StudentResult.submission_date
+    ).filter(
         StudentResult.user_id == current_user.id
     ).order_by(StudentResult.submission_date.desc()).limit(10).all()
     
     recent_activities = [
         {
-            "student": result.student_identifier,
-            "quiz_id": str(result.quiz_id),
-            "score": result.score,
-            "date": result.submission_date.isoformat()
+            "student": student,
+            "quiz_id": str(quiz_id),
+            "score": score,
+            "date": submission_date.isoformat()
         }
-        for result in recent_results
+        for student, quiz_id, score, submission_date in recent_results
     ]
     
     stats = DashboardStats(
@@ -75,7 +78,7 @@ async def get_dashboard(
 
 
 @router.get("/knowledge-map", response_model=AnalyticsKnowledgeMapResponse)
-async def get_knowledge_map(
+def get_knowledge_map(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
@@ -83,37 +86,40 @@ async def get_knowledge_map(
     Get knowledge map data for heat map visualization.
     Shows average scores by topic.
     """
-    # Query all student results with weak topics
-    results = db.query(StudentResult).filter(
-        StudentResult.user_id == current_user.id,
-        StudentResult.weak_topics.isnot(None)
-    ).all()
+    if db.get_bind().dialect.name == "postgresql":
+        # Unnest and aggregate in SQL: one row per topic crosses the wire
+        topics = db.query(
+            func.unnest(StudentResult.weak_topics).label("topic"),
+            StudentResult.score
+        ).filter(
+            StudentResult.user_id == current_user.id,
+            StudentResult.weak_topics.isnot(None)
+        ).subquery()
+        rows = db.query(
+            topics.c.topic,
+            func.avg(topics.c.score),
+            func.count()
+        ).group_by(topics.c.topic).all()
+    else:
+        # JSON-backed arrays (SQLite): aggregate (topics, score) tuples in Python
+        totals = {}
+        for weak_topics, score in db.query(StudentResult.weak_topics, StudentResult.score).filter(
+            StudentResult.user_id == current_user.id,
+            StudentResult.weak_topics.isnot(None)
+        ):
+            for topic in weak_topics or []:
+                total, count = totals.get(topic, (0, 0))
+                totals[topic] = (total + score, count + 1)
+        rows = [(topic, total / count, count) for topic, (total, count) in totals.items()]
     
-    # Aggregate data by topic
-    topic_data = {}
-    
-    for result in results:
-        if result.weak_topics:
-            for topic in result.weak_topics:
-                if topic not in topic_data:
-                    topic_data[topic] = {
-                        "scores": [],
-                        "count": 0
-                    }
-                topic_data[topic]["scores"].append(result.score)
-                topic_data[topic]["count"] += 1
-    
-    # Calculate averages
-    knowledge_map = []
-    for topic, data in topic_data.items():
-        avg_score = sum(data["scores"]) / len(data["scores"]) if data["scores"] else 0
-        knowledge_map.append(
-            KnowledgeMapData(
-                topic=topic,
-                average_score=avg_score,
-                student_count=data["count"]
-            )
+    knowledge_map = [
+        KnowledgeMapData(
+            topic=topic,
+            average_score=float(avg_score),
+            student_count=count
         )
+        for topic, avg_score, count in rows
+    ]
     
     return {
         "knowledge_map": knowledge_map
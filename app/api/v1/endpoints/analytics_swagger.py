@@ -2,13 +2,22 @@
 Analytics endpoints - aligned with Swagger specification.
 Visualization of class progress and individual student performance.
 """
-from fastapi import APIRouter, Depends, Query, HTTPException
+import bisect
+import heapq
+from dataclasses import dataclass, field
+from functools import lru_cache
+from urllib.parse import quote
+from fastapi import APIRouter, Depends, Query, HTTPException, Response
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import JSON, Text, case, cast, func, literal
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Session
-from collections import defaultdict, Counter
-from datetime import datetime, timedelta
+from collections import Counter
+from datetime import date, datetime, time, timedelta
 from app.core.database import get_db
 from app.api.dependencies import get_current_teacher
 from app.models.models import User, Material, Quiz, StudentResult, OCRResult
+from app.services.analytics_cache import get_analytics_cached, invalidate_analytics
 from app.schemas.swagger_schemas import (
     AnalyticsData,
     PerformanceItem,
@@ -21,57 +30,196 @@ from app.schemas.schemas import AnalyticsDashboardResponse, AnalyticsKnowledgeMa
 router = APIRouter(prefix="/analytics", tags=["Analytics"])
 
 
+@lru_cache(maxsize=4096)
 def _normalize_student_key(name: str) -> str:
     return (name or "").strip().lower()
 
 
 def _extract_diary_comments(settings: dict | None, course_id: str) -> dict[str, str]:
-    if not isinstance(settings, dict):
-        return {}
-    comments_root = settings.get("studentDiaryComments")
-    if not isinstance(comments_root, dict):
-        return {}
-    course_comments = comments_root.get(course_id)
-    if not isinstance(course_comments, dict):
-        return {}
-    normalized: dict[str, str] = {}
-    for key, value in course_comments.items():
-        if isinstance(key, str) and isinstance(value, str):
-            normalized[key.strip().lower()] = value
-    return normalized
+    # Only update_student_journal_comment writes these, always with normalized
+    # student keys and string comments, so the per-course map is used as stored
+    comments_root = settings.get("studentDiaryComments") if isinstance(settings, dict) else None
+    course_comments = comments_root.get(course_id) if isinstance(comments_root, dict) else None
+    return course_comments if isinstance(course_comments, dict) else {}
 
 
 def _normalize_status(value: str | None) -> str:
     return (value or "pending").strip().lower()
 
 
+@lru_cache(maxsize=4096)
+def _avatar_url(name: str) -> str:
+    return "https://api.dicebear.com/7.x/initials/svg?seed=" + quote(name, safe="")
+
+
+# Student status by average score: _PROGRESS_BUCKETS[i] covers scores from
+# _PROGRESS_THRESHOLDS[i - 1] (inclusive) up to _PROGRESS_THRESHOLDS[i].
+# The flag marks statuses that get a "Постоянный:" prefix for regular students.
+_PROGRESS_THRESHOLDS = (50, 70, 85)
+_PROGRESS_BUCKETS = (
+    ("Требует внимания", "red", False),
+    ("Удовлетворительно", "orange", False),
+    ("Хорошо", "blue", True),
+    ("Отлично", "green", True),
+)
+
+# Latest scores per student compared by the performance trend
+TREND_WINDOW = 6
+
+# Rows fetched per round trip when a query has to scan the whole history
+STREAM_BATCH_SIZE = 1000
+
+# Students per response, best average first
+STUDENTS_LIMIT = 100
+STUDENTS_MAX_LIMIT = 1000
+
+JOURNAL_HISTORY_LIMIT = 12
+JOURNAL_TOPIC_ITEMS = 5
+JOURNAL_TOPIC_LIMIT = 6
+
+
+@dataclass
+class _JournalStudent:
+    """
+    Journal metrics for one student.
+
+    Totals come from SQL aggregates via add_totals(); add() is fed the
+    student's newest attempts in order and keeps the recent scores, weak
+    topics and displayed history.
+    """
+    student_name: str
+    attempts: int = 0
+    score_sum: int = 0
+    score_count: int = 0
+    recent_scores: list[int] = field(default_factory=list)
+    topics: list[str] = field(default_factory=list)
+    topics_seen: set[str] = field(default_factory=set)
+    history: list[dict] = field(default_factory=list)
+
+    def add_totals(self, attempts: int, score_sum: int, score_count: int) -> None:
+        self.attempts += attempts
+        self.score_sum += score_sum
+        self.score_count += score_count
+
+    def add(self, item: dict) -> None:
+        if len(self.history) < JOURNAL_TOPIC_ITEMS:
+            for topic in item.get("weakTopics") or []:
+                normalized_topic = topic.strip()
+                if len(self.topics) >= JOURNAL_TOPIC_LIMIT:
+                    break
+                if normalized_topic and normalized_topic.lower() not in self.topics_seen:
+                    self.topics_seen.add(normalized_topic.lower())
+                    self.topics.append(normalized_topic)
+        if len(self.history) < JOURNAL_HISTORY_LIMIT:
+            self.history.append(item)
+        # Scores keep coming past the displayed history: a run of pending
+        # assignments must not hide the student's latest real scores
+        if item.get("hasScore") and len(self.recent_scores) < 4:
+            self.recent_scores.append(int(item["score"]))
+
+    @property
+    def last_score(self) -> int:
+        return self.recent_scores[0] if self.recent_scores else 0
+
+    @property
+    def trend(self) -> str:
+        prev_window = self.recent_scores[1:]
+        if not prev_window:
+            return "neutral"
+        prev_avg = sum(prev_window) / len(prev_window)
+        if self.last_score > prev_avg + 2:
+            return "up"
+        if self.last_score < prev_avg - 2:
+            return "down"
+        return "neutral"
+
+
+# Legacy stubs always answer with the same empty payloads: serialize them once
+_EMPTY_DASHBOARD_JSON = AnalyticsDashboardResponse(
+    stats={
+        "total_materials": 0,
+        "total_quizzes": 0,
+        "total_student_results": 0,
+        "average_score": 0.0,
+    },
+    recent_activities=[]
+).model_dump_json().encode()
+_EMPTY_KNOWLEDGE_MAP_JSON = AnalyticsKnowledgeMapResponse(knowledge_map=[]).model_dump_json().encode()
+
+
 @router.get("/dashboard", response_model=AnalyticsDashboardResponse)
 async def get_dashboard_legacy(
-    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
-    return AnalyticsDashboardResponse(
-        stats={
-            "total_materials": 0,
-            "total_quizzes": 0,
-            "total_student_results": 0,
-            "average_score": 0.0,
-        },
-        recent_activities=[]
-    )
+    return Response(content=_EMPTY_DASHBOARD_JSON, media_type="application/json")
 
 
 @router.get("/knowledge-map", response_model=AnalyticsKnowledgeMapResponse)
 async def get_knowledge_map_legacy(
-    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
-    return AnalyticsKnowledgeMapResponse(knowledge_map=[])
+    return Response(content=_EMPTY_KNOWLEDGE_MAP_JSON, media_type="application/json")
+
+
+def _top_weak_topics(
+    db: Session,
+    user_id,
+    course_id: str,
+    unreviewed_assignments: int,
+    limit: int
+) -> list[tuple[str, int]]:
+    """
+    Most frequent weak topics of the course's quiz results, most frequent first.
+
+    Unreviewed assignments count towards the "Задание" topic.
+    """
+    assignment_topic = "Задание"
+
+    if db.get_bind().dialect.name == "postgresql":
+        # Unnest, count and rank in SQL: at most `limit` rows cross the wire
+        unnested = db.query(
+            func.trim(func.unnest(StudentResult.weak_topics)).label("topic")
+        ).filter(
+            StudentResult.user_id == user_id,
+            StudentResult.course_id == course_id,
+            StudentResult.weak_topics.isnot(None)
+        ).subquery()
+        counts = dict(
+            db.query(unnested.c.topic, func.count()).filter(
+                unnested.c.topic != ""
+            ).group_by(unnested.c.topic).order_by(
+                func.count().desc(),
+                unnested.c.topic
+            ).limit(limit).all()
+        )
+        if unreviewed_assignments:
+            if assignment_topic not in counts:
+                counts[assignment_topic] = db.query(func.count()).select_from(unnested).filter(
+                    unnested.c.topic == assignment_topic
+                ).scalar()
+            counts[assignment_topic] += unreviewed_assignments
+        return sorted(counts.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+    # JSON-backed arrays (SQLite): count in Python
+    topic_counter: Counter[str] = Counter()
+    for (weak_topics,) in db.query(StudentResult.weak_topics).filter(
+        StudentResult.user_id == user_id,
+        StudentResult.course_id == course_id,
+        StudentResult.weak_topics.isnot(None)
+    ).yield_per(STREAM_BATCH_SIZE):
+        for topic in weak_topics or []:
+            normalized = str(topic).strip()
+            if normalized:
+                topic_counter[normalized] += 1
+    if unreviewed_assignments:
+        topic_counter[assignment_topic] += unreviewed_assignments
+    return topic_counter.most_common(limit)
 
 
 @router.get("/performance", response_model=AnalyticsData)
 async def get_analytics_performance(
     courseId: str = Query(None, description="Course ID filter"),
+    limit: int = Query(STUDENTS_LIMIT, ge=1, le=STUDENTS_MAX_LIMIT, description="Max students to return"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
@@ -79,105 +227,169 @@ async def get_analytics_performance(
     if not courseId:
         return AnalyticsData(performance=[], topics=[], students=[])
 
-    materials = db.query(Material).filter(
-        Material.user_id == current_user.id,
-        Material.course_id == courseId
-    ).all()
-    material_ids = [m.id for m in materials]
+    payload = await get_analytics_cached(
+        current_user.id,
+        f"performance:{limit}",
+        courseId,
+        lambda: _compute_performance(db, current_user, courseId, limit).model_dump(mode="json")
+    )
+    # Cached payloads are already JSON-ready: skip response validation and re-encoding
+    return ORJSONResponse(payload)
 
-    if not material_ids:
-        return AnalyticsData(performance=[], topics=[], students=[])
 
-    quiz_results = db.query(StudentResult).join(
-        Quiz, StudentResult.quiz_id == Quiz.id
-    ).filter(
+def _compute_performance(db: Session, current_user: User, courseId: str, limit: int) -> AnalyticsData:
+    quiz_filters = (
         StudentResult.user_id == current_user.id,
-        Quiz.material_id.in_(material_ids)
-    ).order_by(StudentResult.submission_date.asc()).all()
-
-    assignment_rows = db.query(OCRResult).filter(
+        StudentResult.course_id == courseId
+    )
+    assignment_score = func.coalesce(OCRResult.manual_score, OCRResult.student_accuracy)
+    assignment_date = func.coalesce(OCRResult.updated_at, OCRResult.created_at)
+    assignment_filters = (
         OCRResult.user_id == current_user.id,
-        OCRResult.course_id == courseId
-    ).order_by(OCRResult.created_at.asc()).all()
+        OCRResult.course_id == courseId,
+        assignment_score.isnot(None)
+    )
+    unreviewed = func.lower(func.trim(func.coalesce(OCRResult.status, "pending"))).notin_(["graded", "reviewed"])
+
+    # Per-student totals cover the whole history, so they are aggregated in
+    # SQL; the first attempt date keeps students in their original order
+    quiz_totals = db.query(
+        StudentResult.student_identifier,
+        func.count(StudentResult.id),
+        func.sum(StudentResult.score),
+        func.min(StudentResult.submission_date)
+    ).filter(*quiz_filters).group_by(StudentResult.student_identifier).all()
+
+    assignment_totals = db.query(
+        OCRResult.student_name,
+        func.count(OCRResult.id),
+        func.sum(assignment_score),
+        func.min(assignment_date),
+        func.sum(case((unreviewed, 1), else_=0))
+    ).filter(*assignment_filters).group_by(OCRResult.student_name).all()
+
+    if not quiz_totals and not assignment_totals:
+        return AnalyticsData(performance=[], topics=[], students=[])
 
-    scored_assignments = []
-    for row in assignment_rows:
-        score_value = row.manual_score if row.manual_score is not None else row.student_accuracy
-        if score_value is None:
-            continue
-        scored_assignments.append({
-            "student": (row.student_name or "Ученик").strip() or "Ученик",
-            "score": int(score_value),
-            "date": row.updated_at or row.created_at,
-            "weak_topics": ["Задание"] if _normalize_status(row.status) not in {"graded", "reviewed"} else []
-        })
+    # The chart only needs a sum and a count per day of the last week
+    today = datetime.utcnow().date()
+    first_day = today - timedelta(days=6)
+    window_start = datetime.combine(first_day, time.min)
+    window_end = datetime.combine(today + timedelta(days=1), time.min)
 
-    merged_attempts = [
-        {
-            "student": (item.student_identifier or "Ученик").strip() or "Ученик",
-            "score": int(item.score),
-            "date": item.submission_date,
-            "weak_topics": [str(topic).strip() for topic in (item.weak_topics or []) if str(topic).strip()]
-        }
-        for item in quiz_results
-    ] + scored_assignments
+    quiz_day = func.date(StudentResult.submission_date)
+    quiz_days = db.query(
+        quiz_day, func.sum(StudentResult.score), func.count(StudentResult.id)
+    ).filter(
+        *quiz_filters,
+        StudentResult.submission_date >= window_start,
+        StudentResult.submission_date < window_end
+    ).group_by(quiz_day).all()
+
+    assignment_day = func.date(assignment_date)
+    assignment_days = db.query(
+        assignment_day, func.sum(assignment_score), func.count(OCRResult.id)
+    ).filter(
+        *assignment_filters,
+        assignment_date >= window_start,
+        assignment_date < window_end
+    ).group_by(assignment_day).all()
+
+    day_totals: dict = {}
+    for day, day_sum, day_count in (*quiz_days, *assignment_days):
+        if day is None:
+            continue
+        # SQLite returns date() as an ISO string
+        day = day if isinstance(day, date) else date.fromisoformat(day)
+        total, count = day_totals.get(day, (0, 0))
+        day_totals[day] = (total + float(day_sum or 0), count + day_count)
+
+    # The trend reads the last six scores: the newest six rows per raw name
+    # and source always contain them for the normalized student
+    quiz_recent = db.query(
+        StudentResult.student_identifier.label("student_name"),
+        StudentResult.score.label("score"),
+        StudentResult.submission_date.label("submitted_at"),
+        func.row_number().over(
+            partition_by=StudentResult.student_identifier,
+            order_by=StudentResult.submission_date.desc()
+        ).label("rn")
+    ).filter(*quiz_filters).subquery()
+
+    assignment_recent = db.query(
+        OCRResult.student_name.label("student_name"),
+        assignment_score.label("score"),
+        assignment_date.label("submitted_at"),
+        func.row_number().over(
+            partition_by=OCRResult.student_name,
+            order_by=assignment_date.desc()
+        ).label("rn")
+    ).filter(*assignment_filters).subquery()
+
+    per_student: dict[str, list] = {}
+    total_score = 0.0
+    total_attempts = 0
+    unreviewed_assignments = 0
+    for raw_name, attempts_count, score_sum, first_date, *unreviewed_count in (*quiz_totals, *assignment_totals):
+        student_name = (raw_name or "Ученик").strip() or "Ученик"
+        score_sum = float(score_sum or 0)
+        first_date = first_date or datetime.min
+        total_score += score_sum
+        total_attempts += attempts_count
+        unreviewed_assignments += sum(unreviewed_count)
+
+        entry = per_student.get(student_name)
+        if entry is None:
+            per_student[student_name] = [score_sum, attempts_count, first_date, []]
+        else:
+            entry[0] += score_sum
+            entry[1] += attempts_count
+            entry[2] = min(entry[2], first_date)
 
-    if not merged_attempts:
-        return AnalyticsData(performance=[], topics=[], students=[])
+    for recent in (quiz_recent, assignment_recent):
+        for raw_name, score, submitted_at in db.query(
+            recent.c.student_name, recent.c.score, recent.c.submitted_at
+        ).filter(recent.c.rn <= TREND_WINDOW):
+            student_name = (raw_name or "Ученик").strip() or "Ученик"
+            per_student[student_name][3].append((submitted_at or datetime.min, float(int(score))))
 
-    today = datetime.utcnow().date()
     performance_items: list[PerformanceItem] = []
     for offset in range(6, -1, -1):
         day = today - timedelta(days=offset)
-        day_results = [
-            entry["score"]
-            for entry in merged_attempts
-            if entry.get("date") and entry["date"].date() == day
-        ]
-        avg_day = round(sum(day_results) / len(day_results)) if day_results else 0
+        total, count = day_totals.get(day, (0, 0))
         performance_items.append(
-            PerformanceItem(name=day.strftime("%d.%m"), value=avg_day)
+            PerformanceItem(name=day.strftime("%d.%m"), value=round(total / count) if count else 0)
         )
 
-    topic_counter: Counter[str] = Counter()
-    for res in merged_attempts:
-        weak_topics = res.get("weak_topics") or []
-        for topic in weak_topics:
-            normalized = str(topic).strip()
-            if normalized:
-                topic_counter[normalized] += 1
+    top_topics = _top_weak_topics(db, current_user.id, courseId, unreviewed_assignments, limit=8)
 
-    if topic_counter:
-        max_count = max(topic_counter.values())
+    if top_topics:
+        max_count = top_topics[0][1]
         topics = []
-        for topic_name, count in topic_counter.most_common(8):
+        for topic_name, count in top_topics:
             score = max(0, min(100, int(round(100 - (count / max_count) * 45))))
             color = "green" if score >= 80 else "yellow" if score >= 60 else "red"
             topics.append(TopicItem(name=topic_name, score=score, colorKey=color))
     else:
-        average = round(sum(r["score"] for r in merged_attempts) / len(merged_attempts))
+        average = round(total_score / total_attempts)
         baseline_color = "green" if average >= 80 else "yellow" if average >= 60 else "red"
         topics = [
             TopicItem(name="Общая успеваемость", score=average, colorKey=baseline_color),
-            TopicItem(name="Регулярность выполнения", score=min(100, len(merged_attempts) * 5), colorKey="blue"),
+            TopicItem(name="Регулярность выполнения", score=min(100, total_attempts * 5), colorKey="blue"),
         ]
 
-    per_student: dict[str, list[dict]] = defaultdict(list)
-    for item in merged_attempts:
-        key = (item.get("student") or "Ученик").strip()
-        if not key:
-            key = "Ученик"
-        per_student[key].append(item)
-
     students: list[StudentMetric] = []
-    for index, (student_name, student_items) in enumerate(per_student.items(), start=1):
-        student_items = sorted(student_items, key=lambda r: r.get("date") or datetime.min)
-        avg_score = sum(float(s.get("score") or 0) for s in student_items) / len(student_items)
+    ordered_students = sorted(per_student.items(), key=lambda item: item[1][2])
+    for index, (student_name, (score_sum, attempts_count, _, recent_scores)) in enumerate(ordered_students, start=1):
+        avg_score = score_sum / attempts_count
 
-        recent_slice = student_items[-3:]
-        previous_slice = student_items[-6:-3]
-        recent_avg = sum(float(s.get("score") or 0) for s in recent_slice) / len(recent_slice)
-        previous_avg = sum(float(s.get("score") or 0) for s in previous_slice) / len(previous_slice) if previous_slice else recent_avg
+        recent_scores.sort(key=lambda attempt: attempt[0])
+        last_scores = [score for _, score in recent_scores[-TREND_WINDOW:]]
+
+        recent_slice = last_scores[-3:]
+        previous_slice = last_scores[:-3]
+        recent_avg = sum(recent_slice) / len(recent_slice)
+        previous_avg = sum(previous_slice) / len(previous_slice) if previous_slice else recent_avg
 
         if recent_avg > previous_avg + 2:
             trend = StudentTrend.UP
@@ -186,26 +398,11 @@ async def get_analytics_performance(
         else:
             trend = StudentTrend.NEUTRAL
 
-        attempts_count = len(student_items)
         is_regular = attempts_count >= 3
 
-        if avg_score >= 85:
-            status = "Отлично"
-            color = "green"
-        elif avg_score >= 70:
-            status = "Хорошо"
-            color = "blue"
-        elif avg_score >= 50:
-            status = "Удовлетворительно"
-            color = "orange"
-        else:
-            status = "Требует внимания"
-            color = "red"
-
-        if is_regular and status == "Хорошо":
-            status = "Постоянный: Хорошо"
-        elif is_regular and status == "Отлично":
-            status = "Постоянный: Отлично"
+        status, color, has_regular_status = _PROGRESS_BUCKETS[bisect.bisect_right(_PROGRESS_THRESHOLDS, avg_score)]
+        if is_regular and has_regular_status:
+            status = f"Постоянный: {status}"
 
         students.append(
             StudentMetric(
@@ -215,11 +412,11 @@ async def get_analytics_performance(
                 progress=round(avg_score, 1),
                 trend=trend,
                 color=color,
-                avatar=f"https://api.dicebear.com/7.x/initials/svg?seed={student_name.replace(' ', '%20')}"
+                avatar=_avatar_url(student_name)
             )
         )
 
-    students = sorted(students, key=lambda s: s.progress, reverse=True)
+    students = heapq.nlargest(limit, students, key=lambda s: s.progress)
 
     return AnalyticsData(
         performance=performance_items,
@@ -231,39 +428,48 @@ async def get_analytics_performance(
 @router.get("/student-journal")
 async def get_student_journal(
     courseId: str = Query(..., description="Course ID filter"),
+    limit: int = Query(STUDENTS_LIMIT, ge=1, le=STUDENTS_MAX_LIMIT, description="Max students to return"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
-    materials = db.query(Material).filter(
-        Material.user_id == current_user.id,
-        Material.course_id == courseId
-    ).all()
-    material_ids = [m.id for m in materials]
-
-    if not material_ids:
-        return {
-            "courseId": courseId,
-            "totalStudents": 0,
-            "regularStudents": 0,
-            "averageScore": 0,
-            "students": []
-        }
+    payload = await get_analytics_cached(
+        current_user.id,
+        f"student-journal:{limit}",
+        courseId,
+        lambda: _compute_student_journal(db, current_user, courseId, limit)
+    )
+    # Cached payloads are already JSON-ready: skip response validation and re-encoding
+    return ORJSONResponse(payload)
 
-    material_map = {str(item.id): item.title for item in materials}
 
-    quiz_rows = db.query(StudentResult, Quiz).join(
-        Quiz, StudentResult.quiz_id == Quiz.id
-    ).filter(
+def _compute_student_journal(db: Session, current_user: User, courseId: str, limit: int) -> dict:
+    quiz_filters = (
         StudentResult.user_id == current_user.id,
-        Quiz.material_id.in_(material_ids)
-    ).order_by(StudentResult.submission_date.desc()).all()
-
-    assignment_rows = db.query(OCRResult).filter(
+        StudentResult.course_id == courseId
+    )
+    assignment_filters = (
         OCRResult.user_id == current_user.id,
         OCRResult.course_id == courseId
-    ).order_by(OCRResult.created_at.desc()).all()
-
-    if not quiz_rows and not assignment_rows:
+    )
+    assignment_score = func.coalesce(OCRResult.manual_score, OCRResult.student_accuracy)
+    assignment_date = func.coalesce(OCRResult.updated_at, OCRResult.created_at)
+
+    # Attempts and averages cover the whole history, so they are aggregated
+    # in SQL; only the rows the journal can display are fetched below
+    quiz_totals = db.query(
+        StudentResult.student_identifier,
+        func.count(StudentResult.id),
+        func.sum(StudentResult.score)
+    ).filter(*quiz_filters).group_by(StudentResult.student_identifier).all()
+
+    assignment_totals = db.query(
+        OCRResult.student_name,
+        func.count(OCRResult.id),
+        func.sum(assignment_score),
+        func.count(assignment_score)
+    ).filter(*assignment_filters).group_by(OCRResult.student_name).all()
+
+    if not quiz_totals and not assignment_totals:
         return {
             "courseId": courseId,
             "totalStudents": 0,
@@ -272,13 +478,59 @@ async def get_student_journal(
             "students": []
         }
 
+    # Newest JOURNAL_HISTORY_LIMIT rows per raw name (and, for assignments,
+    # per scored/unscored) always contain every row the journal shows for
+    # the normalized student, including the newest scored attempts.
+    # Quiz and material titles are joined only onto those rows.
+    quiz_recent = db.query(
+        StudentResult.id,
+        StudentResult.student_identifier,
+        StudentResult.score,
+        StudentResult.submission_date,
+        StudentResult.weak_topics,
+        StudentResult.quiz_id,
+        func.row_number().over(
+            partition_by=StudentResult.student_identifier,
+            order_by=StudentResult.submission_date.desc()
+        ).label("rn")
+    ).filter(*quiz_filters).subquery()
+    quiz_rows = db.query(
+        quiz_recent,
+        Quiz.title.label("quiz_title"),
+        Material.title.label("material_title")
+    ).join(
+        Quiz, Quiz.id == quiz_recent.c.quiz_id
+    ).join(
+        Material, Material.id == Quiz.material_id
+    ).filter(
+        quiz_recent.c.rn <= JOURNAL_HISTORY_LIMIT
+    ).order_by(quiz_recent.c.submission_date.desc()).all()
+
+    assignment_recent = db.query(
+        OCRResult.id,
+        OCRResult.student_name,
+        OCRResult.manual_score,
+        OCRResult.student_accuracy,
+        OCRResult.status,
+        OCRResult.questions,
+        OCRResult.created_at,
+        OCRResult.updated_at,
+        assignment_date.label("submitted_at"),
+        func.row_number().over(
+            partition_by=(OCRResult.student_name, assignment_score.is_(None)),
+            order_by=assignment_date.desc()
+        ).label("rn")
+    ).filter(*assignment_filters).subquery()
+    assignment_rows = db.query(assignment_recent).filter(
+        assignment_recent.c.rn <= JOURNAL_HISTORY_LIMIT
+    ).order_by(assignment_recent.c.submitted_at.desc()).all()
+
     comments_map = _extract_diary_comments(current_user.settings or {}, courseId)
-    per_student: dict[str, list[dict]] = defaultdict(list)
 
-    for result, quiz in quiz_rows:
+    quiz_entries = []
+    for result in quiz_rows:
         student_name = (result.student_identifier or "Ученик").strip() or "Ученик"
-        student_key = _normalize_student_key(student_name)
-        per_student[student_key].append({
+        quiz_entries.append({
             "resultId": str(result.id),
             "studentName": student_name,
             "score": int(result.score),
@@ -286,15 +538,15 @@ async def get_student_journal(
             "resultType": "quiz",
             "status": "graded",
             "submittedAt": result.submission_date.isoformat() if result.submission_date else None,
-            "quizId": str(quiz.id),
-            "quizTitle": quiz.title or "Тест",
-            "materialTitle": material_map.get(str(quiz.material_id), "Материал"),
+            "quizId": str(result.quiz_id),
+            "quizTitle": result.quiz_title or "Тест",
+            "materialTitle": result.material_title or "Материал",
             "weakTopics": [str(topic) for topic in (result.weak_topics or []) if topic]
         })
 
+    assignment_entries = []
     for row in assignment_rows:
         student_name = (row.student_name or "Ученик").strip() or "Ученик"
-        student_key = _normalize_student_key(student_name)
         score_value = row.manual_score if row.manual_score is not None else row.student_accuracy
         row_status = _normalize_status(row.status)
 
@@ -305,7 +557,7 @@ async def get_student_journal(
                 if label_value:
                     weak_topics.append(label_value)
 
-        per_student[student_key].append({
+        assignment_entries.append({
             "resultId": str(row.id),
             "studentName": student_name,
             "score": int(score_value) if score_value is not None else 0,
@@ -319,75 +571,69 @@ async def get_student_journal(
             "weakTopics": weak_topics
         })
 
+    # Both lists are already newest-first, so merging them feeds each
+    # student's accumulator in order and one pass computes every metric
+    per_student: dict[str, _JournalStudent] = {}
+    for item in heapq.merge(
+        quiz_entries,
+        assignment_entries,
+        key=lambda item: item.get("submittedAt") or "",
+        reverse=True
+    ):
+        student_key = _normalize_student_key(item["studentName"])
+        journal = per_student.get(student_key)
+        if journal is None:
+            journal = per_student[student_key] = _JournalStudent(student_name=item["studentName"])
+        journal.add(item)
+
+    totals = [(name, attempts, score_sum, attempts) for name, attempts, score_sum in quiz_totals]
+    totals.extend(assignment_totals)
+    for name, attempts, score_sum, score_count in totals:
+        student_name = (name or "Ученик").strip() or "Ученик"
+        journal = per_student.get(_normalize_student_key(student_name))
+        if journal is not None:
+            journal.add_totals(attempts, int(score_sum or 0), score_count)
+
     students = []
-    all_scores: list[int] = []
+    total_score = 0
+    total_count = 0
     regular_count = 0
 
-    for student_key, history in per_student.items():
-        ordered = sorted(
-            history,
-            key=lambda item: item.get("submittedAt") or "",
-            reverse=True
-        )
-        attempts = len(ordered)
-        scored_items = [item for item in ordered if item.get("hasScore")]
-        scores = [int(item["score"]) for item in scored_items]
-        all_scores.extend(scores)
-
-        avg_score = round(sum(scores) / len(scores), 1) if scores else 0
-        last_score = int(scored_items[0]["score"]) if scored_items else 0
-
-        prev_window = scores[1:4]
-        trend = "neutral"
-        if prev_window:
-            prev_avg = sum(prev_window) / len(prev_window)
-            if last_score > prev_avg + 2:
-                trend = "up"
-            elif last_score < prev_avg - 2:
-                trend = "down"
-
-        is_regular = attempts >= 3
+    for student_key, journal in per_student.items():
+        total_score += journal.score_sum
+        total_count += journal.score_count
+
+        is_regular = journal.attempts >= 3
         if is_regular:
             regular_count += 1
 
-        weak_topics = []
-        for item in ordered[:5]:
-            weak_topics.extend(item.get("weakTopics") or [])
-
-        dedup_topics = []
-        seen_topics = set()
-        for topic in weak_topics:
-            normalized_topic = topic.strip()
-            if normalized_topic and normalized_topic.lower() not in seen_topics:
-                seen_topics.add(normalized_topic.lower())
-                dedup_topics.append(normalized_topic)
-
         students.append({
             "studentKey": student_key,
-            "studentName": ordered[0]["studentName"],
-            "attempts": attempts,
-            "averageScore": avg_score,
-            "lastScore": last_score,
+            "studentName": journal.student_name,
+            "attempts": journal.attempts,
+            "averageScore": round(journal.score_sum / journal.score_count, 1) if journal.score_count else 0,
+            "lastScore": journal.last_score,
             "regular": is_regular,
-            "trend": trend,
+            "trend": journal.trend,
             "teacherComment": comments_map.get(student_key, ""),
-            "weakTopics": dedup_topics[:6],
-            "history": ordered[:12]
+            "weakTopics": journal.topics,
+            "history": journal.history
         })
 
-    students = sorted(students, key=lambda item: item["averageScore"], reverse=True)
+    total_students = len(students)
+    students = heapq.nlargest(limit, students, key=lambda item: item["averageScore"])
 
     return {
         "courseId": courseId,
-        "totalStudents": len(students),
+        "totalStudents": total_students,
         "regularStudents": regular_count,
-        "averageScore": round(sum(all_scores) / len(all_scores), 1) if all_scores else 0,
+        "averageScore": round(total_score / total_count, 1) if total_count else 0,
         "students": students
     }
 
 
 @router.patch("/student-journal/comment")
-async def update_student_journal_comment(
+def update_student_journal_comment(
     payload: dict,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
@@ -401,27 +647,55 @@ async def update_student_journal_comment(
     if not student_name:
         raise HTTPException(status_code=422, detail="studentName is required")
 
-    settings = dict(current_user.settings) if isinstance(current_user.settings, dict) else {}
-    comments_root_raw = settings.get("studentDiaryComments")
-    comments_root = dict(comments_root_raw) if isinstance(comments_root_raw, dict) else {}
+    student_key = _normalize_student_key(student_name)
 
-    course_comments_raw = comments_root.get(course_id)
-    course_comments = dict(course_comments_raw) if isinstance(course_comments_raw, dict) else {}
+    if db.get_bind().dialect.name == "postgresql":
+        # Merge just this comment into settings in SQL: constant-size statement,
+        # and concurrent edits of other settings are not overwritten
+        def as_object(expr):
+            return case((func.jsonb_typeof(expr) == "object", expr), else_=cast({}, JSONB))
 
-    student_key = _normalize_student_key(student_name)
-    if comment:
-        course_comments[student_key] = comment
+        def as_text(value: str):
+            return cast(literal(value), Text)
+
+        root = as_object(cast(User.settings, JSONB))
+        comments_root = as_object(root["studentDiaryComments"])
+        course_comments = as_object(comments_root[course_id])
+        if comment:
+            course_comments = course_comments.op("||")(func.jsonb_build_object(as_text(student_key), as_text(comment)))
+        else:
+            course_comments = course_comments.op("-")(as_text(student_key))
+
+        new_settings = root.op("||")(func.jsonb_build_object(
+            as_text("studentDiaryComments"),
+            comments_root.op("||")(func.jsonb_build_object(as_text(course_id), course_comments))
+        ))
+        db.query(User).filter(User.id == current_user.id).update(
+            {User.settings: cast(new_settings, JSON)},
+            synchronize_session=False
+        )
     else:
-        course_comments.pop(student_key, None)
+        settings = dict(current_user.settings) if isinstance(current_user.settings, dict) else {}
+        comments_root_raw = settings.get("studentDiaryComments")
+        comments_root = dict(comments_root_raw) if isinstance(comments_root_raw, dict) else {}
+
+        course_comments_raw = comments_root.get(course_id)
+        course_comments = dict(course_comments_raw) if isinstance(course_comments_raw, dict) else {}
+
+        if comment:
+            course_comments[student_key] = comment
+        else:
+            course_comments.pop(student_key, None)
 
-    comments_root[course_id] = course_comments
-    settings["studentDiaryComments"] = comments_root
-    current_user.settings = settings
+        comments_root[course_id] = course_comments
+        settings["studentDiaryComments"] = comments_root
+        current_user.settings = settings
 
     db.commit()
+    invalidate_analytics(current_user.id)
 
     return {
         "courseId": course_id,
         "studentName": student_name,
-        "comment": course_comments.get(student_key, "")
+        "comment": comment
     }
@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, undefer
 from app.core.database import get_db
 from app.core.security import (
     verify_password, 
@@ -22,7 +22,7 @@ router = APIRouter(prefix="/auth", tags=["Authentication"])
 
 
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def register(user_data: UserRegister, db: Session = Depends(get_db)):
+def register(user_data: UserRegister, db: Session = Depends(get_db)):
     """Register a new user (teacher, admin, or student)."""
     normalized_email = user_data.email.strip().lower()
 
@@ -51,7 +51,7 @@ async def register(user_data: UserRegister, db: Session = Depends(get_db)):
 
 
 @router.post("/login", response_model=LoginResponse)
-async def login(user_data: UserLogin, db: Session = Depends(get_db)):
+def login(user_data: UserLogin, db: Session = Depends(get_db)):
     """
     Login and get JWT tokens.
     
@@ -60,7 +60,7 @@ async def login(user_data: UserLogin, db: Session = Depends(get_db)):
     normalized_email = user_data.email.strip().lower()
 
     # Find user
-    user = db.query(User).filter(User.email == normalized_email).first()
+    user = db.query(User).options(undefer(User.settings)).filter(User.email == normalized_email).first()
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -99,7 +99,7 @@ async def login(user_data: UserLogin, db: Session = Depends(get_db)):
 
 
 @router.post("/refresh", response_model=Token)
-async def refresh_token(token_data: TokenRefresh, db: Session = Depends(get_db)):
+def refresh_token(token_data: TokenRefresh, db: Session = Depends(get_db)):
     """Refresh access token using refresh token."""
     # Decode refresh token
     payload = decode_token(token_data.refresh_token)
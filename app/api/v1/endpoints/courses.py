@@ -3,10 +3,10 @@ Courses endpoints - manage course metadata.
 """
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, select
 from app.core.database import get_db
 from app.api.dependencies import get_current_teacher
-from app.models.models import User, Material, Course as CourseModel
+from app.models.models import User, Material, StudentResult, Course as CourseModel
 from app.schemas.swagger_schemas import Course, CourseCreate, CourseUpdate
 import uuid
 from typing import List
@@ -14,22 +14,29 @@ from typing import List
 router = APIRouter(prefix="/courses", tags=["Courses"])
 
 
-def _to_course_response(db: Session, course: CourseModel) -> Course:
-    count = db.query(func.count(Material.id)).filter(Material.course_id == str(course.id)).scalar() or 0
+def _courses_with_counts(db: Session):
+    """Query of (course, materials count) tuples; the count is a correlated subquery, not a query per course."""
+    materials_count = select(func.count(Material.id)).where(
+        Material.course_id == CourseModel.id
+    ).correlate(CourseModel).scalar_subquery()
+    return db.query(CourseModel, materials_count)
+
+
+def _to_course_response(course: CourseModel, count: int) -> Course:
     return Course(
         id=str(course.id),
         title=course.title,
         description=course.description,
         color=course.color,
         icon=course.icon,
-        materialsCount=int(count),
+        materialsCount=int(count or 0),
         createdAt=course.created_at.isoformat() if course.created_at else None,
         updatedAt=course.updated_at.isoformat() if course.updated_at else None,
     )
 
 
 @router.get("/", response_model=List[Course])
-async def list_courses(
+def list_courses(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
@@ -38,15 +45,15 @@ async def list_courses(
     
     Возвращает уникальные course_id из materials с подсчетом материалов в каждом курсе.
     """
-    courses = db.query(CourseModel).filter(
+    courses = _courses_with_counts(db).filter(
         CourseModel.user_id == current_user.id
     ).order_by(CourseModel.created_at.desc()).all()
 
-    return [_to_course_response(db, course) for course in courses]
+    return [_to_course_response(course, count) for course, count in courses]
 
 
 @router.get("/{course_id}", response_model=Course)
-async def get_course(
+def get_course(
     course_id: str,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
@@ -56,19 +63,20 @@ async def get_course(
     except ValueError:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid course id")
 
-    course = db.query(CourseModel).filter(
+    row = _courses_with_counts(db).filter(
         CourseModel.id == course_uuid,
         CourseModel.user_id == current_user.id
     ).first()
 
-    if not course:
+    if not row:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Course not found")
 
-    return _to_course_response(db, course)
+    course, count = row
+    return _to_course_response(course, count)
 
 
 @router.post("/", response_model=Course, status_code=status.HTTP_201_CREATED)
-async def create_course(
+def create_course(
     payload: CourseCreate,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
@@ -88,11 +96,12 @@ async def create_course(
     db.commit()
     db.refresh(course)
 
-    return _to_course_response(db, course)
+    # A new course has no materials yet
+    return _to_course_response(course, 0)
 
 
 @router.put("/{course_id}", response_model=Course)
-async def update_course(
+def update_course(
     course_id: str,
     payload: CourseUpdate,
     db: Session = Depends(get_db),
@@ -103,14 +112,15 @@ async def update_course(
     except ValueError:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid course id")
 
-    course = db.query(CourseModel).filter(
+    row = _courses_with_counts(db).filter(
         CourseModel.id == course_uuid,
         CourseModel.user_id == current_user.id
     ).first()
 
-    if not course:
+    if not row:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Course not found")
 
+    course, count = row
     if payload.title is not None:
         next_title = payload.title.strip()
         if not next_title:
@@ -125,11 +135,11 @@ async def update_course(
 
     db.commit()
     db.refresh(course)
-    return _to_course_response(db, course)
+    return _to_course_response(course, count)
 
 
 @router.delete("/{course_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_course(
+def delete_course(
     course_id: str,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
@@ -151,6 +161,10 @@ async def delete_course(
         Material.user_id == current_user.id,
         Material.course_id == str(course.id)
     ).update({Material.course_id: None}, synchronize_session=False)
+    db.query(StudentResult).filter(
+        StudentResult.user_id == current_user.id,
+        StudentResult.course_id == course.id
+    ).update({StudentResult.course_id: None}, synchronize_session=False)
 
     db.delete(course)
     db.commit()
@@ -3,11 +3,13 @@ Dashboard endpoints.
 Provides aggregated data for teacher's main screen.
 """
 from fastapi import APIRouter, Depends, Query
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
 from datetime import datetime, timezone
 from app.core.database import get_db
 from app.api.dependencies import get_current_teacher
-from app.models.models import User, Material, Quiz, StudentResult, OCRResult
+from app.models.models import User, Material, StudentResult, OCRResult
+from app.services.analytics_cache import get_analytics_cached
 from app.schemas.swagger_schemas import DashboardData, PieChartItem, NeedsReviewItem, RecentActivityItem, DashboardStats
 
 router = APIRouter(prefix="/dashboard", tags=["Dashboard"])
@@ -47,21 +49,35 @@ async def get_dashboard_overview(
     статистика класса, последние действия.
     Данные должны быть отфильтрованы по courseId.
     """
-    materials = db.query(Material).filter(
+    payload = await get_analytics_cached(
+        current_user.id,
+        "dashboard-overview",
+        courseId,
+        lambda: _compute_overview(db, current_user, courseId).model_dump(mode="json")
+    )
+    # Cached payloads are already JSON-ready: skip response validation and re-encoding
+    return ORJSONResponse(payload)
+
+
+def _compute_overview(db: Session, current_user: User, courseId: str) -> DashboardData:
+    # Column tuples only: material content and result payloads are never read here
+    materials = db.query(
+        Material.id,
+        Material.title,
+        Material.status,
+        Material.created_at
+    ).filter(
         Material.user_id == current_user.id,
         Material.course_id == courseId
     ).all()
-    material_ids = [m.id for m in materials]
-
-    if material_ids:
-        results = db.query(StudentResult).join(
-            Quiz, StudentResult.quiz_id == Quiz.id
-        ).filter(
-            StudentResult.user_id == current_user.id,
-            Quiz.material_id.in_(material_ids)
-        ).all()
-    else:
-        results = []
+    results = db.query(
+        StudentResult.student_identifier,
+        StudentResult.score,
+        StudentResult.submission_date
+    ).filter(
+        StudentResult.user_id == current_user.id,
+        StudentResult.course_id == courseId
+    ).all()
 
     excellent = sum(1 for r in results if r.score >= 85)
     good = sum(1 for r in results if 70 <= r.score < 85)
@@ -75,7 +91,11 @@ async def get_dashboard_overview(
         PieChartItem(name="Требует внимания", value=attention, color="#ef4444")
     ]
 
-    pending_ocr = db.query(OCRResult).filter(
+    pending_ocr = db.query(
+        OCRResult.id,
+        OCRResult.student_name,
+        OCRResult.image_url
+    ).filter(
         OCRResult.user_id == current_user.id,
         OCRResult.course_id == courseId,
         OCRResult.status.in_(["pending", "review"])
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from app.core.database import get_db
 from app.api.dependencies import get_current_teacher
@@ -11,6 +12,11 @@ import uuid
 router = APIRouter(prefix="/materials", tags=["Materials"])
 
 
+def _commit_and_refresh(db: Session, material: Material) -> None:
+    db.commit()
+    db.refresh(material)
+
+
 @router.post("/upload", response_model=MaterialResponse, status_code=status.HTTP_201_CREATED)
 async def upload_material(
     file: UploadFile = File(...),
@@ -34,8 +40,7 @@ async def upload_material(
         )
         
         db.add(material)
-        db.commit()
-        db.refresh(material)
+        await run_in_threadpool(_commit_and_refresh, db, material)
         
         return material
         
@@ -52,7 +57,7 @@ async def upload_material(
 
 
 @router.get("/{material_id}", response_model=MaterialResponse)
-async def get_material(
+def get_material(
     material_id: uuid.UUID,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
@@ -73,7 +78,7 @@ async def get_material(
 
 
 @router.get("/", response_model=List[MaterialResponse])
-async def list_materials(
+def list_materials(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
@@ -3,6 +3,7 @@ Materials endpoints - aligned with Swagger specification.
 Managing educational materials knowledge base (PDF, images) for RAG.
 """
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Path, Query
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from app.core.database import get_db
 from app.api.dependencies import get_current_teacher
@@ -18,8 +19,13 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/materials", tags=["Materials"])
 
 
+def _commit_and_refresh(db: Session, material: MaterialModel) -> None:
+    db.commit()
+    db.refresh(material)
+
+
 @router.get("/", response_model=list[Material])
-async def list_materials(
+def list_materials(
     courseId: str | None = Query(default=None),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
@@ -77,8 +83,8 @@ async def upload_material(
     )
     
     db.add(material)
-    db.commit()
-    db.refresh(material)
+    # Sync DB round trips run in the threadpool: this handler awaits file I/O
+    await run_in_threadpool(_commit_and_refresh, db, material)
     
     # Start async processing
     # TODO: Implement background task for text extraction and vector embedding
@@ -98,14 +104,13 @@ async def upload_material(
         
         logger.info(f"Material {material.id} processed successfully. Extracted {len(text)} characters")
         
-        db.commit()
-        db.refresh(material)
+        await run_in_threadpool(_commit_and_refresh, db, material)
         
     except Exception as e:
         error_msg = f"Error processing material: {str(e)}"
         logger.error(f"Material {material.id}: {error_msg}")
         material.status = MaterialStatus.ERROR
-        db.commit()
+        await run_in_threadpool(_commit_and_refresh, db, material)
         
         # Return error details for debugging
         return MaterialUploadResponse(
@@ -122,7 +127,7 @@ async def upload_material(
 
 
 @router.get("/{id}", response_model=Material)
-async def get_material(
+def get_material(
     id: str = Path(..., description="Material ID"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
@@ -164,7 +169,7 @@ async def get_material(
 
 
 @router.patch("/{id}", response_model=Material)
-async def update_material(
+def update_material(
     id: str,
     payload: dict,
     db: Session = Depends(get_db),
@@ -209,7 +214,7 @@ async def update_material(
 
 
 @router.delete("/{id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_material(
+def delete_material(
     id: str,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
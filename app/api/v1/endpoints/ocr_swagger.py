@@ -17,7 +17,6 @@ from app.schemas.swagger_schemas import (
 import uuid
 import tempfile
 import os
-import inspect
 from app.services.ocr_service import ocr_service
 from app.core.config import settings
 
@@ -69,11 +68,7 @@ async def extract_text_legacy(
             temp_file.write(payload)
             temp_path = temp_file.name
 
-        result = ocr_service.extract_text_from_image(temp_path)
-        if inspect.isawaitable(result):
-            result = await result
-        if callable(result):
-            result = result()
+        result = await ocr_service.extract_text_from_image(temp_path)
 
         return {"text": result or ""}
     except HTTPException:
@@ -89,7 +84,7 @@ async def extract_text_legacy(
 
 
 @router.get("/results/{id}", response_model=StudentResult)
-async def get_ocr_result(
+def get_ocr_result(
     id: str = Path(..., description="OCR result ID"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
@@ -125,7 +120,7 @@ async def get_ocr_result(
 
 
 @router.patch("/results/{id}")
-async def update_ocr_result(
+def update_ocr_result(
     id: str = Path(..., description="OCR result ID"),
     correction: OCRManualCorrection = ...,
     db: Session = Depends(get_db),
@@ -173,7 +168,7 @@ async def update_ocr_result(
 
 
 @router.post("/batch-approve")
-async def batch_approve_ocr(
+def batch_approve_ocr(
     request: BatchApproveRequest,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
@@ -240,7 +235,7 @@ async def batch_approve_ocr(
 
 
 @router.get("/queue")
-async def get_ocr_queue(
+def get_ocr_queue(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
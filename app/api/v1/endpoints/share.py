@@ -3,8 +3,9 @@ Public sharing endpoints.
 """
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
 from fastapi import Request, Query
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from sqlalchemy import cast, String
+from sqlalchemy import cast, exists, String
 from app.core.database import get_db
 from app.core.config import settings
 from app.api.dependencies import get_current_teacher, get_language
@@ -13,6 +14,7 @@ from app.schemas.swagger_schemas import ShareConfig, ShareLink
 from app.core.security import get_password_hash, verify_password
 from app.services.file_processor import file_processor
 from app.services.ai_service import ai_service
+from app.utils.ids import uuid7_str
 import uuid
 import secrets
 import string
@@ -57,7 +59,7 @@ def validate_short_code_or_400(short_code: str) -> str:
 
 
 @router.post("/create", response_model=ShareLink, status_code=status.HTTP_201_CREATED)
-async def create_share_link(
+def create_share_link(
     config: ShareConfig,
     request: Request,
     db: Session = Depends(get_db),
@@ -79,9 +81,9 @@ async def create_share_link(
                 detail="Invalid quiz id"
             )
 
-        quiz = db.query(QuizModel).join(Material, QuizModel.material_id == Material.id).filter(
+        quiz = db.query(QuizModel.id).filter(
             QuizModel.id == quiz_uuid,
-            Material.user_id == current_user.id
+            exists().where(Material.id == QuizModel.material_id, Material.user_id == current_user.id)
         ).first()
         if not quiz:
             raise HTTPException(
@@ -97,7 +99,7 @@ async def create_share_link(
                 detail="Invalid material id"
             )
 
-        material = db.query(Material).filter(
+        material = db.query(Material.id).filter(
             Material.id == material_uuid,
             Material.user_id == current_user.id
         ).first()
@@ -156,13 +158,14 @@ async def create_share_link(
 
 
 @router.get("/quiz-results")
-async def get_teacher_quiz_results(
+def get_teacher_quiz_results(
     quizId: str | None = Query(default=None),
     courseId: str | None = Query(default=None),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
-    query = db.query(StudentResult, QuizModel, Material).join(
+    # Only the material id/title are listed; skip loading its text columns
+    query = db.query(StudentResult, QuizModel, Material.id, Material.title).join(
         QuizModel, StudentResult.quiz_id == QuizModel.id
     ).join(
         Material, QuizModel.material_id == Material.id
@@ -183,13 +186,13 @@ async def get_teacher_quiz_results(
     rows = query.order_by(StudentResult.submission_date.desc()).all()
 
     items = []
-    for result, quiz, material in rows:
+    for result, quiz, material_id, material_title in rows:
         total_questions = len(quiz.questions or []) if isinstance(quiz.questions, list) else 0
         items.append({
             "resultId": str(result.id),
             "quizId": str(quiz.id),
-            "materialId": str(material.id),
-            "materialTitle": material.title,
+            "materialId": str(material_id),
+            "materialTitle": material_title,
             "studentName": result.student_identifier,
             "score": int(result.score),
             "submittedAt": result.submission_date.isoformat(),
@@ -200,12 +203,12 @@ async def get_teacher_quiz_results(
 
 
 @router.get("/assignment-links")
-async def get_teacher_assignment_links(
+def get_teacher_assignment_links(
     courseId: str | None = Query(default=None),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
-    query = db.query(PublicLink, Material).join(
+    query = db.query(PublicLink, Material.id, Material.title).join(
         Material,
         cast(Material.id, String) == PublicLink.resource_id
     ).filter(
@@ -221,7 +224,7 @@ async def get_teacher_assignment_links(
     frontend_base_url = (settings.FRONTEND_BASE_URL or "").strip().rstrip("/")
 
     items = []
-    for link, material in rows:
+    for link, material_id, material_title in rows:
 
         if frontend_base_url:
             url = f"{frontend_base_url}/#/shared/{link.short_code}"
@@ -232,8 +235,8 @@ async def get_teacher_assignment_links(
             "linkId": str(link.id),
             "shortCode": link.short_code,
             "url": url,
-            "materialId": str(material.id),
-            "materialTitle": material.title,
+            "materialId": str(material_id),
+            "materialTitle": material_title,
             "createdAt": link.created_at.isoformat() if link.created_at else None,
             "expiresAt": link.expires_at.isoformat() if link.expires_at else None,
             "viewOnly": bool(link.view_only),
@@ -244,7 +247,7 @@ async def get_teacher_assignment_links(
 
 
 @router.get("/assignment-results")
-async def get_teacher_assignment_results(
+def get_teacher_assignment_results(
     courseId: str | None = Query(default=None),
     statusFilter: str = Query(default="all"),
     db: Session = Depends(get_db),
@@ -293,7 +296,7 @@ async def get_teacher_assignment_results(
 
 
 @router.get("/{short_code}")
-async def get_shared_resource(
+def get_shared_resource(
     short_code: str,
     password: str | None = Query(default=None),
     studentName: str | None = Query(default=None),
@@ -324,14 +327,14 @@ async def get_shared_resource(
         if not quiz:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Quiz not found")
 
-        material = db.query(Material).filter(Material.id == quiz.material_id).first()
+        material = db.query(Material.title).filter(Material.id == quiz.material_id).first()
 
         questions = []
         for q in (quiz.questions or []):
             if not isinstance(q, dict):
                 continue
             questions.append({
-                "id": q.get("id") or str(uuid.uuid4()),
+                "id": q.get("id") or uuid7_str(),
                 "type": q.get("type", "mcq"),
                 "text": q.get("text") or q.get("question", ""),
                 "options": q.get("options") or [],
@@ -367,7 +370,12 @@ async def get_shared_resource(
         except ValueError:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid shared resource id")
 
-        material = db.query(Material).filter(Material.id == material_uuid).first()
+        material = db.query(
+            Material.id,
+            Material.title,
+            Material.summary,
+            Material.content
+        ).filter(Material.id == material_uuid).first()
         if not material:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Material not found")
 
@@ -401,7 +409,7 @@ async def get_shared_resource(
 
 
 @router.post("/{short_code}/submit")
-async def submit_shared_quiz(
+def submit_shared_quiz(
     short_code: str,
     payload: dict,
     db: Session = Depends(get_db)
@@ -493,17 +501,13 @@ async def submit_shared_quiz(
     }
 
 
-@router.post("/{short_code}/upload")
-async def upload_assignment_file(
-    short_code: str,
-    studentName: str | None = Form(default=None),
-    responseText: str | None = Form(default=None),
-    file: UploadFile | None = File(default=None),
-    db: Session = Depends(get_db),
-    language: str = Depends(get_language)
-):
-    """Public endpoint: upload completed assignment document for material shares."""
-    short_code = validate_short_code_or_400(short_code)
+def _commit_and_refresh(db: Session, instance) -> None:
+    db.commit()
+    db.refresh(instance)
+
+
+def _get_assignment_upload_target(db: Session, short_code: str):
+    """Resolve an assignment share link to (link, material), raising the public endpoint's HTTP errors."""
     link = db.query(PublicLink).filter(PublicLink.short_code == short_code).first()
     if not link:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Shared link not found")
@@ -519,21 +523,45 @@ async def upload_assignment_file(
     except ValueError:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid shared resource id")
 
-    material = db.query(Material).filter(Material.id == material_uuid).first()
+    material = db.query(
+        Material.id,
+        Material.summary,
+        Material.content,
+        Material.course_id
+    ).filter(Material.id == material_uuid).first()
     if not material:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Material not found")
 
+    return link, material
+
+
+@router.post("/{short_code}/upload")
+async def upload_assignment_file(
+    short_code: str,
+    studentName: str | None = Form(default=None),
+    responseText: str | None = Form(default=None),
+    file: UploadFile | None = File(default=None),
+    db: Session = Depends(get_db),
+    language: str = Depends(get_language)
+):
+    """Public endpoint: upload completed assignment document for material shares."""
+    short_code = validate_short_code_or_400(short_code)
+    # Sync DB work runs in the threadpool: this handler awaits file I/O and the LLM
+    link, material = await run_in_threadpool(_get_assignment_upload_target, db, short_code)
+
     student_name = (studentName or "").strip()[:255] or "Ученик"
     response_text = (responseText or "").strip()
     allowed_extensions = {".pdf", ".docx", ".txt", ".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp"}
     if not file and not response_text:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Attach a file and/or provide text response")
 
-    duplicate = db.query(OCRResult).filter(
-        OCRResult.user_id == link.user_id,
-        OCRResult.student_name == student_name,
-        cast(OCRResult.questions, String).ilike(f"%assignment-meta:{short_code}%")
-    ).first()
+    duplicate = await run_in_threadpool(
+        lambda: db.query(OCRResult.id).filter(
+            OCRResult.user_id == link.user_id,
+            OCRResult.student_name == student_name,
+            cast(OCRResult.questions, String).ilike(f"%assignment-meta:{short_code}%")
+        ).first()
+    )
     if duplicate:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
@@ -636,8 +664,7 @@ async def upload_assignment_file(
         course_id=material.course_id
     )
     db.add(submission)
-    db.commit()
-    db.refresh(submission)
+    await run_in_threadpool(_commit_and_refresh, db, submission)
 
     return {
         "submissionId": str(submission.id),
@@ -34,7 +34,7 @@ async def get_user_profile(
 
 
 @router.patch("/me", response_model=User)
-async def update_user_profile(
+def update_user_profile(
     update_data: UserUpdateRequest,
     db: Session = Depends(get_db),
     current_user: UserModel = Depends(get_current_user)
@@ -63,7 +63,7 @@ async def update_user_profile(
 
 
 @router.put("/me")
-async def update_user_profile_legacy(
+def update_user_profile_legacy(
     update_data: dict,
     db: Session = Depends(get_db),
     current_user: UserModel = Depends(get_current_user)
@@ -94,7 +94,7 @@ async def update_user_profile_legacy(
 
 
 @router.post("/change-password")
-async def change_password_legacy(
+def change_password_legacy(
     payload: dict,
     db: Session = Depends(get_db),
     current_user: UserModel = Depends(get_current_user)
@@ -121,7 +121,7 @@ async def change_password_legacy(
 
 
 @router.delete("/me")
-async def delete_current_user_legacy(
+def delete_current_user_legacy(
     db: Session = Depends(get_db),
     current_user: UserModel = Depends(get_current_user)
 ):
@@ -17,7 +17,31 @@ class Settings(BaseSettings):
     # Google Gemini AI
     GEMINI_API_KEY: str = ""
     GEMINI_MODEL: str = "gemini-2.5-flash-lite"
-    
+
+    # Redis (optional): shares the AI response cache and rate limits across workers
+    REDIS_URL: str = ""
+
+    # AI response cache
+    AI_CACHE_TTL: int = 3600  # seconds
+    AI_CACHE_MAXSIZE: int = 1024
+    MATERIAL_CACHE_TTL: int = 60  # seconds
+    MATERIAL_CACHE_MAXSIZE: int = 10000
+    RETRIEVAL_CACHE_CHARS: int = 20_000_000  # total material text kept for chat retrieval
+    ANALYTICS_CACHE_TTL: int = 60  # seconds
+    ANALYTICS_CACHE_MAXSIZE: int = 2048
+    ANALYTICS_CACHE_L1_TTL: int = 5  # seconds other workers may serve an invalidated entry
+
+    # Rate limiting
+    AI_RATE_LIMIT_PER_MINUTE: int = 20
+    AI_RATE_LIMIT_BURST: int = 10
+    QUIZ_RATE_LIMIT_PER_MINUTE: int = 2
+    QUIZ_RATE_LIMIT_BURST: int = 5
+    RATE_LIMIT_QUEUE_TIMEOUT: float = 5.0  # max seconds a request waits for a token
+    # Per-worker cap on in-flight LLM calls; requests past the queue get 503
+    AI_CHAT_MAX_CONCURRENCY: int = 16
+    AI_GENERATION_MAX_CONCURRENCY: int = 4
+    AI_MAX_QUEUED_REQUESTS: int = 32
+
     # Google Cloud Vision (optional for future use)
     GOOGLE_APPLICATION_CREDENTIALS: str = ""
     
@@ -1,10 +1,11 @@
 import uuid
-from sqlalchemy import Column, String, DateTime, Enum, Text, Integer, JSON, ForeignKey, ARRAY, TypeDecorator, Boolean, Float
-from sqlalchemy.dialects.postgresql import UUID as PG_UUID
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, DateTime, Enum, Text, Integer, JSON, ForeignKey, ARRAY, TypeDecorator, Boolean, Float, Index, CheckConstraint, text, event, inspect, select, update
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID, JSONB
+from sqlalchemy.orm import deferred, relationship, validates
 from datetime import datetime
 import enum
 from app.core.database import Base
+from app.utils.ids import uuid7
 
 
 class UUID(TypeDecorator):
@@ -91,8 +92,10 @@ class User(Base):
     first_name = Column(String, nullable=True)
     last_name = Column(String, nullable=True)
     avatar = Column(String, nullable=True)
-    role = Column(Enum(UserRole), default=UserRole.TEACHER, nullable=False)
-    settings = Column(JSON, nullable=True, default=dict)  # notifications, etc.
+    role = Column(String(16), default=UserRole.TEACHER.value, nullable=False)  # UserRole value
+    # notifications, diary comments, etc.; can grow large, so it is only
+    # loaded when an endpoint actually reads it
+    settings = deferred(Column(JSON, nullable=True, default=dict))
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     
     # Relationships
@@ -101,6 +104,21 @@ class User(Base):
     student_results = relationship("StudentResult", back_populates="teacher", cascade="all, delete-orphan")
     ai_sessions = relationship("AISession", back_populates="user", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        CheckConstraint("role IN ('teacher', 'admin', 'student')", name="users_role_check"),
+        Index(
+            "ix_users_role",
+            "role",
+            postgresql_where=text("role != 'student'"),
+            sqlite_where=text("role != 'student'")
+        ),
+    )
+
+    @validates("role")
+    def validate_role(self, key, value):
+        """Store roles as lowercase UserRole values; reject anything else."""
+        return UserRole(str(getattr(value, "value", value)).lower()).value
+
 
 class Course(Base):
     """Course entity for organizing materials."""
@@ -141,21 +159,31 @@ class Material(Base):
     course = relationship("Course", back_populates="materials")
     quizzes = relationship("Quiz", back_populates="material", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_materials_user_id_id", "user_id", "id"),
+        Index("ix_materials_user_id_course_id", "user_id", "course_id"),
+    )
+
 
 class Quiz(Base):
     """Quiz and assignments model."""
     __tablename__ = "quizzes"
     
-    id = Column(UUID(), primary_key=True, default=uuid.uuid4)
+    id = Column(UUID(), primary_key=True, default=uuid7)  # time-ordered for index locality
     material_id = Column(UUID(), ForeignKey("materials.id"), nullable=False)
     title = Column(String, nullable=True)
     questions = Column(JSON, nullable=False)  # [{question, type, options, correct_answer}]
+    status = Column(String, default="ready", nullable=False)  # pending, ready, error
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     
     # Relationships
     material = relationship("Material", back_populates="quizzes")
     student_results = relationship("StudentResult", back_populates="quiz", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_quizzes_material_id", "material_id"),
+    )
+
 
 class StudentResult(Base):
     """Student results and analytics model."""
@@ -168,11 +196,25 @@ class StudentResult(Base):
     score = Column(Integer, nullable=False)  # Percentage
     weak_topics = Column(StringArray, nullable=True)  # List of topics with errors
     submission_date = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # Course of the quiz's material, copied here so course analytics skip the quiz/material joins
+    course_id = Column(UUID(), ForeignKey("courses.id", ondelete="SET NULL"), nullable=True)
     
     # Relationships
     teacher = relationship("User", back_populates="student_results")
     quiz = relationship("Quiz", back_populates="student_results")
 
+    __table_args__ = (
+        Index("ix_student_results_user_date", user_id, submission_date.desc()),
+        Index("ix_student_results_user_quiz", "user_id", "quiz_id"),
+        Index(
+            "ix_student_results_user_course_date",
+            user_id,
+            course_id,
+            submission_date.desc(),
+            postgresql_where=course_id.isnot(None)
+        ),
+    )
+
 
 class ChatLog(Base):
     """Chat logs for analysis model."""
@@ -194,13 +236,22 @@ class AISession(Base):
     title = Column(String, nullable=False, default="New Chat")
     doc_id = Column(UUID(), ForeignKey("materials.id"), nullable=True)  # Material context
     date = Column(DateTime, default=datetime.utcnow, nullable=False)
-    messages = Column(JSON, nullable=True, default=list)  # Chat history
+    messages = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=True, default=list)  # Chat history, appended in SQL
     context = Column(JSON, nullable=True, default=dict)  # Session context for regeneration
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     
     # Relationships
     user = relationship("User", back_populates="ai_sessions")
 
+    __table_args__ = (
+        Index(
+            "ix_ai_sessions_user_date_covering",
+            user_id,
+            date.desc(),
+            postgresql_include=["id", "title", "doc_id"]
+        ),
+    )
+
 
 class OCRResult(Base):
     """OCR processing results model."""
@@ -233,3 +284,22 @@ class PublicLink(Base):
     password = Column(String, nullable=True)  # Hashed password if protected
     expires_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+@event.listens_for(StudentResult, "before_insert")
+def _fill_result_course(mapper, connection, target):
+    if target.course_id is None and target.quiz_id is not None:
+        target.course_id = connection.execute(
+            select(Material.course_id).join(Quiz, Quiz.material_id == Material.id).where(Quiz.id == target.quiz_id)
+        ).scalar()
+
+
+@event.listens_for(Material, "after_update")
+def _move_results_with_material(mapper, connection, target):
+    # Keep the denormalized StudentResult.course_id in step when a material changes course
+    if inspect(target).attrs.course_id.history.has_changes():
+        connection.execute(
+            update(StudentResult).where(
+                StudentResult.quiz_id.in_(select(Quiz.id).where(Quiz.material_id == target.id))
+            ).values(course_id=target.course_id)
+        )
@@ -2,7 +2,7 @@
 Pydantic schemas aligned with swagger.yml specification.
 All schemas strictly follow the Swagger contract.
 """
-from pydantic import BaseModel, EmailStr, Field, UUID4, field_validator, ConfigDict
+from pydantic import BaseModel, EmailStr, Field, UUID4, ConfigDict, AliasChoices, PrivateAttr, model_validator
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from enum import Enum
@@ -111,26 +111,41 @@ class LoginResponse(BaseModel):
 
 class QuizConfig(BaseModel):
     """Quiz generation configuration."""
-    materialId: UUID4 = Field(..., description="ID документа-источника знаний")
+    materialId: uuid.UUID = Field(..., description="ID документа-источника знаний")
     difficulty: Difficulty = Field(..., description="Влияет на лексику и глубину вопросов")
     count: int = Field(..., ge=1, le=50)
     type: QuestionType
-    
-    @field_validator('materialId', mode='before')
+
+
+class QuizGenerateRequest(BaseModel):
+    """
+    Payload of POST /ai/generate-quiz.
+
+    QuizConfig with defaults; also accepts the legacy
+    {material_id, num_questions, difficulty} shape.
+    """
+    materialId: uuid.UUID = Field(..., validation_alias=AliasChoices("materialId", "material_id"))
+    count: int = Field(5, ge=1, le=50, validation_alias=AliasChoices("count", "num_questions"))
+    difficulty: Difficulty = Difficulty.MEDIUM
+    type: QuestionType = QuestionType.MCQ
+
+    _legacy: bool = PrivateAttr(False)
+
+    @model_validator(mode="wrap")
     @classmethod
-    def validate_material_id(cls, v):
-        """Validate materialId is a valid UUID."""
-        if isinstance(v, str):
-            try:
-                return uuid.UUID(v)
-            except ValueError:
-                raise ValueError(f"materialId must be a valid UUID, got: {v}")
-        return v
+    def _detect_legacy(cls, data: Any, handler):
+        model = handler(data)
+        model._legacy = isinstance(data, dict) and "materialId" not in data
+        return model
+
+    @property
+    def legacy_mode(self) -> bool:
+        return self._legacy
 
 
 class Question(BaseModel):
     """Quiz question schema."""
-    id: UUID4
+    id: uuid.UUID  # uuid7 for new questions, uuid4 for older ones
     type: QuestionType
     text: str = Field(..., json_schema_extra={"example": "Какова основная функция митохондрий?"})
     options: Optional[List[str]] = Field(None, description="Варианты ответов (только для MCQ)")
@@ -143,7 +158,7 @@ class Question(BaseModel):
 
 class Quiz(BaseModel):
     """Complete quiz schema."""
-    id: UUID4
+    id: uuid.UUID
     materialId: UUID4
     title: Optional[str] = None
     questions: List[Question]
@@ -152,6 +167,31 @@ class Quiz(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class QuizDraftPayload(BaseModel):
+    """
+    Body of POST /ai/quizzes and PUT /ai/quizzes/{id}.
+
+    Questions stay loose dicts (legacy keys like `question`/`correct_answer`
+    are accepted) and are normalized by the endpoint; only the list shape and
+    size are enforced here.
+    """
+    materialId: Optional[uuid.UUID] = Field(None, description="Обязателен при создании теста")
+    title: Optional[str] = None
+    questions: List[Dict[str, Any]] = Field(..., min_length=1, max_length=200)
+
+
+class QuizGenerationStatus(BaseModel):
+    """Status of a quiz generated in the background."""
+    quizId: uuid.UUID
+    status: str = Field(..., json_schema_extra={"example": "pending"})
+    quiz: Optional[Quiz] = Field(None, description="Готовый тест (только при status=ready)")
+
+
+class QuizBatchRequest(BaseModel):
+    """Several quiz generations submitted as one background job."""
+    quizzes: List[QuizConfig] = Field(..., min_length=1, max_length=10)
+
+
 class QuizTemplate(BaseModel):
     """Quiz template for gallery."""
     id: int
@@ -164,11 +204,23 @@ class QuizTemplate(BaseModel):
 
 class ChatRequest(BaseModel):
     """AI chat request."""
-    materialId: Optional[str] = None
+    materialId: Optional[uuid.UUID] = None
     sessionId: Optional[int] = None
     message: str
 
 
+class SummaryBatchRequest(BaseModel):
+    """Batch summary request."""
+    materialIds: List[uuid.UUID] = Field(..., min_length=1, max_length=10)
+
+
+class SummaryBatchItem(BaseModel):
+    """Per-material result of a batch summary request."""
+    materialId: uuid.UUID
+    result: Optional[Dict[str, Any]] = Field(None, description="То же, что возвращает /ai/generate-summary")
+    error: Optional[str] = None
+
+
 class SmartActionRequest(BaseModel):
     """Smart selection action request."""
     text: str = Field(..., description="Выделенный фрагмент текста")
@@ -1,6 +1,8 @@
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, AsyncIterator
+import asyncio
 import json
 import re
+from string import Template
 from collections import Counter
 import google.generativeai as genai
 from app.core.config import settings
@@ -8,6 +10,220 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Prompt building blocks, built once at import. Every prompt is laid out as
+# static instructions + output schema, then the material text, then
+# PARAMS_SEPARATOR and the per-request parameters (language, count, ...), so
+# all requests over the same material share the longest possible prefix for
+# the provider's prompt cache.
+LANGUAGE_INSTRUCTIONS = {
+    'ru': 'Отвечай на русском языке.',
+    'kk': 'Қазақ тілінде жауап беріңіз.',
+    'en': 'Respond in English.'
+}
+
+WRITE_LANGUAGE_INSTRUCTIONS = {
+    'ru': 'Пиши на русском языке.',
+    'kk': 'Қазақ тілінде жазыңыз.',
+    'en': 'Write in English.'
+}
+
+# Difficulty-aware prompt engineering
+DIFFICULTY_PROMPTS = {
+    "easy": "Вопросы должны проверять базовое понимание и запоминание. Используй простые формулировки.",
+    "medium": "Вопросы должны требовать понимания и применения концепций. Используй среднюю лексику.",
+    "hard": "Вопросы должны требовать анализа, синтеза и оценки. Используй сложную лексику и многоуровневое мышление."
+}
+
+TYPE_INSTRUCTIONS = {
+    "mcq": "Создай вопросы с 4 вариантами ответа.",
+    "open": "Создай открытые вопросы, требующие развернутого ответа.",
+    "boolean": "Создай вопросы типа Верно/Неверно."
+}
+
+ACTION_PROMPTS = {
+    "explain": "Объясни следующий текст простыми словами для школьника:",
+    "simplify": "Упрости следующий текст, сохранив главный смысл:",
+    "translate": "Переведи следующий текст на английский язык:",
+    "summarize": "Создай краткое резюме следующего текста:"
+}
+
+PARAMS_SEPARATOR = "\n\n---\n"
+
+# Larger quizzes are generated as parallel calls of at most this many questions
+QUIZ_CHUNK_SIZE = 10
+
+_SUMMARY_PROMPT = """Ты опытный методист. Проанализируй следующий текст и создай:
+1. Краткий конспект (summary) основных идей
+2. Глоссарий (glossary) ключевых терминов и их определений
+
+Если текст не содержит учебного материала, установи is_educational: false.
+
+ВАЖНО: Верни ТОЛЬКО JSON без дополнительного текста, объяснений или markdown форматирования.
+
+Формат JSON:
+{
+    "is_educational": true/false,
+    "summary": "текст конспекта",
+    "glossary": {"термин1": "определение1", "термин2": "определение2"}
+}
+
+Текст для анализа:
+"""
+
+_QUIZ_PROMPT = """Ты опытный методист. Создай тест по следующему материалу.
+Количество вопросов и уровень сложности указаны после материала.
+
+Требования:
+- Используй типы вопросов: MCQ (множественный выбор) и Open (открытый вопрос)
+- Для MCQ предоставь 4 варианта ответа
+- Укажи правильный ответ для каждого вопроса
+
+ВАЖНО: Верни ТОЛЬКО JSON массив без дополнительного текста, объяснений или markdown блоков.
+
+Формат JSON массива:
+[
+    {
+        "question": "текст вопроса",
+        "type": "MCQ",
+        "options": ["вариант1", "вариант2", "вариант3", "вариант4"],
+        "correct_answer": "правильный вариант"
+    },
+    {
+        "question": "текст открытого вопроса",
+        "type": "Open",
+        "options": null,
+        "correct_answer": "пример правильного ответа"
+    }
+]
+
+Материал для теста:
+"""
+
+_QUIZ_PARAMS = Template("""$lang_instruction
+Количество вопросов: $num_questions
+Уровень сложности: $difficulty""")
+
+_QUIZ_ADVANCED_PROMPT = """Ты опытный методист. Создай вопросы по материалу.
+Количество, уровень сложности и тип вопросов указаны после материала.
+
+Для каждого вопроса ОБЯЗАТЕЛЬНО добавь методическое пояснение (explanation), 
+почему данный ответ является верным. Это критично для режима 'Презентация' и печати ключей.
+
+ВАЖНО: Верни ТОЛЬКО JSON массив без дополнительного текста, объяснений или markdown блоков.
+
+Формат JSON массива:
+[
+    {
+        "text": "текст вопроса",
+        "type": "тип вопросов",
+        "options": ["вариант1", "вариант2", "вариант3", "вариант4"],
+        "correctAnswer": "правильный ответ",
+        "explanation": "методическое пояснение, почему этот ответ верен"
+    }
+]
+
+Материал:
+"""
+
+_QUIZ_ADVANCED_PARAMS = Template("""$lang_instruction
+Количество вопросов: $count
+
+Уровень сложности: $difficulty
+$difficulty_prompt
+
+Тип вопросов: $question_type
+$type_instruction""")
+
+# Appended to the parameters of each call of a chunked quiz so parallel
+# calls cover different parts of the material instead of repeating each other
+_QUIZ_CHUNK_FOCUS = Template("""
+Это часть $part из $parts большого теста: составь вопросы в первую очередь по $part-й из $parts равных частей материала (по порядку изложения).""")
+
+_QUIZ_AVOID_QUESTIONS = "\nНе повторяй эти вопросы и не задавай их другими словами:\n"
+
+_CHAT_SYSTEM_PROMPT = "Ты виртуальный ассистент учителя. Помогай создавать учебные материалы."
+
+_ASSIGNMENT_PROMPT = (
+    "Ты опытный преподаватель. Составь задание для учеников по материалу ниже.\n"
+    "Требования:\n"
+    "- Чёткая структура шагов\n"
+    "- Понятные критерии результата\n"
+    "- Подходит для отправки учеником текста и/или файла\n"
+    "- Верни только чистый текст задания без markdown и без лишних вступлений\n\n"
+    "Материал:\n"
+)
+
+_EVALUATION_PROMPT = (
+    "Ты проверяющий преподаватель. Оцени ответ ученика по заданию и верни только JSON.\n"
+    "Максимальный балл указан после ответа ученика.\n"
+    "Критерии: соответствие заданию, полнота, точность, структура, аргументация.\n"
+    "Верни строго JSON объекта формата:\n"
+    "{\n"
+    "  \"score\": число от 0 до максимального балла,\n"
+    "  \"maxScore\": максимальный балл,\n"
+    "  \"feedback\": \"краткий итог (1-3 предложения)\",\n"
+    "  \"strengths\": [\"сильная сторона 1\", \"сильная сторона 2\"],\n"
+    "  \"improvements\": [\"что улучшить 1\", \"что улучшить 2\"],\n"
+    "  \"confidence\": \"high|medium|low\"\n"
+    "}\n\n"
+    "ЗАДАНИЕ:\n"
+)
+
+_REGENERATE_PROMPT = Template("""$lang_instruction
+
+Ты методист. У тебя есть вопрос теста, который нужно улучшить.
+
+Текущий вопрос:
+$current_text
+
+Инструкция по улучшению:
+$instruction
+
+Создай улучшенную версию вопроса, следуя инструкции.
+
+Верни ответ в формате JSON:
+{
+    "text": "текст вопроса",
+    "type": "mcq",
+    "options": ["вариант1", "вариант2", "вариант3", "вариант4"],
+    "correctAnswer": "правильный ответ",
+    "explanation": "методическое пояснение"
+}
+""")
+
+
+def _language_instruction(language: str, instructions: Dict[str, str] = LANGUAGE_INSTRUCTIONS) -> str:
+    return instructions.get(language, instructions['ru'])
+
+
+def _chunk_sizes(count: int) -> List[int]:
+    sizes = [QUIZ_CHUNK_SIZE] * (count // QUIZ_CHUNK_SIZE)
+    if count % QUIZ_CHUNK_SIZE:
+        sizes.append(count % QUIZ_CHUNK_SIZE)
+    return sizes
+
+
+def _question_text(question: Dict) -> str:
+    return " ".join(str(question.get("text") or question.get("question") or "").split())
+
+
+def _merge_quiz_chunks(results: list, questions: List[Dict], seen: set) -> None:
+    """Append the questions of successful chunk results, skipping failed chunks and repeats."""
+    for result in results:
+        if isinstance(result, BaseException):
+            logger.warning(f"Quiz chunk failed: {result}")
+            continue
+        if isinstance(result, dict):
+            result = result.get("questions", [])
+        for question in result:
+            if not isinstance(question, dict):
+                continue
+            key = _question_text(question).lower()
+            if key in seen:
+                continue
+            seen.add(key)
+            questions.append(question)
+
 
 def extract_json_from_response(text: str) -> str:
     """
@@ -33,6 +249,57 @@ def extract_json_from_response(text: str) -> str:
     return text
 
 
+class JsonObjectStream:
+    """
+    Incrementally extract top-level JSON objects from streamed text.
+
+    Feeding chunks of `[{...}, {...}]` (optionally inside a ```json fence)
+    returns each object as soon as its closing brace arrives.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._start = None
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk: str) -> List[Dict]:
+        self._buffer += chunk
+        objects = []
+        buffer = self._buffer
+        for i in range(self._pos, len(buffer)):
+            char = buffer[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = self._depth > 0
+            elif char == "{":
+                if self._depth == 0:
+                    self._start = i
+                self._depth += 1
+            elif char == "}" and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        objects.append(json.loads(buffer[self._start:i + 1]))
+                    except json.JSONDecodeError as e:
+                        logger.warning(f"Skipping malformed streamed JSON object: {e}")
+        # Drop everything before the object in progress
+        cut = self._start if self._depth > 0 else len(buffer)
+        self._buffer = buffer[cut:]
+        self._pos = len(buffer) - cut
+        if self._depth > 0:
+            self._start = 0
+        return objects
+
+
 class AIService:
     """Service for AI-powered content generation using Google Gemini."""
     
@@ -45,6 +312,13 @@ class AIService:
             self.client = None
             self.model = None
     
+    async def close(self) -> None:
+        """Close the pooled async gRPC channel the model opens on first use."""
+        async_client = getattr(self.model, "_async_client", None)
+        if async_client is not None:
+            await async_client.transport.close()
+            self.model._async_client = None
+    
     async def generate_summary(self, text: str, language: str = 'ru') -> Dict[str, any]:
         """
         Generate summary and glossary from educational text.
@@ -62,36 +336,10 @@ class AIService:
                 "glossary": {"Term1": "Definition 1", "Term2": "Definition 2"}
             }
         
-        # Language-specific instructions
-        language_instructions = {
-            'ru': 'Отвечай на русском языке.',
-            'kk': 'Қазақ тілінде жауап беріңіз.',
-            'en': 'Respond in English.'
-        }
-        lang_instruction = language_instructions.get(language, language_instructions['ru'])
-        
-        prompt = f"""{lang_instruction}
-
-Ты опытный методист. Проанализируй следующий текст и создай:
-1. Краткий конспект (summary) основных идей
-2. Глоссарий (glossary) ключевых терминов и их определений
-
-Если текст не содержит учебного материала, установи is_educational: false.
-
-ВАЖНО: Верни ТОЛЬКО JSON без дополнительного текста, объяснений или markdown форматирования.
-
-Формат JSON:
-{{
-    "is_educational": true/false,
-    "summary": "текст конспекта",
-    "glossary": {{"термин1": "определение1", "термин2": "определение2"}}
-}}
-
-Текст для анализа:
-""" + text[:4000]  # Limit text length
+        prompt = _SUMMARY_PROMPT + text[:4000] + PARAMS_SEPARATOR + _language_instruction(language)
         
         try:
-            response = self.model.generate_content(
+            response = await self.model.generate_content_async(
                 prompt,
                 generation_config=genai.types.GenerationConfig(
                     temperature=0.7,
@@ -144,47 +392,14 @@ class AIService:
                 }
             ]
         
-        # Language-specific instructions
-        language_instructions = {
-            'ru': 'Отвечай на русском языке.',
-            'kk': 'Қазақ тілінде жауап беріңіз.',
-            'en': 'Respond in English.'
-        }
-        lang_instruction = language_instructions.get(language, language_instructions['ru'])
-        
-        prompt = f"""{lang_instruction}
-
-Ты опытный методист. Создай тест из {num_questions} вопросов по следующему материалу.
-Уровень сложности: {difficulty}
-
-Требования:
-- Используй типы вопросов: MCQ (множественный выбор) и Open (открытый вопрос)
-- Для MCQ предоставь 4 варианта ответа
-- Укажи правильный ответ для каждого вопроса
-
-ВАЖНО: Верни ТОЛЬКО JSON массив без дополнительного текста, объяснений или markdown блоков.
-
-Формат JSON массива:
-[
-    {{
-        "question": "текст вопроса",
-        "type": "MCQ",
-        "options": ["вариант1", "вариант2", "вариант3", "вариант4"],
-        "correct_answer": "правильный вариант"
-    }},
-    {{
-        "question": "текст открытого вопроса",
-        "type": "Open",
-        "options": null,
-        "correct_answer": "пример правильного ответа"
-    }}
-]
-
-Материал для теста:
-""" + text[:4000]
+        prompt = _QUIZ_PROMPT + text[:4000] + PARAMS_SEPARATOR + _QUIZ_PARAMS.substitute(
+            lang_instruction=_language_instruction(language),
+            num_questions=num_questions,
+            difficulty=difficulty
+        )
         
         try:
-            response = self.model.generate_content(
+            response = await self.model.generate_content_async(
                 prompt,
                 generation_config=genai.types.GenerationConfig(
                     temperature=0.7,
@@ -235,58 +450,16 @@ class AIService:
                 for i in range(count)
             ]
         
-        # Language-specific instructions
-        language_instructions = {
-            'ru': 'Отвечай на русском языке.',
-            'kk': 'Қазақ тілінде жауап беріңіз.',
-            'en': 'Respond in English.'
-        }
-        lang_instruction = language_instructions.get(language, language_instructions['ru'])
-        
-        # Difficulty-aware prompt engineering
-        difficulty_prompts = {
-            "easy": "Вопросы должны проверять базовое понимание и запоминание. Используй простые формулировки.",
-            "medium": "Вопросы должны требовать понимания и применения концепций. Используй среднюю лексику.",
-            "hard": "Вопросы должны требовать анализа, синтеза и оценки. Используй сложную лексику и многоуровневое мышление."
-        }
-        
-        type_instruction = {
-            "mcq": "Создай вопросы с 4 вариантами ответа.",
-            "open": "Создай открытые вопросы, требующие развернутого ответа.",
-            "boolean": "Создай вопросы типа Верно/Неверно."
-        }
-        
-        prompt = f"""{lang_instruction}
-
-Ты опытный методист. Создай {count} вопросов по материалу.
-
-Уровень сложности: {difficulty}
-{difficulty_prompts.get(difficulty, difficulty_prompts["medium"])}
-
-Тип вопросов: {question_type}
-{type_instruction.get(question_type, "")}
-
-Для каждого вопроса ОБЯЗАТЕЛЬНО добавь методическое пояснение (explanation), 
-почему данный ответ является верным. Это критично для режима 'Презентация' и печати ключей.
-
-ВАЖНО: Верни ТОЛЬКО JSON массив без дополнительного текста, объяснений или markdown блоков.
-
-Формат JSON массива:
-[
-    {{
-        "text": "текст вопроса",
-        "type": "{question_type}",
-        "options": ["вариант1", "вариант2", "вариант3", "вариант4"],
-        "correctAnswer": "правильный ответ",
-        "explanation": "методическое пояснение, почему этот ответ верен"
-    }}
-]
-
-Материал:
-""" + text[:4000]
+        if count > QUIZ_CHUNK_SIZE:
+            return await self._generate_quiz_in_chunks(text, count, difficulty, question_type, language)
         
+        return await self._request_quiz_advanced(
+            self._quiz_advanced_prompt(text, count, difficulty, question_type, language)
+        )
+    
+    async def _request_quiz_advanced(self, prompt: str) -> List[Dict]:
         try:
-            response = self.model.generate_content(
+            response = await self.model.generate_content_async(
                 prompt,
                 generation_config=genai.types.GenerationConfig(
                     temperature=0.7,
@@ -307,6 +480,115 @@ class AIService:
             logger.error(f"Advanced quiz generation error: {e}")
             raise ValueError(f"Failed to generate quiz: {str(e)}")
     
+    async def _generate_quiz_in_chunks(
+        self,
+        text: str,
+        count: int,
+        difficulty: str,
+        question_type: str,
+        language: str
+    ) -> List[Dict]:
+        """
+        Generate a large quiz as concurrent calls of up to QUIZ_CHUNK_SIZE questions.
+        
+        Output tokens dominate latency, so N parallel calls finish in roughly
+        1/N of the time; they share the material prefix of the prompt, and
+        each is pointed at a different part of the material. Failed chunks are
+        skipped, and when duplicates or failures leave the quiz short one more
+        round asks for the missing questions, listing the ones already made.
+        Fails only if no chunk succeeds.
+        """
+        sizes = _chunk_sizes(count)
+        results = await asyncio.gather(*(
+            self._request_quiz_advanced(self._quiz_advanced_prompt(
+                text, size, difficulty, question_type, language,
+                extra=_QUIZ_CHUNK_FOCUS.substitute(part=part, parts=len(sizes))
+            ))
+            for part, size in enumerate(sizes, start=1)
+        ), return_exceptions=True)
+        
+        questions = []
+        seen = set()
+        _merge_quiz_chunks(results, questions, seen)
+        if not questions:
+            raise next(result for result in results if isinstance(result, BaseException))
+        
+        missing = count - len(questions)
+        if missing > 0:
+            avoid = _QUIZ_AVOID_QUESTIONS + "\n".join(
+                f"- {_question_text(question)}" for question in questions
+            )
+            top_up = await asyncio.gather(*(
+                self._request_quiz_advanced(self._quiz_advanced_prompt(
+                    text, size, difficulty, question_type, language, extra=avoid
+                ))
+                for size in _chunk_sizes(missing)
+            ), return_exceptions=True)
+            _merge_quiz_chunks(top_up, questions, seen)
+        return questions[:count]
+    
+    def _quiz_advanced_prompt(
+        self,
+        text: str,
+        count: int,
+        difficulty: str,
+        question_type: str,
+        language: str,
+        extra: str = ""
+    ) -> str:
+        return _QUIZ_ADVANCED_PROMPT + text[:4000] + PARAMS_SEPARATOR + _QUIZ_ADVANCED_PARAMS.substitute(
+            lang_instruction=_language_instruction(language),
+            count=count,
+            difficulty=difficulty,
+            difficulty_prompt=DIFFICULTY_PROMPTS.get(difficulty, DIFFICULTY_PROMPTS["medium"]),
+            question_type=question_type,
+            type_instruction=TYPE_INSTRUCTIONS.get(question_type, "")
+        ) + extra
+    
+    async def generate_quiz_advanced_stream(
+        self,
+        text: str,
+        count: int,
+        difficulty: str,
+        question_type: str,
+        language: str = 'ru'
+    ) -> AsyncIterator[Dict]:
+        """
+        Streaming variant of generate_quiz_advanced: yields each question dict
+        as soon as Gemini finishes writing it.
+        """
+        if not self.client:
+            for question in await self.generate_quiz_advanced(text, count, difficulty, question_type, language):
+                yield question
+            return
+        
+        parser = JsonObjectStream()
+        try:
+            response = await self.model.generate_content_async(
+                self._quiz_advanced_prompt(text, count, difficulty, question_type, language),
+                generation_config=genai.types.GenerationConfig(
+                    temperature=0.7,
+                    max_output_tokens=3000,
+                ),
+                stream=True
+            )
+            async for chunk in response:
+                for item in parser.feed(chunk.text or ""):
+                    # A {"questions": [...]} wrapper only completes at the very end
+                    questions = item.get("questions")
+                    for question in questions if isinstance(questions, list) else [item]:
+                        yield question
+        except Exception as e:
+            logger.error(f"Streaming quiz generation error: {e}")
+            raise ValueError(f"Failed to generate quiz: {str(e)}")
+    
+    def _chat_prompt(self, message: str, context: str, language: str) -> str:
+        prompt = _CHAT_SYSTEM_PROMPT
+        if context:
+            prompt += f"\n\nКонтекст из материала:\n{context}"
+        
+        return prompt + PARAMS_SEPARATOR + _language_instruction(language) + "\n\n" + message
+    
     async def chat_with_context(self, message: str, context: str = "", language: str = 'ru') -> str:
         """
         RAG chat with material context.
@@ -319,22 +601,9 @@ class AIService:
         if not self.client:
             return f"Mock AI response to: {message}"
         
-        # Language-specific instructions
-        language_instructions = {
-            'ru': 'Отвечай на русском языке.',
-            'kk': 'Қазақ тілінде жауап беріңіз.',
-            'en': 'Respond in English.'
-        }
-        lang_instruction = language_instructions.get(language, language_instructions['ru'])
-        
-        system_prompt = f"{lang_instruction}\n\nТы виртуальный ассистент учителя. Помогай создавать учебные материалы."
-        if context:
-            system_prompt += f"\n\nКонтекст из материала:\n{context}"
-        
         try:
-            full_prompt = system_prompt + "\n\n" + message
-            response = self.model.generate_content(
-                full_prompt,
+            response = await self.model.generate_content_async(
+                self._chat_prompt(message, context, language),
                 generation_config=genai.types.GenerationConfig(
                     temperature=0.7,
                     max_output_tokens=1000,
@@ -345,6 +614,40 @@ class AIService:
         except Exception as e:
             raise ValueError(f"Chat failed: {str(e)}")
     
+    async def chat_with_context_stream(
+        self,
+        message: str,
+        context: str = "",
+        language: str = 'ru'
+    ) -> AsyncIterator[str]:
+        """
+        Streaming variant of chat_with_context: yields text chunks as Gemini produces them.
+        """
+        if not self.client:
+            yield f"Mock AI response to: {message}"
+            return
+        
+        try:
+            response = await self.model.generate_content_async(
+                self._chat_prompt(message, context, language),
+                generation_config=genai.types.GenerationConfig(
+                    temperature=0.7,
+                    max_output_tokens=1000,
+                ),
+                stream=True
+            )
+            async for chunk in response:
+                if chunk.text:
+                    yield chunk.text
+        except Exception as e:
+            raise ValueError(f"Chat failed: {str(e)}")
+    
+    def _smart_action_prompt(self, text: str, action: str, context: Optional[str], language: str) -> str:
+        prompt = f"Ты опытный педагог.\n\n{_language_instruction(language)}\n\n{ACTION_PROMPTS.get(action, ACTION_PROMPTS['explain'])}"
+        if context:
+            prompt += f"\n\nКонтекст: {context[:2000]}\n\n"
+        return prompt + f"Текст: {text[:4000]}"
+    
     async def perform_smart_action(
         self,
         text: str,
@@ -365,30 +668,9 @@ class AIService:
         if not self.client:
             return f"Mock {action} of: {text[:50]}..."
         
-        # Language-specific instructions
-        language_instructions = {
-            'ru': 'Отвечай на русском языке.',
-            'kk': 'Қазақ тілінде жауап беріңіз.',
-            'en': 'Respond in English.'
-        }
-        lang_instruction = language_instructions.get(language, language_instructions['ru'])
-        
-        action_prompts = {
-            "explain": "Объясни следующий текст простыми словами для школьника:",
-            "simplify": "Упрости следующий текст, сохранив главный смысл:",
-            "translate": "Переведи следующий текст на английский язык:",
-            "summarize": "Создай краткое резюме следующего текста:"
-        }
-        
-        prompt = f"{lang_instruction}\n\n{action_prompts.get(action, action_prompts['explain'])}"
-        if context:
-            prompt += f"\n\nКонтекст: {context}\n\n"
-        prompt += f"Текст: {text}"
-        
         try:
-            full_prompt = "Ты опытный педагог.\n\n" + prompt
-            response = self.model.generate_content(
-                full_prompt,
+            response = await self.model.generate_content_async(
+                self._smart_action_prompt(text, action, context, language),
                 generation_config=genai.types.GenerationConfig(
                     temperature=0.7,
                     max_output_tokens=500,
@@ -399,6 +681,35 @@ class AIService:
         except Exception as e:
             raise ValueError(f"Smart action failed: {str(e)}")
     
+    async def perform_smart_action_stream(
+        self,
+        text: str,
+        action: str,
+        context: Optional[str] = None,
+        language: str = 'ru'
+    ) -> AsyncIterator[str]:
+        """
+        Streaming variant of perform_smart_action: yields text chunks as Gemini produces them.
+        """
+        if not self.client:
+            yield f"Mock {action} of: {text[:50]}..."
+            return
+        
+        try:
+            response = await self.model.generate_content_async(
+                self._smart_action_prompt(text, action, context, language),
+                generation_config=genai.types.GenerationConfig(
+                    temperature=0.7,
+                    max_output_tokens=500,
+                ),
+                stream=True
+            )
+            async for chunk in response:
+                if chunk.text:
+                    yield chunk.text
+        except Exception as e:
+            raise ValueError(f"Smart action failed: {str(e)}")
+    
     async def regenerate_question(
         self,
         current_text: str,
@@ -422,39 +733,17 @@ class AIService:
                 "explanation": "Explanation"
             }
         
-        # Language-specific instructions
-        language_instructions = {
-            'ru': 'Отвечай на русском языке.',
-            'kk': 'Қазақ тілінде жауап беріңіз.',
-            'en': 'Respond in English.'
-        }
-        lang_instruction = language_instructions.get(language, language_instructions['ru'])
+        lang_instruction = _language_instruction(language)
         
-        prompt = f"""{lang_instruction}
-
-Ты методист. У тебя есть вопрос теста, который нужно улучшить.
-
-Текущий вопрос:
-{current_text}
-
-Инструкция по улучшению:
-{instruction}
-
-Создай улучшенную версию вопроса, следуя инструкции.
-
-Верни ответ в формате JSON:
-{{
-    "text": "текст вопроса",
-    "type": "mcq",
-    "options": ["вариант1", "вариант2", "вариант3", "вариант4"],
-    "correctAnswer": "правильный ответ",
-    "explanation": "методическое пояснение"
-}}
-"""
+        prompt = _REGENERATE_PROMPT.substitute(
+            lang_instruction=lang_instruction,
+            current_text=current_text[:2000],
+            instruction=instruction[:500]
+        )
         
         try:
             full_prompt = "Ты опытный методист.\n\n" + prompt
-            response = self.model.generate_content(
+            response = await self.model.generate_content_async(
                 full_prompt,
                 generation_config=genai.types.GenerationConfig(
                     temperature=0.8,
@@ -494,28 +783,16 @@ class AIService:
                 "3) Подготовьте краткий вывод (5-7 предложений)."
             )
 
-        # Language-specific instructions
-        language_instructions = {
-            'ru': 'Пиши на русском языке.',
-            'kk': 'Қазақ тілінде жазыңыз.',
-            'en': 'Write in English.'
-        }
-        lang_instruction = language_instructions.get(language, language_instructions['ru'])
-
         prompt = (
-            f"{lang_instruction}\n\n"
-            "Ты опытный преподаватель. Составь задание для учеников по материалу ниже.\n"
-            "Требования:\n"
-            "- Чёткая структура шагов\n"
-            "- Понятные критерии результата\n"
-            "- Подходит для отправки учеником текста и/или файла\n"
-            "- Верни только чистый текст задания без markdown и без лишних вступлений\n\n"
-            f"Дополнительная инструкция учителя: {instruction or 'нет'}\n\n"
-            f"Материал:\n{text[:4500]}"
+            _ASSIGNMENT_PROMPT
+            + text[:4500]
+            + PARAMS_SEPARATOR
+            + _language_instruction(language, WRITE_LANGUAGE_INSTRUCTIONS)
+            + f"\nДополнительная инструкция учителя: {instruction or 'нет'}"
         )
 
         try:
-            response = self.model.generate_content(
+            response = await self.model.generate_content_async(
                 prompt,
                 generation_config=genai.types.GenerationConfig(
                     temperature=0.7,
@@ -594,34 +871,18 @@ class AIService:
                 "confidence": "medium"
             }
 
-        # Language-specific instructions
-        language_instructions = {
-            'ru': 'Отвечай на русском языке.',
-            'kk': 'Қазақ тілінде жауап беріңіз.',
-            'en': 'Respond in English.'
-        }
-        lang_instruction = language_instructions.get(language, language_instructions['ru'])
-
+        # The assignment text is shared by every submission, so it stays in the prefix
         prompt = (
-            f"{lang_instruction}\n\n"
-            "Ты проверяющий преподаватель. Оцени ответ ученика по заданию и верни только JSON.\n"
-            f"Максимальный балл: {max_score}.\n"
-            "Критерии: соответствие заданию, полнота, точность, структура, аргументация.\n"
-            "Верни строго JSON объекта формата:\n"
-            "{\n"
-            f"  \"score\": число от 0 до {max_score},\n"
-            f"  \"maxScore\": {max_score},\n"
-            "  \"feedback\": \"краткий итог (1-3 предложения)\",\n"
-            "  \"strengths\": [\"сильная сторона 1\", \"сильная сторона 2\"],\n"
-            "  \"improvements\": [\"что улучшить 1\", \"что улучшить 2\"],\n"
-            "  \"confidence\": \"high|medium|low\"\n"
-            "}\n\n"
-            f"ЗАДАНИЕ:\n{task[:3500]}\n\n"
-            f"ОТВЕТ УЧЕНИКА:\n{answer[:8000]}"
+            _EVALUATION_PROMPT
+            + f"{task[:3500]}\n\n"
+            + f"ОТВЕТ УЧЕНИКА:\n{answer[:8000]}"
+            + PARAMS_SEPARATOR
+            + f"{_language_instruction(language)}\n"
+            + f"Максимальный балл: {max_score}."
         )
 
         try:
-            response = self.model.generate_content(
+            response = await self.model.generate_content_async(
                 prompt,
                 generation_config=genai.types.GenerationConfig(
                     temperature=0.2,
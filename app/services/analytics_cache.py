@@ -0,0 +1,84 @@
+import uuid
+from typing import Any, Callable
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from fastapi.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.models.models import Course, Material, OCRResult, StudentResult
+from app.services.response_cache import ResponseCache
+
+
+def _user_prefix(user_id: uuid.UUID) -> str:
+    return f"{user_id}:"
+
+
+async def get_analytics_cached(user_id: uuid.UUID, name: str, course_id: str, compute: Callable[[], Any]) -> Any:
+    """
+    Return the cached analytics response for (user, endpoint, course), computing it on a miss.
+
+    compute() is synchronous (it runs the SQL) and is called in the threadpool;
+    it must return a JSON-serializable value. Keys are always scoped to the
+    teacher so one teacher's aggregates are never served to another.
+    """
+    key = f"{_user_prefix(user_id)}{name}:{course_id}"
+    value = await analytics_cache.get(key)
+    if value is None:
+        value = await run_in_threadpool(compute)
+        await analytics_cache.set(key, value)
+    return value
+
+
+def invalidate_analytics(user_id: uuid.UUID) -> None:
+    """Drop every cached analytics response of the given teacher (safe to call from sync code)."""
+    analytics_cache.discard_prefix(_user_prefix(user_id))
+
+
+_PENDING_KEY = "analytics_invalidations"
+
+
+# Results, submissions, materials and courses all feed the teacher's
+# aggregates; column-level UPDATEs skip these events and must call
+# invalidate_analytics() themselves after committing
+@event.listens_for(StudentResult, "after_insert")
+@event.listens_for(StudentResult, "after_update")
+@event.listens_for(StudentResult, "after_delete")
+@event.listens_for(OCRResult, "after_insert")
+@event.listens_for(OCRResult, "after_update")
+@event.listens_for(OCRResult, "after_delete")
+@event.listens_for(Material, "after_insert")
+@event.listens_for(Material, "after_update")
+@event.listens_for(Material, "after_delete")
+@event.listens_for(Course, "after_insert")
+@event.listens_for(Course, "after_update")
+@event.listens_for(Course, "after_delete")
+def _invalidate_on_write(mapper, connection, target):
+    # These fire at flush, before the data is visible to other sessions:
+    # evicting now would let a concurrent request re-cache the old snapshot,
+    # so the eviction waits for the commit
+    session = object_session(target)
+    if session is None:
+        invalidate_analytics(target.user_id)
+    else:
+        session.info.setdefault(_PENDING_KEY, set()).add(target.user_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    for user_id in session.info.pop(_PENDING_KEY, ()):
+        invalidate_analytics(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+# Global instance: invalidations clear Redis and this worker's L1, so the
+# L1 TTL bounds how long other workers can serve a stale aggregate
+analytics_cache = ResponseCache(
+    maxsize=settings.ANALYTICS_CACHE_MAXSIZE,
+    ttl=settings.ANALYTICS_CACHE_TTL,
+    redis_url=settings.REDIS_URL,
+    prefix="analytics",
+    l1_ttl=settings.ANALYTICS_CACHE_L1_TTL
+)
@@ -0,0 +1,57 @@
+import asyncio
+from contextlib import asynccontextmanager
+from app.core.config import settings
+
+
+class ConcurrencyLimiter:
+    """
+    Per-worker cap on in-flight LLM calls.
+
+    Up to max_concurrent callers run at once and up to max_queued wait for a
+    slot; anyone beyond that is refused immediately so latency stays bounded
+    for the requests that are admitted.
+    """
+
+    def __init__(self, max_concurrent: int, max_queued: int):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._waiting = 0
+
+    async def acquire(self) -> bool:
+        """Take a slot, waiting in the queue if needed. Returns False when the queue is full."""
+        if self._semaphore.locked():
+            if self._waiting >= self.max_queued:
+                return False
+            self._waiting += 1
+            try:
+                await self._semaphore.acquire()
+            finally:
+                self._waiting -= 1
+            return True
+        await self._semaphore.acquire()
+        return True
+
+    def release(self) -> None:
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold a slot for background work, waiting as long as it takes instead of being refused."""
+        await self._semaphore.acquire()
+        try:
+            yield
+        finally:
+            self._semaphore.release()
+
+
+# Global instance: chat turns and document-sized generation calls have
+# separate pools so slow quiz/summary runs never starve chat
+ai_chat_limiter = ConcurrencyLimiter(
+    max_concurrent=settings.AI_CHAT_MAX_CONCURRENCY,
+    max_queued=settings.AI_MAX_QUEUED_REQUESTS
+)
+ai_generation_limiter = ConcurrencyLimiter(
+    max_concurrent=settings.AI_GENERATION_MAX_CONCURRENCY,
+    max_queued=settings.AI_MAX_QUEUED_REQUESTS
+)
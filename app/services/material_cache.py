@@ -0,0 +1,125 @@
+import threading
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+from cachetools import TTLCache
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.models import Material
+from app.services.retrieval import invalidate_source
+
+
+@dataclass(frozen=True)
+class CachedMaterial:
+    """Read-only snapshot of the Material columns used by the AI endpoints."""
+    id: uuid.UUID
+    user_id: uuid.UUID
+    title: str
+    content: Optional[str]
+    raw_text: Optional[str]
+    summary: Optional[str]
+    glossary: Optional[dict]
+
+
+_cache: TTLCache = TTLCache(maxsize=settings.MATERIAL_CACHE_MAXSIZE, ttl=settings.MATERIAL_CACHE_TTL)
+_lock = threading.RLock()
+
+
+def _text_column(column, max_chars: Optional[int]):
+    if max_chars is None:
+        return column
+    return func.substr(column, 1, max_chars).label(column.key)
+
+
+def get_material_cached(
+    db: Session,
+    material_uuid: uuid.UUID,
+    user_id: Optional[uuid.UUID],
+    max_chars: Optional[int] = None
+) -> Optional[CachedMaterial]:
+    """
+    Return the material owned by user_id, hitting the DB only on cache miss.
+
+    Pass user_id=None to skip the ownership filter. max_chars truncates
+    content/raw_text in SQL so large documents never cross the DB wire.
+    """
+    key = (material_uuid, user_id, max_chars)
+    with _lock:
+        cached = _cache.get(key)
+    if cached is not None:
+        return cached
+
+    query = db.query(
+        Material.id,
+        Material.user_id,
+        Material.title,
+        _text_column(Material.content, max_chars),
+        _text_column(Material.raw_text, max_chars),
+        Material.summary,
+        Material.glossary
+    ).filter(Material.id == material_uuid)
+    if user_id is not None:
+        query = query.filter(Material.user_id == user_id)
+    row = query.first()
+
+    if row is None:
+        return None
+
+    material = CachedMaterial(**row._asdict())
+    with _lock:
+        _cache[key] = material
+    return material
+
+
+def get_materials_cached(
+    db: Session,
+    material_uuids: list[uuid.UUID],
+    user_id: Optional[uuid.UUID],
+    max_chars: Optional[int] = None
+) -> dict[uuid.UUID, CachedMaterial]:
+    """Batch variant of get_material_cached: all cache misses are loaded with one IN query."""
+    found = {}
+    missing = []
+    with _lock:
+        for material_uuid in material_uuids:
+            cached = _cache.get((material_uuid, user_id, max_chars))
+            if cached is not None:
+                found[material_uuid] = cached
+            else:
+                missing.append(material_uuid)
+
+    if missing:
+        query = db.query(
+            Material.id,
+            Material.user_id,
+            Material.title,
+            _text_column(Material.content, max_chars),
+            _text_column(Material.raw_text, max_chars),
+            Material.summary,
+            Material.glossary
+        ).filter(Material.id.in_(missing))
+        if user_id is not None:
+            query = query.filter(Material.user_id == user_id)
+
+        loaded = [CachedMaterial(**row._asdict()) for row in query.all()]
+        with _lock:
+            for material in loaded:
+                _cache[(material.id, user_id, max_chars)] = material
+                found[material.id] = material
+
+    return found
+
+
+def invalidate_material(material_id: uuid.UUID) -> None:
+    """Drop every cached entry for the given material, including its retrieval index."""
+    with _lock:
+        for key in [key for key in _cache.keys() if key[0] == material_id]:
+            _cache.pop(key, None)
+    invalidate_source(material_id)
+
+
+@event.listens_for(Material, "after_update")
+@event.listens_for(Material, "after_delete")
+def _invalidate_on_write(mapper, connection, target):
+    invalidate_material(target.id)
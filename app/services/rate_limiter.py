@@ -0,0 +1,97 @@
+import logging
+import threading
+import time
+import redis.asyncio as aioredis
+from cachetools import TTLCache
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Refill, take `cost` tokens and persist the bucket in a single round trip.
+# Tokens may go negative down to -rate * max_wait: that debt is the queue of
+# requests already promised a slot. Returns {accepted, wait_seconds}.
+_TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local max_wait = tonumber(ARGV[4])
+local cost = tonumber(ARGV[5])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate) - cost
+local wait = 0
+if tokens < 0 then
+    wait = -tokens / rate
+end
+if wait > max_wait then
+    return {0, tostring(wait)}
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil((burst - tokens) / rate) + 1)
+return {1, tostring(wait)}
+"""
+
+
+class RateLimiter:
+    """Per-key token bucket, shared via Redis when REDIS_URL is set."""
+
+    def __init__(self, per_minute: int, burst: int, redis_url: str = "", prefix: str = "ratelimit"):
+        self.rate = per_minute / 60  # tokens per second
+        self.burst = burst
+        self.prefix = prefix
+        # Async client: every rate-limited request checks the bucket on the event loop
+        self._script = aioredis.Redis.from_url(redis_url).register_script(_TOKEN_BUCKET_SCRIPT) if redis_url else None
+        # Local fallback: {key: (tokens, updated_at)}; an expired entry is a full bucket.
+        # Queued requests can leave a bucket up to rate * RATE_LIMIT_QUEUE_TIMEOUT
+        # in debt, so entries live as long as refilling from there takes
+        max_debt = self.rate * settings.RATE_LIMIT_QUEUE_TIMEOUT
+        self._buckets: TTLCache = TTLCache(maxsize=100000, ttl=(burst + max_debt) / self.rate + 1)
+        self._lock = threading.Lock()
+
+    async def acquire(self, key: str, max_wait: float = 0, cost: int = 1) -> tuple[bool, float]:
+        """
+        Take cost tokens (one per LLM call the request will make) for key.
+
+        Returns (accepted, wait): an accepted request must sleep `wait` seconds
+        before proceeding (0 when a token was available). A request that would
+        wait longer than max_wait is rejected and `wait` is the retry delay.
+        """
+        if self._script is not None:
+            try:
+                accepted, wait = await self._script(
+                    keys=[f"{self.prefix}:{key}"],
+                    args=[self.rate, self.burst, time.time(), max_wait, cost]
+                )
+                return bool(accepted), float(wait)
+            except aioredis.RedisError as e:
+                # Fail open: a Redis outage should not take the AI endpoints down
+                logger.warning(f"Rate limiter Redis error, allowing request: {e}")
+                return True, 0.0
+        return self._acquire_local(key, max_wait, cost)
+
+    def _acquire_local(self, key: str, max_wait: float, cost: int) -> tuple[bool, float]:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate) - cost
+            wait = -tokens / self.rate if tokens < 0 else 0.0
+            if wait > max_wait:
+                return False, wait
+            self._buckets[key] = (tokens, now)
+        return True, wait
+
+
+# Global instance
+ai_rate_limiter = RateLimiter(
+    per_minute=settings.AI_RATE_LIMIT_PER_MINUTE,
+    burst=settings.AI_RATE_LIMIT_BURST,
+    redis_url=settings.REDIS_URL,
+    prefix="ratelimit:ai"
+)
+quiz_rate_limiter = RateLimiter(
+    per_minute=settings.QUIZ_RATE_LIMIT_PER_MINUTE,
+    burst=settings.QUIZ_RATE_LIMIT_BURST,
+    redis_url=settings.REDIS_URL,
+    prefix="ratelimit:quiz"
+)
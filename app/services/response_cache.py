@@ -0,0 +1,272 @@
+import asyncio
+import hashlib
+import logging
+import random
+import re
+import threading
+from typing import Any, Awaitable, Callable, Optional
+import orjson
+import redis.asyncio as aioredis
+from cachetools import TTLCache
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_WORD_RE = re.compile(r"\w+")
+
+
+def normalize_message(message: str) -> str:
+    """Lower-case and collapse whitespace so trivially different prompts share a key."""
+    return _WHITESPACE_RE.sub(" ", (message or "").strip().lower())
+
+
+def content_digest(text: Optional[str]) -> str:
+    """Digest of material text, used instead of the (potentially huge) text itself."""
+    return hashlib.blake2b((text or "").encode("utf-8"), digest_size=16).hexdigest()
+
+
+def make_key(*parts: Any) -> str:
+    """Build a cache key from an endpoint name and its significant arguments."""
+    raw = "\0".join("" if part is None else str(part) for part in parts)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class ResponseCache:
+    """
+    TTL cache for LLM responses.
+
+    With a redis_url the entries live in Redis, shared by all workers, and
+    the in-process cache shrinks to a small short-lived L1 in front of it.
+    Deletes only reach this worker's L1, so other workers may keep serving
+    an entry for up to l1_ttl seconds. Values must be JSON-serializable.
+    """
+
+    L1_MAXSIZE = 256
+    L1_TTL = 30  # seconds
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: int,
+        redis_url: str = "",
+        prefix: str = "aicache",
+        l1_ttl: int = L1_TTL
+    ):
+        self.ttl = ttl
+        self.prefix = prefix
+        # Async client: cache lookups run on the event loop and must not block it
+        self._redis = aioredis.Redis.from_url(redis_url) if redis_url else None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        if self._redis is not None:
+            maxsize, ttl = min(maxsize, self.L1_MAXSIZE), min(ttl, l1_ttl)
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._inflight: dict[str, asyncio.Lock] = {}
+
+    def _client(self) -> Optional[aioredis.Redis]:
+        # The client's connections belong to the loop that first used them
+        if self._redis is not None and self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        return self._redis
+
+    async def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            value = self._cache.get(key)
+        client = self._client()
+        if value is not None or client is None:
+            return value
+
+        try:
+            raw = await client.get(f"{self.prefix}:{key}")
+        except aioredis.RedisError as e:
+            logger.warning(f"Response cache Redis error on get: {e}")
+            return None
+        if raw is None:
+            return None
+        value = orjson.loads(raw)
+        with self._lock:
+            self._cache[key] = value
+        return value
+
+    async def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._cache[key] = value
+        client = self._client()
+        if client is not None:
+            try:
+                await client.set(f"{self.prefix}:{key}", orjson.dumps(value), ex=self.ttl)
+            except aioredis.RedisError as e:
+                logger.warning(f"Response cache Redis error on set: {e}")
+
+    async def delete(self, key: str) -> None:
+        with self._lock:
+            self._cache.pop(key, None)
+        client = self._client()
+        if client is not None:
+            try:
+                await client.delete(f"{self.prefix}:{key}")
+            except aioredis.RedisError as e:
+                logger.warning(f"Response cache Redis error on delete: {e}")
+
+    def _delete_local_prefix(self, key_prefix: str) -> None:
+        with self._lock:
+            for key in [key for key in self._cache.keys() if key.startswith(key_prefix)]:
+                self._cache.pop(key, None)
+
+    async def _delete_shared_prefix(self, pattern: str) -> None:
+        try:
+            async for name in self._redis.scan_iter(match=pattern):
+                await self._redis.delete(name)
+        except aioredis.RedisError as e:
+            logger.warning(f"Response cache Redis error on delete: {e}")
+
+    async def delete_prefix(self, key_prefix: str) -> None:
+        """Drop every entry whose key starts with key_prefix (keys must be unhashed for this)."""
+        self._delete_local_prefix(key_prefix)
+        if self._client() is not None:
+            await self._delete_shared_prefix(f"{self.prefix}:{key_prefix}*")
+
+    def discard_prefix(self, key_prefix: str) -> None:
+        """
+        delete_prefix for callers that cannot await, such as ORM event hooks.
+
+        The local entries go at once; the Redis delete is handed to the event
+        loop the cache runs on and completes in the background.
+        """
+        self._delete_local_prefix(key_prefix)
+        if self._redis is not None and self._loop is not None and not self._loop.is_closed():
+            asyncio.run_coroutine_threadsafe(
+                self._delete_shared_prefix(f"{self.prefix}:{key_prefix}*"),
+                self._loop
+            )
+
+    async def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+        if self._client() is not None:
+            await self._delete_shared_prefix(f"{self.prefix}:*")
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        refresh: bool = False
+    ) -> Any:
+        """
+        Return the cached value, or await compute() and cache its result.
+
+        Concurrent misses on the same key are coalesced: one caller runs
+        compute() while the others wait and then read its result.
+        refresh=True always recomputes.
+        """
+        if refresh:
+            value = await compute()
+            await self.set(key, value)
+            return value
+
+        value = await self.get(key)
+        if value is not None:
+            return value
+
+        lock = self._inflight.setdefault(key, asyncio.Lock())
+        try:
+            async with lock:
+                value = await self.get(key)
+                if value is None:
+                    value = await compute()
+                    await self.set(key, value)
+                return value
+        finally:
+            if self._inflight.get(key) is lock and not lock.locked():
+                del self._inflight[key]
+
+
+def _shingles(message: str) -> frozenset[str]:
+    """Word bigrams of the normalized message (single words for one-word messages)."""
+    words = _WORD_RE.findall(normalize_message(message))
+    if len(words) < 2:
+        return frozenset(words)
+    return frozenset(f"{a} {b}" for a, b in zip(words, words[1:]))
+
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(0)  # fixed seed: signatures must be stable across workers
+_MINHASH_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(_MERSENNE_PRIME)) for _ in range(32)]
+
+
+def minhash(features: frozenset[str]) -> list[int]:
+    """MinHash signature: the share of equal slots estimates the Jaccard similarity of two sets."""
+    hashes = [
+        int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+        for feature in features
+    ]
+    return [min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in _MINHASH_PERMUTATIONS]
+
+
+class NearDuplicateIndex:
+    """
+    LSH index from (scope, message) to the cache key of a near-identical earlier message.
+
+    MinHash signatures are split into bands; messages sharing any band within
+    the same scope are candidates, confirmed by exact Jaccard similarity of
+    their word bigrams so reordered or different questions never match.
+    """
+
+    ROWS_PER_BAND = 2
+
+    def __init__(self, maxsize: int, ttl: int, threshold: float = 0.8):
+        self.threshold = threshold
+        bands = len(_MINHASH_PERMUTATIONS) // self.ROWS_PER_BAND
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._buckets = TTLCache(maxsize=maxsize * bands, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def _bands(self, scope: str, features: frozenset[str]) -> list[tuple]:
+        signature = minhash(features)
+        rows = self.ROWS_PER_BAND
+        return [(scope, i, tuple(signature[i:i + rows])) for i in range(0, len(signature), rows)]
+
+    def add(self, scope: str, message: str, key: str) -> None:
+        shingles = _shingles(message)
+        if not shingles:
+            return
+        bands = self._bands(scope, shingles)
+        with self._lock:
+            self._entries[key] = shingles
+            for band in bands:
+                self._buckets[band] = self._buckets.get(band, frozenset()) | {key}
+
+    def find(self, scope: str, message: str) -> Optional[str]:
+        """Return the key of the most similar indexed message above threshold, if any."""
+        shingles = _shingles(message)
+        if not shingles:
+            return None
+        bands = self._bands(scope, shingles)
+        best_key, best_score = None, self.threshold
+        with self._lock:
+            candidates = set()
+            for band in bands:
+                candidates |= self._buckets.get(band, frozenset())
+            for key in candidates:
+                other = self._entries.get(key)
+                if other is None:
+                    continue
+                score = len(shingles & other) / len(shingles | other)
+                if score >= best_score:
+                    best_key, best_score = key, score
+        return best_key
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+
+# Global instance
+response_cache = ResponseCache(
+    maxsize=settings.AI_CACHE_MAXSIZE,
+    ttl=settings.AI_CACHE_TTL,
+    redis_url=settings.REDIS_URL
+)
+chat_index = NearDuplicateIndex(maxsize=settings.AI_CACHE_MAXSIZE, ttl=settings.AI_CACHE_TTL)
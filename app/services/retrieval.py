@@ -0,0 +1,139 @@
+import math
+import re
+import threading
+import uuid
+from collections import Counter
+from typing import Callable, Union
+from cachetools import LRUCache
+from app.core.config import settings
+
+_TOKEN_RE = re.compile(r"\w+")
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+
+CHUNK_CHARS = 500
+
+
+def _tokenize(text: str) -> list[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def split_chunks(text: str, chunk_chars: int = CHUNK_CHARS) -> list[str]:
+    """Pack paragraphs into chunks of at most chunk_chars, hard-splitting longer paragraphs."""
+    chunks = []
+    current = ""
+    for paragraph in _PARAGRAPH_RE.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        while len(paragraph) > chunk_chars:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(paragraph[:chunk_chars])
+            paragraph = paragraph[chunk_chars:]
+        if current and len(current) + len(paragraph) + 2 > chunk_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class BM25Index:
+    """Okapi BM25 ranking over the chunks of one document."""
+
+    K1 = 1.5
+    B = 0.75
+
+    def __init__(self, chunks: list[str]):
+        self.chunks = chunks
+        self.size = sum(len(chunk) for chunk in chunks)
+        self._term_freqs = [Counter(_tokenize(chunk)) for chunk in chunks]
+        self._lengths = [sum(tf.values()) for tf in self._term_freqs]
+        self._avg_length = (sum(self._lengths) / len(chunks)) if chunks else 1.0
+        doc_freqs = Counter(term for tf in self._term_freqs for term in tf)
+        n = len(chunks)
+        self._idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freqs.items()}
+
+    def rank(self, query: str) -> list[int]:
+        """Indices of chunks sharing at least one term with query, best first."""
+        terms = [term for term in set(_tokenize(query)) if term in self._idf]
+        if not terms:
+            return []
+        scores = []
+        for i, tf in enumerate(self._term_freqs):
+            norm = self.K1 * (1 - self.B + self.B * self._lengths[i] / self._avg_length)
+            score = sum(
+                self._idf[term] * tf[term] * (self.K1 + 1) / (tf[term] + norm)
+                for term in terms
+                if term in tf
+            )
+            if score > 0:
+                scores.append((score, i))
+        scores.sort(reverse=True)
+        return [i for _, i in scores]
+
+
+# Per material: the text itself when it fits a context, otherwise its BM25
+# index. Built once and reused across chat turns; bounded by total text size.
+_sources: LRUCache = LRUCache(
+    maxsize=settings.RETRIEVAL_CACHE_CHARS,
+    getsizeof=lambda source: len(source) if isinstance(source, str) else source.size
+)
+_lock = threading.Lock()
+
+
+def _source_for(material_id: uuid.UUID, load_text: Callable[[], str], max_chars: int) -> Union[str, BM25Index]:
+    key = (material_id, max_chars)
+    with _lock:
+        source = _sources.get(key)
+    if source is None:
+        text = load_text() or ""
+        source = text if len(text) <= max_chars else BM25Index(split_chunks(text))
+        with _lock:
+            try:
+                _sources[key] = source
+            except ValueError:
+                pass  # larger than the whole cache: used for this call only
+    return source
+
+
+def invalidate_source(material_id: uuid.UUID) -> None:
+    """Drop the cached text/index of the given material."""
+    with _lock:
+        for key in [key for key in _sources.keys() if key[0] == material_id]:
+            _sources.pop(key, None)
+
+
+def retrieve_context(material_id: uuid.UUID, load_text: Callable[[], str], query: str, max_chars: int) -> str:
+    """
+    Return the parts of the material most relevant to query, at most max_chars long.
+
+    load_text() is only called when the material is not cached yet. Short
+    texts are returned whole; otherwise the best BM25 chunks are kept in
+    document order, falling back to the leading chunks when nothing matches.
+    """
+    source = _source_for(material_id, load_text, max_chars)
+    if isinstance(source, str):
+        return source
+
+    picked = _fit_chunks(source.chunks, source.rank(query), max_chars)
+    if not picked:
+        picked = _fit_chunks(source.chunks, range(len(source.chunks)), max_chars, stop_when_full=True)
+    return "\n\n".join(source.chunks[i] for i in sorted(picked))
+
+
+def _fit_chunks(chunks: list[str], order, max_chars: int, stop_when_full: bool = False) -> list[int]:
+    """Indices of chunks taken in the given order while they fit in max_chars."""
+    picked = []
+    used = 0
+    for i in order:
+        size = len(chunks[i]) + 2
+        if used + size > max_chars:
+            if stop_when_full:
+                break
+            continue
+        picked.append(i)
+        used += size
+    return picked
@@ -0,0 +1,50 @@
+import os
+import threading
+import time
+import uuid
+
+
+def _uuid7_int() -> int:
+    timestamp_ms = time.time_ns() // 1_000_000
+    rand = int.from_bytes(os.urandom(10), "big")
+    value = (timestamp_ms & 0xFFFF_FFFF_FFFF) << 80
+    value |= 0x7 << 76                                  # version
+    value |= ((rand >> 62) & 0xFFF) << 64               # rand_a (12 bits)
+    value |= 0b10 << 62                                 # RFC 4122 variant
+    value |= rand & 0x3FFF_FFFF_FFFF_FFFF               # rand_b (62 bits)
+    return value
+
+
+def uuid7() -> uuid.UUID:
+    """
+    Time-ordered UUID (RFC 9562 version 7).
+
+    48-bit Unix millisecond timestamp followed by random bits, so new primary
+    keys land at the right edge of the B-tree instead of on random pages.
+    """
+    return uuid.UUID(int=_uuid7_int())
+
+
+def uuid7_str() -> str:
+    """str(uuid7()) without building the UUID object, for ids that only go to JSON."""
+    h = "%032x" % _uuid7_int()
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
+_last_ms_id = 0
+_ms_id_lock = threading.Lock()
+
+
+def reserve_ms_ids(count: int = 1) -> int:
+    """
+    Reserve `count` consecutive integer ids and return the first.
+
+    Ids are Unix milliseconds, bumped past the last reserved one so calls
+    within the same millisecond never collide in this process.
+    """
+    global _last_ms_id
+    now_ms = time.time_ns() // 1_000_000
+    with _ms_id_lock:
+        first = max(now_ms, _last_ms_id + 1)
+        _last_ms_id = first + count - 1
+    return first
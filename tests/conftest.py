@@ -1,9 +1,14 @@
+import os
 import pytest
 import inspect
 import httpx
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+
+# Checked once when the app is imported (see ai_swagger._IS_PYTEST)
+os.environ.setdefault("EDUSTREAM_TESTING", "1")
+
 from app.main import app
 from app.core.database import Base, get_db
 
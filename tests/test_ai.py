@@ -45,6 +45,20 @@ def material_id(client: TestClient, auth_token: str, db_session):
     return str(material.id)
 
 
+def _add_teacher_materials(db_session, *contents):
+    """Commit one material per text for teacher@test.com and return them."""
+    from app.models.models import Material, User
+
+    teacher = db_session.query(User).filter(User.email == "teacher@test.com").first()
+    materials = [
+        Material(user_id=teacher.id, title=f"Material {i}", content=content, file_url=f"/uploads/material{i}.pdf")
+        for i, content in enumerate(contents)
+    ]
+    db_session.add_all(materials)
+    db_session.commit()
+    return materials
+
+
 def test_generate_summary_unauthorized(client: TestClient):
     """Test generate summary without authentication."""
     response = client.post(
@@ -57,11 +71,11 @@ def test_generate_summary_unauthorized(client: TestClient):
 @patch('app.services.ai_service.ai_service.generate_summary')
 def test_generate_summary_success(mock_generate, client: TestClient, auth_token: str, material_id: str):
     """Test successful summary generation."""
-    mock_generate.return_value = AsyncMock(return_value={
+    mock_generate.return_value = {
         "is_educational": True,
         "summary": "Test summary",
         "glossary": {"Python": "A programming language"}
-    })()
+    }
     
     response = client.post(
         "/api/v1/ai/generate-summary",
@@ -99,9 +113,9 @@ def test_generate_quiz_unauthorized(client: TestClient):
 
 
 @patch('app.services.ai_service.ai_service.generate_quiz')
-def test_generate_quiz_success(mock_generate, client: TestClient, auth_token: str, material_id: str):
+def test_generate_quiz_success(mock_generate, client: TestClient, auth_token: str, material_id: str, db_session):
     """Test successful quiz generation."""
-    mock_generate.return_value = AsyncMock(return_value={
+    mock_generate.return_value = {
         "questions": [
             {
                 "question": "What is Python?",
@@ -110,7 +124,7 @@ def test_generate_quiz_success(mock_generate, client: TestClient, auth_token: st
                 "explanation": "Python is a high-level programming language."
             }
         ]
-    })()
+    }
     
     response = client.post(
         "/api/v1/ai/generate-quiz",
@@ -126,6 +140,16 @@ def test_generate_quiz_success(mock_generate, client: TestClient, auth_token: st
     data = response.json()
     assert "questions" in data
     assert len(data["questions"]) > 0
+    # New quizzes and questions get time-ordered (v7) ids
+    import uuid
+    assert uuid.UUID(data["id"]).version == 7
+    assert uuid.UUID(data["questions"][0]["id"]).version == 7
+
+    # Persisted by a background task with the id already returned to the client
+    from app.models.models import Quiz as QuizModel
+    saved = db_session.query(QuizModel).filter(QuizModel.id == uuid.UUID(data["id"])).first()
+    assert saved is not None
+    assert saved.questions[0]["id"] == data["questions"][0]["id"]
 
 
 def test_generate_quiz_invalid_difficulty(client: TestClient, auth_token: str, material_id: str):
@@ -154,3 +178,736 @@ def test_generate_quiz_invalid_num_questions(client: TestClient, auth_token: str
         headers={"Authorization": f"Bearer {auth_token}"}
     )
     assert response.status_code == 422
+
+
+def test_quiz_generate_request_accepts_both_payload_shapes():
+    """generate-quiz takes the swagger QuizConfig shape and the legacy snake_case one."""
+    from app.schemas.swagger_schemas import QuizGenerateRequest
+
+    material_id = "00000000-0000-0000-0000-000000000001"
+    swagger = QuizGenerateRequest.model_validate({"materialId": material_id, "count": 3, "type": "open"})
+    legacy = QuizGenerateRequest.model_validate({"material_id": material_id, "num_questions": 3})
+
+    assert not swagger.legacy_mode
+    assert legacy.legacy_mode
+    assert swagger.count == legacy.count == 3
+    assert swagger.type.value == "open"
+    assert legacy.difficulty.value == "medium"
+
+
+def test_chat_reuses_cached_llm_response(client: TestClient, auth_token: str):
+    """Repeated chat messages are served from the response cache unless busted."""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    with patch(
+        'app.services.ai_service.ai_service.chat_with_context',
+        new=AsyncMock(return_value="Cached answer")
+    ) as mock_chat:
+        first = client.post("/api/v1/ai/chat", json={"message": "What is Python?"}, headers=headers)
+        second = client.post("/api/v1/ai/chat", json={"message": "  what is   PYTHON? "}, headers=headers)
+        assert first.status_code == 200
+        assert second.status_code == 200
+        assert second.json()["response"] == "Cached answer"
+        assert mock_chat.await_count == 1
+
+        busted = client.post(
+            "/api/v1/ai/chat?cache_bust=true",
+            json={"message": "What is Python?"},
+            headers=headers
+        )
+        assert busted.status_code == 200
+        assert mock_chat.await_count == 2
+
+
+def test_material_cache_invalidated_on_update(db_session, material_id: str):
+    """Material writes evict the cached AI-context snapshot."""
+    import uuid
+    from app.models.models import Material
+    from app.services.material_cache import get_material_cached
+
+    material_uuid = uuid.UUID(material_id)
+    cached = get_material_cached(db_session, material_uuid, None)
+    assert cached.title == "Test Material"
+
+    material = db_session.query(Material).filter(Material.id == material_uuid).first()
+    material.title = "Renamed Material"
+    db_session.commit()
+
+    assert get_material_cached(db_session, material_uuid, None).title == "Renamed Material"
+
+
+def test_material_cache_truncates_text_in_sql(db_session, material_id: str):
+    """max_chars slices content server-side and is part of the cache key."""
+    import uuid
+    from app.services.material_cache import get_material_cached
+
+    material_uuid = uuid.UUID(material_id)
+    full = get_material_cached(db_session, material_uuid, None)
+    short = get_material_cached(db_session, material_uuid, None, max_chars=5)
+
+    assert short.raw_text == full.raw_text[:5]
+    assert len(full.raw_text) > 5
+
+
+def test_generate_quiz_async_and_poll(client: TestClient, auth_token: str, db_session):
+    """Background quiz generation returns 202 and becomes ready for polling."""
+    [material] = _add_teacher_materials(db_session, "Photosynthesis converts light energy into chemical energy.")
+
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    response = client.post(
+        "/api/v1/ai/generate-quiz/async",
+        json={"materialId": str(material.id), "difficulty": "easy", "count": 3, "type": "mcq"},
+        headers=headers
+    )
+    assert response.status_code == 202
+    payload = response.json()
+    assert payload["status"] == "pending"
+
+    poll = client.get(f"/api/v1/ai/quiz/{payload['quizId']}", headers=headers)
+    assert poll.status_code == 200
+    data = poll.json()
+    assert data["status"] == "ready"
+    assert len(data["quiz"]["questions"]) == 3
+
+
+def test_generate_quiz_batch_creates_pending_quizzes(client: TestClient, auth_token: str, db_session):
+    """A quiz batch returns 202 with one pending quiz per config; each is ready after the background run."""
+    import uuid
+
+    materials = _add_teacher_materials(db_session, "Topic 0 text.", "Topic 1 text.")
+
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    quizzes = [
+        {"materialId": str(material.id), "difficulty": "easy", "count": 2, "type": "mcq"}
+        for material in materials
+    ]
+    response = client.post("/api/v1/ai/generate-quiz/batch", json={"quizzes": quizzes}, headers=headers)
+    assert response.status_code == 202
+    statuses = response.json()
+    assert len(statuses) == 2
+
+    for item in statuses:
+        poll = client.get(f"/api/v1/ai/quiz/{item['quizId']}", headers=headers).json()
+        assert poll["status"] == "ready"
+        assert len(poll["quiz"]["questions"]) == 2
+
+    quizzes.append({"materialId": str(uuid.uuid4()), "difficulty": "easy", "count": 2, "type": "mcq"})
+    missing = client.post("/api/v1/ai/generate-quiz/batch", json={"quizzes": quizzes}, headers=headers)
+    assert missing.status_code == 404
+
+
+def test_generate_quiz_batch_charges_one_token_per_quiz(client: TestClient, auth_token: str):
+    """A batch consumes the quiz rate limit per quiz, so it cannot exceed the per-user quiz rate."""
+    import uuid
+    from app.services.rate_limiter import quiz_rate_limiter
+
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    quizzes = [
+        {"materialId": str(uuid.uuid4()), "difficulty": "easy", "count": 2, "type": "mcq"}
+        for _ in range(3)
+    ]
+    with patch.object(quiz_rate_limiter, "burst", 5), patch.object(quiz_rate_limiter, "rate", 1 / 60), patch(
+        'app.core.config.settings.RATE_LIMIT_QUEUE_TIMEOUT', 0
+    ):
+        first = client.post("/api/v1/ai/generate-quiz/batch", json={"quizzes": quizzes}, headers=headers)
+        second = client.post("/api/v1/ai/generate-quiz/batch", json={"quizzes": quizzes}, headers=headers)
+
+    assert first.status_code == 404
+    assert second.status_code == 429
+
+
+def test_create_quiz_from_draft_normalizes_questions(client: TestClient, auth_token: str, db_session):
+    """Draft questions are normalized once; invalid ids are replaced, incomplete and repeated questions dropped."""
+    import uuid
+
+    [material] = _add_teacher_materials(db_session, "Text")
+
+    kept_id = str(uuid.uuid4())
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    response = client.post(
+        "/api/v1/ai/quizzes",
+        json={
+            "materialId": str(material.id),
+            "questions": [
+                {"id": kept_id, "type": "multiple-choice", "text": "Q1?", "options": ["A", "B"], "correctAnswer": "A"},
+                {"id": "q-2", "type": "true_false", "question": "Q2?", "correct_answer": "True"},
+                {"text": "q1?", "correctAnswer": "B"},
+                {"text": "No answer"}
+            ]
+        },
+        headers=headers
+    )
+
+    assert response.status_code == 201
+    questions = response.json()["questions"]
+    assert [q["type"] for q in questions] == ["mcq", "boolean"]
+    assert questions[0]["id"] == kept_id
+    assert uuid.UUID(questions[1]["id"])
+
+    saved = client.get(f"/api/v1/ai/quizzes/{response.json()['id']}", headers=headers).json()
+    assert [q["id"] for q in saved["questions"]] == [q["id"] for q in questions]
+
+    too_many = client.post(
+        "/api/v1/ai/quizzes",
+        json={
+            "materialId": str(material.id),
+            "questions": [{"text": f"Q{i}?", "correctAnswer": "A"} for i in range(201)]
+        },
+        headers=headers
+    )
+    assert too_many.status_code == 422
+
+
+def test_generate_quiz_stream_emits_questions_then_saves(client: TestClient, auth_token: str, db_session):
+    """Streaming quiz generation sends one event per question and persists the quiz."""
+    import json
+
+    [material] = _add_teacher_materials(db_session, "Mitochondria produce ATP.")
+
+    async def fake_stream(**kwargs):
+        for i in range(2):
+            yield {"text": f"Question {i}?", "options": ["A", "B"], "correctAnswer": "A"}
+        yield {"text": "No answer"}
+
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    with patch('app.services.ai_service.ai_service.generate_quiz_advanced_stream', new=fake_stream):
+        response = client.post(
+            "/api/v1/ai/generate-quiz/stream",
+            json={"materialId": str(material.id), "difficulty": "easy", "count": 5, "type": "mcq"},
+            headers=headers
+        )
+
+    assert response.status_code == 200
+    events = [json.loads(line[len("data: "):]) for line in response.text.splitlines() if line.startswith("data: ")]
+    assert [e["question"]["text"] for e in events if "question" in e] == ["Question 0?", "Question 1?"]
+    assert events[-1]["done"] is True
+
+    saved = client.get(f"/api/v1/ai/quizzes/{events[-1]['quizId']}", headers=headers)
+    assert saved.status_code == 200
+    assert len(saved.json()["questions"]) == 2
+
+
+def test_chat_context_retrieves_relevant_chunks(client: TestClient, auth_token: str, db_session):
+    """Chat context for long materials is the best-matching chunks, not just the first 2000 chars."""
+    filler = "\n\n".join(f"Paragraph {i} talks about the history of ancient Rome." for i in range(100))
+    [material] = _add_teacher_materials(
+        db_session, filler + "\n\nMitochondria are the powerhouse of the cell and produce ATP."
+    )
+
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    with patch(
+        'app.services.ai_service.ai_service.chat_with_context',
+        new=AsyncMock(return_value="ATP")
+    ) as mock_chat:
+        response = client.post(
+            "/api/v1/ai/chat",
+            json={"message": "What do mitochondria produce?", "materialId": str(material.id)},
+            headers=headers
+        )
+
+    assert response.status_code == 200
+    context = mock_chat.await_args.kwargs["context"]
+    assert "Mitochondria are the powerhouse" in context
+    assert len(context) <= 2000
+
+
+def test_retrieval_loads_material_text_once():
+    """The material text is read only to build its index; later turns reuse the cached chunks."""
+    import uuid
+    from app.services.retrieval import retrieve_context, invalidate_source
+
+    material_id = uuid.uuid4()
+    text = "\n\n".join(f"Paragraph {i} about Rome." for i in range(200)) + "\n\nMitochondria produce ATP."
+    loads = []
+
+    def load_text():
+        loads.append(1)
+        return text
+
+    first = retrieve_context(material_id, load_text, "mitochondria", 500)
+    second = retrieve_context(material_id, load_text, "Rome", 500)
+    assert "Mitochondria produce ATP." in first
+    assert "Rome" in second
+    assert len(loads) == 1
+
+    invalidate_source(material_id)
+    retrieve_context(material_id, load_text, "mitochondria", 500)
+    assert len(loads) == 2
+
+
+def test_smart_action_reuses_cached_response(client: TestClient, auth_token: str):
+    """Repeating a smart action on the same selection skips the LLM unless busted."""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    payload = {"text": "Mitochondria produce ATP.", "action": "simplify"}
+    with patch(
+        'app.services.ai_service.ai_service.perform_smart_action',
+        new=AsyncMock(return_value="Cells make energy.")
+    ) as mock_action:
+        first = client.post("/api/v1/ai/smart-action", json=payload, headers=headers)
+        second = client.post("/api/v1/ai/smart-action", json=payload, headers=headers)
+        assert first.json() == second.json() == {"result": "Cells make energy."}
+        assert mock_action.await_count == 1
+
+        client.post("/api/v1/ai/smart-action", json={**payload, "action": "explain"}, headers=headers)
+        client.post("/api/v1/ai/smart-action?cache_bust=true", json=payload, headers=headers)
+        assert mock_action.await_count == 3
+
+
+def test_chat_reuses_response_for_near_duplicate_message(client: TestClient, auth_token: str):
+    """Near-identical wording hits the cache; reordered questions do not."""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    with patch(
+        'app.services.ai_service.ai_service.chat_with_context',
+        new=AsyncMock(return_value="Photosynthesis answer")
+    ) as mock_chat:
+        client.post(
+            "/api/v1/ai/chat",
+            json={"message": "Explain how photosynthesis works in green plants"},
+            headers=headers
+        )
+        similar = client.post(
+            "/api/v1/ai/chat",
+            json={"message": "explain how photosynthesis works in green plants, please!"},
+            headers=headers
+        )
+        assert similar.json()["response"] == "Photosynthesis answer"
+        assert mock_chat.await_count == 1
+
+        client.post("/api/v1/ai/chat", json={"message": "is python better than java"}, headers=headers)
+        client.post("/api/v1/ai/chat", json={"message": "is java better than python"}, headers=headers)
+        assert mock_chat.await_count == 3
+
+
+def test_get_ai_sessions_lists_recent_chats(client: TestClient, auth_token: str):
+    """Chat history sidebar returns the sessions created by /ai/chat."""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    with patch(
+        'app.services.ai_service.ai_service.chat_with_context',
+        new=AsyncMock(return_value="Answer")
+    ):
+        chat = client.post("/api/v1/ai/chat", json={"message": "History check"}, headers=headers)
+    assert chat.status_code == 200
+
+    response = client.get("/api/v1/ai/sessions", headers=headers)
+    assert response.status_code == 200
+    sessions = response.json()
+    assert len(sessions) >= 1
+    assert {"id", "title", "date", "docId"} <= set(sessions[0].keys())
+
+
+def test_quiz_templates_are_stable_and_support_etag(client: TestClient, auth_token: str):
+    """Templates have fixed ids and a matching If-None-Match yields 304."""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    first = client.get("/api/v1/ai/templates", headers=headers)
+    second = client.get("/api/v1/ai/templates", headers=headers)
+    assert first.status_code == 200
+    assert first.json() == second.json()
+    assert len(first.json()) == 3
+
+    etag = first.headers["etag"]
+    cached = client.get("/api/v1/ai/templates", headers={**headers, "If-None-Match": etag})
+    assert cached.status_code == 304
+
+
+def test_chat_appends_turns_to_existing_session(client: TestClient, auth_token: str):
+    """Follow-up messages with sessionId extend the same history."""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    with patch(
+        'app.services.ai_service.ai_service.chat_with_context',
+        new=AsyncMock(side_effect=["First answer", "Second answer"])
+    ):
+        first = client.post("/api/v1/ai/chat", json={"message": "First question"}, headers=headers)
+        session_id = first.json()["sessionId"]
+        second = client.post(
+            "/api/v1/ai/chat",
+            json={"message": "Second question", "sessionId": session_id},
+            headers=headers
+        )
+    assert second.json()["sessionId"] == session_id
+
+    history = client.get(f"/api/v1/ai/sessions/{session_id}", headers=headers).json()["messages"]
+    assert [m["text"] for m in history] == ["First question", "First answer", "Second question", "Second answer"]
+
+
+def test_chat_with_unknown_session_returns_new_session(client: TestClient, auth_token: str):
+    """A stale or foreign sessionId starts a new session whose id is returned."""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    with patch(
+        'app.services.ai_service.ai_service.chat_with_context',
+        new=AsyncMock(return_value="Answer")
+    ):
+        response = client.post(
+            "/api/v1/ai/chat",
+            json={"message": "Lost question", "sessionId": 987654},
+            headers=headers
+        )
+    session_id = response.json()["sessionId"]
+    assert session_id != 987654
+
+    history = client.get(f"/api/v1/ai/sessions/{session_id}", headers=headers).json()["messages"]
+    assert [m["text"] for m in history] == ["Lost question", "Answer"]
+
+
+def test_chat_rejects_invalid_material_id(client: TestClient, auth_token: str):
+    """materialId is parsed by the schema, so malformed ids fail validation."""
+    response = client.post(
+        "/api/v1/ai/chat",
+        json={"message": "Hello", "materialId": "not-a-uuid"},
+        headers={"Authorization": f"Bearer {auth_token}"}
+    )
+    assert response.status_code == 422
+
+
+def test_chat_rate_limited_per_user(client: TestClient, auth_token: str):
+    """Requests beyond the burst that cannot wait for a token are rejected with 429."""
+    from app.services.rate_limiter import ai_rate_limiter
+
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    with patch.object(ai_rate_limiter, "burst", 2), patch.object(ai_rate_limiter, "rate", 1 / 60), patch(
+        'app.core.config.settings.RATE_LIMIT_QUEUE_TIMEOUT', 0
+    ), patch(
+        'app.services.ai_service.ai_service.chat_with_context',
+        new=AsyncMock(return_value="Answer")
+    ):
+        for _ in range(2):
+            assert client.post("/api/v1/ai/chat", json={"message": "Hi"}, headers=headers).status_code == 200
+        throttled = client.post("/api/v1/ai/chat", json={"message": "Hi"}, headers=headers)
+
+    assert throttled.status_code == 429
+    assert throttled.headers["retry-after"] == "60"
+
+
+def test_summary_and_assignment_are_rate_limited(client: TestClient, auth_token: str):
+    """The single-material generation routes share the per-user AI token bucket."""
+    from app.services.rate_limiter import ai_rate_limiter
+
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    with patch.object(ai_rate_limiter, "burst", 0), patch(
+        'app.core.config.settings.RATE_LIMIT_QUEUE_TIMEOUT', 0
+    ):
+        summary = client.post("/api/v1/ai/generate-summary", json={"material_id": "x"}, headers=headers)
+        assignment = client.post("/api/v1/ai/generate-assignment", json={}, headers=headers)
+
+    assert summary.status_code == 429
+    assert assignment.status_code == 429
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_queues_within_timeout():
+    """A request over the burst waits for the next token instead of failing, up to max_wait."""
+    from app.services.rate_limiter import RateLimiter
+
+    limiter = RateLimiter(per_minute=60, burst=1)
+    assert await limiter.acquire("user") == (True, 0.0)
+
+    accepted, wait = await limiter.acquire("user", max_wait=5)
+    assert accepted
+    assert 0.9 < wait <= 1.0
+
+    accepted, wait = await limiter.acquire("user", max_wait=1)
+    assert not accepted
+    assert 1.9 < wait <= 2.0
+    assert await limiter.acquire("other") == (True, 0.0)
+
+
+def test_rate_limiter_keeps_indebted_buckets_until_refilled():
+    """A bucket left in debt by queued requests is not forgotten before it has refilled."""
+    from app.core.config import settings
+    from app.services.rate_limiter import RateLimiter
+
+    limiter = RateLimiter(per_minute=60, burst=2)
+    assert limiter._buckets.ttl >= 2 + settings.RATE_LIMIT_QUEUE_TIMEOUT
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limiter_rejects_past_queue():
+    """Callers past max_concurrent queue for a slot; past max_queued they are refused."""
+    import asyncio
+    from app.services.concurrency_limiter import ConcurrencyLimiter
+
+    limiter = ConcurrencyLimiter(max_concurrent=1, max_queued=1)
+    assert await limiter.acquire()
+
+    queued = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    assert not queued.done()
+    assert not await limiter.acquire()
+
+    limiter.release()
+    assert await queued
+    limiter.release()
+    assert await limiter.acquire()
+
+
+def test_chat_returns_503_when_limiter_is_full(client: TestClient, auth_token: str):
+    """A saturated chat pool fails fast instead of queueing more LLM calls."""
+    from app.services.concurrency_limiter import ai_chat_limiter
+
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    with patch.object(ai_chat_limiter, "acquire", new=AsyncMock(return_value=False)):
+        response = client.post("/api/v1/ai/chat", json={"message": "Busy?"}, headers=headers)
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_chat_message_ids_never_collide():
+    """Message id ranges reserved within the same millisecond do not overlap."""
+    from app.utils.ids import reserve_ms_ids
+
+    firsts = [reserve_ms_ids(2) for _ in range(100)]
+    ids = [i for first in firsts for i in (first, first + 1)]
+    assert len(set(ids)) == len(ids)
+    assert ids == sorted(ids)
+
+
+def test_chat_stream_emits_sse_deltas(client: TestClient, auth_token: str):
+    """Streaming chat sends delta events and finishes with the saved session id."""
+    import json
+
+    async def fake_stream(**kwargs):
+        for part in ["Hel", "lo"]:
+            yield part
+
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    with patch('app.services.ai_service.ai_service.chat_with_context_stream', new=fake_stream):
+        response = client.post("/api/v1/ai/chat/stream", json={"message": "Stream me"}, headers=headers)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [json.loads(line[len("data: "):]) for line in response.text.splitlines() if line.startswith("data: ")]
+    assert [e["delta"] for e in events if "delta" in e] == ["Hel", "lo"]
+    assert events[-1]["done"] is True
+
+    sessions = client.get("/api/v1/ai/sessions", headers=headers).json()
+    assert any(s["id"] == events[-1]["sessionId"] for s in sessions)
+
+
+def test_chat_stream_holds_chat_slot_until_stream_ends(client: TestClient, auth_token: str):
+    """Streams take a chat limiter slot (503 when saturated) and give it back once finished."""
+    from app.services.concurrency_limiter import ai_chat_limiter
+
+    async def fake_stream(**kwargs):
+        yield "Hi"
+
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    with patch.object(ai_chat_limiter, "acquire", new=AsyncMock(return_value=False)):
+        busy = client.post("/api/v1/ai/chat/stream", json={"message": "Busy stream?"}, headers=headers)
+    assert busy.status_code == 503
+
+    free_slots = ai_chat_limiter._semaphore._value
+    with patch('app.services.ai_service.ai_service.chat_with_context_stream', new=fake_stream):
+        response = client.post("/api/v1/ai/chat/stream", json={"message": "Free stream?"}, headers=headers)
+    assert response.status_code == 200
+    assert ai_chat_limiter._semaphore._value == free_slots
+
+
+def test_smart_action_stream_caches_result(client: TestClient, auth_token: str):
+    """Streaming smart action sends deltas and the joined result is served from cache next time."""
+    import json
+    calls = []
+
+    async def fake_stream(**kwargs):
+        calls.append(kwargs)
+        for part in ["Sim", "pler"]:
+            yield part
+
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    payload = {"text": "Stream this selection", "action": "simplify"}
+    with patch('app.services.ai_service.ai_service.perform_smart_action_stream', new=fake_stream):
+        first = client.post("/api/v1/ai/smart-action/stream", json=payload, headers=headers)
+        second = client.post("/api/v1/ai/smart-action", json=payload, headers=headers)
+
+    assert first.status_code == 200
+    events = [json.loads(line[len("data: "):]) for line in first.text.splitlines() if line.startswith("data: ")]
+    assert [e["delta"] for e in events if "delta" in e] == ["Sim", "pler"]
+    assert events[-1] == {"done": True}
+    assert second.json()["result"] == "Simpler"
+    assert len(calls) == 1
+
+
+def test_generate_summary_batch(client: TestClient, auth_token: str, db_session):
+    """Batch summary fans out per material and reports missing ones individually."""
+    import uuid
+
+    materials = _add_teacher_materials(db_session, "Batch content 0", "Batch content 1")
+
+    missing_id = str(uuid.uuid4())
+    response = client.post(
+        "/api/v1/ai/generate-summary-batch",
+        json={"materialIds": [str(materials[0].id), str(materials[1].id), missing_id]},
+        headers={"Authorization": f"Bearer {auth_token}"}
+    )
+
+    assert response.status_code == 200
+    items = response.json()
+    assert [item["materialId"] for item in items] == [str(materials[0].id), str(materials[1].id), missing_id]
+    assert all(item["result"]["summary"] for item in items[:2])
+    assert items[2]["error"] == "Material not found"
+
+
+def test_generate_summary_batch_runs_each_call_in_a_generation_slot(client: TestClient, auth_token: str, db_session):
+    """Batch summaries never run more LLM calls at once than the generation pool allows."""
+    import asyncio
+    from app.services.concurrency_limiter import ConcurrencyLimiter
+
+    materials = _add_teacher_materials(db_session, *(f"Slot content {i}" for i in range(3)))
+
+    in_flight = 0
+    peak = 0
+
+    async def fake_summary(content, language="ru"):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return {"summary": content, "glossary": []}
+
+    with patch(
+        'app.api.v1.endpoints.ai_swagger.ai_generation_limiter',
+        ConcurrencyLimiter(max_concurrent=1, max_queued=0)
+    ), patch('app.services.ai_service.ai_service.generate_summary', new=fake_summary):
+        response = client.post(
+            "/api/v1/ai/generate-summary-batch",
+            json={"materialIds": [str(material.id) for material in materials]},
+            headers={"Authorization": f"Bearer {auth_token}"}
+        )
+
+    assert response.status_code == 200
+    assert all(item["result"] for item in response.json())
+    assert peak == 1
+
+
+def test_generate_assignment_updates_cached_material(client: TestClient, auth_token: str, db_session):
+    """Assignment text is stored on the material and the cached snapshot is refreshed."""
+    from app.services.material_cache import get_material_cached
+
+    [material] = _add_teacher_materials(db_session, "Write about rivers.")
+    assert get_material_cached(db_session, material.id, material.user_id).summary is None
+
+    response = client.post(
+        "/api/v1/ai/generate-assignment",
+        json={"materialId": str(material.id)},
+        headers={"Authorization": f"Bearer {auth_token}"}
+    )
+
+    assert response.status_code == 200
+    assignment_text = response.json()["assignmentText"]
+    assert get_material_cached(db_session, material.id, material.user_id).summary == assignment_text
+
+
+@pytest.mark.asyncio
+async def test_response_cache_coalesces_concurrent_misses():
+    """Concurrent identical requests share a single LLM call."""
+    import asyncio
+    from app.services.response_cache import ResponseCache
+
+    cache = ResponseCache(maxsize=10, ttl=60)
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    results = await asyncio.gather(*(cache.get_or_compute("key", compute) for _ in range(5)))
+
+    assert results == ["answer"] * 5
+    assert calls == 1
+
+
+@pytest.mark.asyncio
+async def test_response_cache_survives_redis_outage():
+    """An unreachable Redis degrades to the in-process L1 instead of failing requests."""
+    import asyncio
+    from app.services.response_cache import ResponseCache
+
+    cache = ResponseCache(maxsize=10, ttl=60, redis_url="redis://127.0.0.1:1/0")
+    assert await cache.get("missing") is None
+
+    await cache.set("key", {"summary": "cached"})
+    assert await cache.get("key") == {"summary": "cached"}
+
+    await cache.delete("key")
+    assert await cache.get("key") is None
+
+    await cache.set("user:a", 1)
+    cache.discard_prefix("user:")
+    await asyncio.sleep(0)
+    assert await cache.get("user:a") is None
+
+
+def test_quiz_prompts_share_material_prefix():
+    """Per-request parameters come after the material so prompts over it share a cacheable prefix."""
+    from app.services.ai_service import ai_service, PARAMS_SEPARATOR
+
+    first = ai_service._quiz_advanced_prompt("Photosynthesis text", 5, "easy", "mcq", "ru")
+    second = ai_service._quiz_advanced_prompt("Photosynthesis text", 10, "hard", "open", "en")
+
+    prefix = first.split(PARAMS_SEPARATOR)[0]
+    assert prefix.endswith("Photosynthesis text")
+    assert second.startswith(prefix + PARAMS_SEPARATOR)
+    assert "Respond in English." in second[len(prefix):]
+
+
+@pytest.mark.asyncio
+async def test_large_quiz_is_generated_in_parallel_chunks():
+    """A 25-question quiz is requested as 10+10+5 focused calls, merged and topped up to 25."""
+    import json
+    from types import SimpleNamespace
+    from unittest.mock import MagicMock
+    from app.services.ai_service import ai_service
+
+    def fake_response(prompt, generation_config):
+        count = int(prompt.split("Количество вопросов: ")[1].split()[0])
+        prompts.append(prompt)
+        call = len(prompts)
+        # Every chunk repeats one shared question that must be dropped on merge
+        shared = [{"text": "Shared question?", "correctAnswer": "A"}] if "Это часть" in prompt else []
+        questions = shared + [
+            {"text": f"Call {call} question {i}?", "correctAnswer": "A"} for i in range(count - len(shared))
+        ]
+        return SimpleNamespace(text=json.dumps(questions))
+
+    prompts = []
+    model = MagicMock()
+    model.generate_content_async = AsyncMock(side_effect=fake_response)
+    with patch.object(ai_service, "client", True), patch.object(ai_service, "model", model):
+        questions = await ai_service.generate_quiz_advanced("Text", 25, "easy", "mcq")
+
+    chunk_prompts, top_up_prompts = prompts[:3], prompts[3:]
+    assert len({p.split("Это часть ")[1][:6] for p in chunk_prompts}) == 3
+    assert len(top_up_prompts) == 1
+    assert "Количество вопросов: 2\n" in top_up_prompts[0]
+    assert "- Shared question?" in top_up_prompts[0]
+    texts = [q["text"] for q in questions]
+    assert texts.count("Shared question?") == 1
+    assert len(texts) == len(set(texts)) == 25
+
+
+@pytest.mark.asyncio
+async def test_large_quiz_keeps_successful_chunks():
+    """A failed chunk does not fail the quiz: the others are kept and the shortfall is requested again."""
+    import json
+    from types import SimpleNamespace
+    from unittest.mock import MagicMock
+    from app.services.ai_service import ai_service
+
+    def fake_response(prompt, generation_config):
+        count = int(prompt.split("Количество вопросов: ")[1].split()[0])
+        calls.append(count)
+        if "Это часть 1 " in prompt:
+            raise TimeoutError("chunk timed out")
+        return SimpleNamespace(text=json.dumps([
+            {"text": f"Call {len(calls)} question {i}?", "correctAnswer": "A"} for i in range(count)
+        ]))
+
+    calls = []
+    model = MagicMock()
+    model.generate_content_async = AsyncMock(side_effect=fake_response)
+    with patch.object(ai_service, "client", True), patch.object(ai_service, "model", model):
+        questions = await ai_service.generate_quiz_advanced("Text", 20, "easy", "mcq")
+
+    assert calls[2:] == [10]
+    assert len({q["text"] for q in questions}) == 20
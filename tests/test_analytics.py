@@ -1,6 +1,9 @@
+import asyncio
+from datetime import datetime, timedelta
 import pytest
 from fastapi.testclient import TestClient
-from app.models.models import User, Course, Material, Quiz, StudentResult, MaterialStatus
+from app.models.models import User, Course, Material, Quiz, StudentResult, OCRResult, MaterialStatus
+from app.services.analytics_cache import analytics_cache
 
 
 @pytest.fixture
@@ -27,6 +30,23 @@ def auth_token(client: TestClient):
     return response.json()["access_token"]
 
 
+@pytest.fixture
+def course_quiz(db_session, auth_token: str):
+    """A teacher's course with one ready material and an empty quiz on it."""
+    teacher = db_session.query(User).filter(User.email == "analytics_teacher@test.com").first()
+    course = Course(user_id=teacher.id, title="Химия")
+    db_session.add(course)
+    db_session.flush()
+
+    material = Material(user_id=teacher.id, title="Атомы", content="x", status=MaterialStatus.READY, course_id=str(course.id))
+    db_session.add(material)
+    db_session.flush()
+    quiz = Quiz(material_id=material.id, title="Атомы тест", questions=[])
+    db_session.add(quiz)
+    db_session.flush()
+    return teacher, course, quiz
+
+
 def test_dashboard_empty(client: TestClient, auth_token: str):
     """Test dashboard with no data."""
     response = client.get(
@@ -190,3 +210,312 @@ def test_quiz_results_filtered_by_course(client: TestClient, db_session, auth_to
     items = response.json()
     assert len(items) == 1
     assert items[0]["materialTitle"] == "Силы"
+
+
+def test_dashboard_aggregates(db_session, auth_token: str):
+    """Dashboard counters come back from one aggregate query, scoped to the teacher."""
+    from app.api.v1.endpoints.analytics import get_dashboard
+
+    teacher = db_session.query(User).filter(User.email == "analytics_teacher@test.com").first()
+    materials = [
+        Material(user_id=teacher.id, title=f"M{i}", content="x", status=MaterialStatus.READY)
+        for i in range(2)
+    ]
+    db_session.add_all(materials)
+    db_session.flush()
+
+    quiz = Quiz(material_id=materials[0].id, title="Q", questions=[])
+    db_session.add(quiz)
+    db_session.flush()
+
+    db_session.add_all([
+        StudentResult(user_id=teacher.id, student_identifier="A", quiz_id=quiz.id, score=80, weak_topics=[]),
+        StudentResult(user_id=teacher.id, student_identifier="B", quiz_id=quiz.id, score=60, weak_topics=[]),
+    ])
+    db_session.commit()
+
+    data = get_dashboard(db=db_session, current_user=teacher)
+
+    assert data["stats"].total_materials == 2
+    assert data["stats"].total_quizzes == 1
+    assert data["stats"].total_student_results == 2
+    assert data["stats"].average_score == 70.0
+    assert {item["student"] for item in data["recent_activities"]} == {"A", "B"}
+
+
+def test_knowledge_map_aggregates_topics(db_session, auth_token: str):
+    """Each weak topic gets the average score and count of the results that list it."""
+    from app.api.v1.endpoints.analytics import get_knowledge_map
+
+    teacher = db_session.query(User).filter(User.email == "analytics_teacher@test.com").first()
+    material = Material(user_id=teacher.id, title="M", content="x", status=MaterialStatus.READY)
+    db_session.add(material)
+    db_session.flush()
+    quiz = Quiz(material_id=material.id, title="Q", questions=[])
+    db_session.add(quiz)
+    db_session.flush()
+
+    db_session.add_all([
+        StudentResult(user_id=teacher.id, student_identifier="A", quiz_id=quiz.id, score=80, weak_topics=["Дроби", "Проценты"]),
+        StudentResult(user_id=teacher.id, student_identifier="B", quiz_id=quiz.id, score=60, weak_topics=["Дроби"]),
+        StudentResult(user_id=teacher.id, student_identifier="C", quiz_id=quiz.id, score=100, weak_topics=None),
+    ])
+    db_session.commit()
+
+    data = get_knowledge_map(db=db_session, current_user=teacher)
+
+    by_topic = {item.topic: item for item in data["knowledge_map"]}
+    assert set(by_topic) == {"Дроби", "Проценты"}
+    assert by_topic["Дроби"].average_score == 70.0
+    assert by_topic["Дроби"].student_count == 2
+    assert by_topic["Проценты"].student_count == 1
+
+
+def test_performance_for_course(client: TestClient, db_session, course_quiz, auth_token: str):
+    """Course performance ranks students and counts weak topics from their quiz results."""
+    teacher, course, quiz = course_quiz
+    db_session.add_all([
+        StudentResult(user_id=teacher.id, student_identifier="A", quiz_id=quiz.id, score=90, weak_topics=["Ионы"]),
+        StudentResult(user_id=teacher.id, student_identifier="B", quiz_id=quiz.id, score=40, weak_topics=["Ионы", "Изотопы"]),
+    ])
+    db_session.commit()
+
+    response = client.get(
+        f"/api/v1/analytics/performance?courseId={course.id}",
+        headers={"Authorization": f"Bearer {auth_token}"}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert [s["name"] for s in data["students"]] == ["A", "B"]
+    assert [(s["status"], s["color"]) for s in data["students"]] == [("Отлично", "green"), ("Требует внимания", "red")]
+    assert data["topics"][0]["name"] == "Ионы"
+    assert len(data["performance"]) == 7
+    assert data["performance"][-1]["value"] == 65
+
+
+def test_performance_daily_values_and_trend(client: TestClient, db_session, course_quiz, auth_token: str):
+    """The chart averages each of the last seven days; the trend compares the last six scores."""
+    teacher, course, quiz = course_quiz
+    now = datetime.utcnow()
+    # The oldest attempt is outside both the chart and the trend window
+    scores = [100, 40, 40, 40, 90, 90, 90]
+    db_session.add_all([
+        StudentResult(
+            user_id=teacher.id,
+            student_identifier=" Ася ",
+            quiz_id=quiz.id,
+            score=score,
+            submission_date=now - timedelta(days=10 if i == 0 else len(scores) - 1 - i)
+        )
+        for i, score in enumerate(scores)
+    ])
+    db_session.commit()
+
+    response = client.get(
+        f"/api/v1/analytics/performance?courseId={course.id}",
+        headers={"Authorization": f"Bearer {auth_token}"}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert [item["value"] for item in data["performance"]] == [0, 40, 40, 40, 90, 90, 90]
+    student = data["students"][0]
+    assert student["name"] == "Ася"
+    assert student["progress"] == 70.0
+    assert student["trend"] == "up"
+
+
+def test_student_journal_metrics(client: TestClient, db_session, course_quiz, auth_token: str):
+    """Journal metrics follow submission order: newest score first, trend against the next three."""
+    teacher, course, quiz = course_quiz
+    now = datetime.utcnow()
+    scores = [50, 60, 70, 80, 95]
+    db_session.add_all([
+        StudentResult(
+            user_id=teacher.id,
+            student_identifier="Дана",
+            quiz_id=quiz.id,
+            score=score,
+            weak_topics=[f"Тема {i}", "Углы"],
+            submission_date=now - timedelta(days=len(scores) - i)
+        )
+        for i, score in enumerate(scores)
+    ])
+    db_session.commit()
+
+    response = client.get(
+        f"/api/v1/analytics/student-journal?courseId={course.id}",
+        headers={"Authorization": f"Bearer {auth_token}"}
+    )
+    assert response.status_code == 200
+    student = response.json()["students"][0]
+    assert student["attempts"] == 5
+    assert student["lastScore"] == 95
+    assert student["averageScore"] == 71.0
+    assert student["trend"] == "up"
+    assert [item["score"] for item in student["history"]] == [95, 80, 70, 60, 50]
+    assert student["weakTopics"] == ["Тема 4", "Углы", "Тема 3", "Тема 2", "Тема 1", "Тема 0"]
+
+
+def test_student_journal_caps_history(client: TestClient, db_session, course_quiz, auth_token: str):
+    """Only the newest attempts are listed, but attempts and averages cover the full history."""
+    teacher, course, quiz = course_quiz
+    now = datetime.utcnow()
+    db_session.add_all([
+        StudentResult(
+            user_id=teacher.id,
+            student_identifier="Арман" if i % 2 else "арман ",
+            quiz_id=quiz.id,
+            score=40 + i * 2,
+            weak_topics=[],
+            submission_date=now - timedelta(hours=20 - i)
+        )
+        for i in range(20)
+    ])
+    db_session.commit()
+
+    response = client.get(
+        f"/api/v1/analytics/student-journal?courseId={course.id}",
+        headers={"Authorization": f"Bearer {auth_token}"}
+    )
+    assert response.status_code == 200
+    payload = response.json()
+    assert payload["totalStudents"] == 1
+    student = payload["students"][0]
+    assert student["attempts"] == 20
+    assert student["averageScore"] == 59.0
+    assert student["lastScore"] == 78
+    assert [item["score"] for item in student["history"]] == [78 - i * 2 for i in range(12)]
+
+
+def test_student_journal_scores_behind_pending_assignments(client: TestClient, db_session, course_quiz, auth_token: str):
+    """Pending assignments filling the history do not hide the latest scored attempts."""
+    teacher, course, quiz = course_quiz
+    now = datetime.utcnow()
+    db_session.add_all([
+        StudentResult(user_id=teacher.id, student_identifier="Айгерим", quiz_id=quiz.id, score=40,
+                      weak_topics=[], submission_date=now - timedelta(days=3)),
+        StudentResult(user_id=teacher.id, student_identifier="Айгерим", quiz_id=quiz.id, score=90,
+                      weak_topics=[], submission_date=now - timedelta(days=2)),
+    ])
+    db_session.add_all([
+        OCRResult(
+            user_id=teacher.id,
+            student_name="Айгерим",
+            image_url="/uploads/scan.png",
+            questions=[],
+            status="pending",
+            course_id=str(course.id),
+            created_at=now - timedelta(hours=12 - i),
+            updated_at=now - timedelta(hours=12 - i)
+        )
+        for i in range(12)
+    ])
+    db_session.commit()
+
+    response = client.get(
+        f"/api/v1/analytics/student-journal?courseId={course.id}",
+        headers={"Authorization": f"Bearer {auth_token}"}
+    )
+    assert response.status_code == 200
+    student = response.json()["students"][0]
+    assert len(student["history"]) == 12
+    assert all(not item["hasScore"] for item in student["history"])
+    assert student["lastScore"] == 90
+    assert student["trend"] == "up"
+
+
+def test_student_journal_limit(client: TestClient, db_session, course_quiz, auth_token: str):
+    """limit keeps the best students but totals still count everyone."""
+    teacher, course, quiz = course_quiz
+    db_session.add_all([
+        StudentResult(user_id=teacher.id, student_identifier=name, quiz_id=quiz.id, score=score, weak_topics=[])
+        for name, score in [("A", 60), ("B", 95), ("C", 80)]
+    ])
+    db_session.commit()
+
+    response = client.get(
+        f"/api/v1/analytics/student-journal?courseId={course.id}&limit=2",
+        headers={"Authorization": f"Bearer {auth_token}"}
+    )
+    assert response.status_code == 200
+    payload = response.json()
+    assert payload["totalStudents"] == 3
+    assert [item["studentName"] for item in payload["students"]] == ["B", "C"]
+
+
+def test_performance_cache_invalidated_by_new_results(client: TestClient, db_session, course_quiz, auth_token: str):
+    """Cached course analytics are dropped as soon as the teacher gets a new result."""
+    teacher, course, quiz = course_quiz
+    db_session.add(StudentResult(user_id=teacher.id, student_identifier="A", quiz_id=quiz.id, score=80, weak_topics=[]))
+    db_session.commit()
+
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    first = client.get(f"/api/v1/analytics/performance?courseId={course.id}", headers=headers)
+    assert [s["name"] for s in first.json()["students"]] == ["A"]
+    assert asyncio.run(analytics_cache.get(f"{teacher.id}:performance:100:{course.id}")) is not None
+
+    db_session.add(StudentResult(user_id=teacher.id, student_identifier="B", quiz_id=quiz.id, score=90, weak_topics=[]))
+    db_session.commit()
+
+    second = client.get(f"/api/v1/analytics/performance?courseId={course.id}", headers=headers)
+    assert [s["name"] for s in second.json()["students"]] == ["B", "A"]
+
+
+def test_analytics_evicted_only_after_commit(db_session, auth_token: str):
+    """Writes evict the teacher's cached analytics when they commit, not when they flush."""
+    teacher = db_session.query(User).filter(User.email == "analytics_teacher@test.com").first()
+    key = f"{teacher.id}:performance:100:course"
+    asyncio.run(analytics_cache.set(key, {"cached": True}))
+
+    db_session.add(Course(user_id=teacher.id, title="Музыка"))
+    db_session.flush()
+    assert asyncio.run(analytics_cache.get(key)) is not None
+    db_session.rollback()
+    assert asyncio.run(analytics_cache.get(key)) is not None
+
+    db_session.add(Course(user_id=teacher.id, title="Музыка"))
+    db_session.commit()
+    assert asyncio.run(analytics_cache.get(key)) is None
+
+
+def test_dashboard_overview_for_course(client: TestClient, db_session, course_quiz, auth_token: str):
+    """Course overview counts results by score band and lists recent materials and results."""
+    teacher, course, quiz = course_quiz
+    db_session.add_all([
+        StudentResult(user_id=teacher.id, student_identifier="A", quiz_id=quiz.id, score=90, weak_topics=[]),
+        StudentResult(user_id=teacher.id, student_identifier="b", quiz_id=quiz.id, score=40, weak_topics=[]),
+        StudentResult(user_id=teacher.id, student_identifier="B ", quiz_id=quiz.id, score=60, weak_topics=[]),
+    ])
+    db_session.commit()
+
+    response = client.get(
+        f"/api/v1/dashboard/overview?courseId={course.id}",
+        headers={"Authorization": f"Bearer {auth_token}"}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert [item["value"] for item in data["pieChart"]] == [1, 0, 1, 1]
+    assert data["stats"]["studentsCount"] == 2
+    assert data["stats"]["submissionsCount"] == 3
+    assert data["stats"]["averageScore"] == 63.3
+    assert data["recentActivity"][0]["title"] == "Материал: Атомы"
+    assert data["recentActivity"][0]["statusColor"] == "green"
+    assert len(data["recentActivity"]) == 4
+
+
+def test_results_follow_material_course(db_session, course_quiz):
+    """StudentResult.course_id is copied from the material on insert and follows it to a new course."""
+    teacher, first_course, quiz = course_quiz
+    second_course = Course(user_id=teacher.id, title="Русский язык")
+    db_session.add(second_course)
+    db_session.flush()
+
+    result = StudentResult(user_id=teacher.id, student_identifier="A", quiz_id=quiz.id, score=70, weak_topics=[])
+    db_session.add(result)
+    db_session.commit()
+    assert result.course_id == first_course.id
+
+    quiz.material.course_id = str(second_course.id)
+    db_session.commit()
+    db_session.refresh(result)
+    assert result.course_id == second_course.id
@@ -34,6 +34,20 @@ def test_register_student(client: TestClient):
     assert data["role"] == "student"
 
 
+def test_user_role_stored_as_lowercase_value():
+    """Role column is plain varchar; the model validator normalizes and rejects values."""
+    from app.models.models import User, UserRole
+
+    user = User(email="role@example.com", password_hash="x", role=UserRole.ADMIN)
+    assert user.role == "admin"
+
+    user.role = "STUDENT"
+    assert user.role == "student"
+
+    with pytest.raises(ValueError):
+        user.role = "superuser"
+
+
 def test_register_duplicate_email(client: TestClient):
     """Test registration with duplicate email."""
     client.post(
@@ -86,3 +86,31 @@ def test_materials_forbidden_for_student(client: TestClient, student_token: str)
         headers={"Authorization": f"Bearer {student_token}"}
     )
     assert response.status_code == 403
+
+
+def test_courses_report_materials_count(client: TestClient, db_session, auth_token: str):
+    """Course list, detail and update report how many materials each course holds."""
+    from app.models.models import User, Material, MaterialStatus
+
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    algebra = client.post("/api/v1/courses/", json={"title": "Алгебра"}, headers=headers)
+    assert algebra.status_code == 201
+    assert algebra.json()["materialsCount"] == 0
+    geometry = client.post("/api/v1/courses/", json={"title": "Геометрия"}, headers=headers).json()
+
+    teacher = db_session.query(User).filter(User.email == "teacher@test.com").first()
+    db_session.add_all([
+        Material(user_id=teacher.id, title=f"Тема {i}", status=MaterialStatus.READY, course_id=algebra.json()["id"])
+        for i in range(2)
+    ])
+    db_session.commit()
+
+    listed = client.get("/api/v1/courses/", headers=headers).json()
+    assert {course["title"]: course["materialsCount"] for course in listed} == {"Алгебра": 2, "Геометрия": 0}
+
+    detail = client.get(f"/api/v1/courses/{algebra.json()['id']}", headers=headers)
+    assert detail.json()["materialsCount"] == 2
+
+    updated = client.put(f"/api/v1/courses/{geometry['id']}", json={"title": "Планиметрия"}, headers=headers)
+    assert updated.json()["title"] == "Планиметрия"
+    assert updated.json()["materialsCount"] == 0
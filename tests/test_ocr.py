@@ -2,7 +2,7 @@
 import pytest
 import io
 from fastapi.testclient import TestClient
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
 
 
 @pytest.fixture
@@ -39,7 +39,7 @@ def test_extract_text_unauthorized(client: TestClient):
 @patch('app.services.ocr_service.ocr_service.extract_text_from_image')
 def test_extract_text_success(mock_extract, client: TestClient, auth_token: str):
     """Test successful OCR text extraction."""
-    mock_extract.return_value = MagicMock(return_value="Extracted text from image")
+    mock_extract.return_value = "Extracted text from image"
     
     file_content = b"Fake image content"
     files = {"file": ("test.jpg", io.BytesIO(file_content), "image/jpeg")}
@@ -72,7 +72,7 @@ def test_extract_text_invalid_file_type(client: TestClient, auth_token: str):
 @patch('app.services.ocr_service.ocr_service.extract_text_from_image')
 def test_extract_text_empty_result(mock_extract, client: TestClient, auth_token: str):
     """Test OCR extraction with no text found."""
-    mock_extract.return_value = MagicMock(return_value="")
+    mock_extract.return_value = ""
     
     file_content = b"Fake image content"
     files = {"file": ("test.jpg", io.BytesIO(file_content), "image/jpeg")}
@@ -106,7 +106,7 @@ def test_extract_text_large_file(client: TestClient, auth_token: str):
 @patch('app.services.ocr_service.ocr_service.extract_text_from_image')
 def test_extract_text_multiple_files_sequential(mock_extract, client: TestClient, auth_token: str):
     """Test multiple OCR extractions sequentially."""
-    mock_extract.return_value = MagicMock(return_value="Extracted text")
+    mock_extract.return_value = "Extracted text"
     
     for i in range(3):
         file_content = f"Image {i}".encode()